@@ -0,0 +1,243 @@
+import datetime
+import json
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import and_, delete, func, insert, literal, select, update
+
+
+class JobLimitExceeded(Exception):
+    """O usuário já tem o número máximo de jobs de IA pendentes."""
+
+
+class AIJob:
+    """
+    Estado de uma chamada de IA enfileirada: pending -> running -> done/error/timeout/cancelled.
+    Jobs que gravam dados passam por running -> applying (ver SQLJobStore.mark_applying): a
+    partir daí não podem mais ser cancelados nem expirar por timeout.
+    """
+
+    ACTIVE_STATUSES = ('pending', 'running', 'applying')
+    CANCELLABLE_STATUSES = ('pending', 'running')
+    FINISHED_STATUSES = ('done', 'error', 'timeout', 'cancelled')
+
+    def __init__(self, id, user_id, kind, status='pending', result=None, error=None, timeout_seconds=None):
+        self.id = id
+        self.user_id = user_id
+        self.kind = kind
+        self.status = status
+        self.result = result
+        self.error = error
+        self.timeout_seconds = timeout_seconds
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.id, row.user_id, row.kind, row.status,
+                   json.loads(row.result) if row.result is not None else None, row.error)
+
+    @property
+    def finished(self):
+        return self.status in self.FINISHED_STATUSES
+
+    def to_dict(self):
+        # 'applying' é interno: para quem consulta o job ele ainda está rodando
+        data = {'job_id': self.id, 'kind': self.kind, 'status': 'running' if self.status == 'applying' else self.status}
+        if self.status == 'done':
+            data['result'] = self.result
+        elif self.error:
+            data['error'] = self.error
+        return data
+
+
+class SQLJobStore:
+    """
+    Estado dos jobs na tabela `table` do banco do app, compartilhado por todos os workers:
+    qualquer processo responde /ai_jobs/<id> e o limite por usuário vale para o usuário, não
+    para o worker.
+
+    Cada transição é um UPDATE condicionado ao status atual (só um processo vence), e a criação
+    conta os jobs ativos e insere no mesmo INSERT ... SELECT, com a linha do usuário em
+    `users_table` travada (FOR UPDATE) nos bancos que suportam. O resultado é gravado em JSON.
+    """
+
+    def __init__(self, engine, table, users_table, clock=datetime.datetime.now):
+        self.engine = engine
+        self.table = table
+        self.users_table = users_table
+        self._clock = clock
+
+    def create(self, user_id, kind, per_user_limit, timeout_seconds, result_ttl_seconds):
+        """Grava um job pendente e retorna o AIJob; levanta JobLimitExceeded se o usuário estiver no limite."""
+        jobs = self.table
+        now = self._clock()
+        job = AIJob(uuid.uuid4().hex, user_id, kind, timeout_seconds=timeout_seconds)
+        active = (select(func.count()).select_from(jobs)
+                  .where(jobs.c.user_id == user_id, jobs.c.status.in_(AIJob.ACTIVE_STATUSES))
+                  .scalar_subquery())
+        # Job que não começa dentro do TTL é dado como perdido (o worker que o aceitou morreu)
+        values = select(literal(job.id), literal(user_id), literal(kind), literal('pending'), literal(now),
+                        literal(now + datetime.timedelta(seconds=result_ttl_seconds))).where(active < per_user_limit)
+        with self.engine.begin() as conn:
+            conn.execute(select(self.users_table.c.id).where(self.users_table.c.id == user_id).with_for_update())
+            self._expire(conn, user_id, now, result_ttl_seconds)
+            inserted = conn.execute(insert(jobs).from_select(
+                ['id', 'user_id', 'kind', 'status', 'created_at', 'deadline_at'], values))
+            if inserted.rowcount != 1:
+                raise JobLimitExceeded(f"Limite de {per_user_limit} jobs de IA simultâneos atingido.")
+        return job
+
+    def start(self, job_id, timeout_seconds):
+        """pending -> running; False se o job já foi cancelado ou expirou."""
+        now = self._clock()
+        return self._transition(job_id, ('pending',), status='running', started_at=now,
+                                deadline_at=now + datetime.timedelta(seconds=timeout_seconds))
+
+    def finish(self, job_id, result, error):
+        """running/applying -> done/error; False (resultado descartado) se expirou ou foi cancelado enquanto rodava."""
+        return self._transition(job_id, ('running', 'applying'), status='done' if error is None else 'error',
+                                result=json.dumps(result) if error is None else None, error=error,
+                                finished_at=self._clock())
+
+    def mark_applying(self, executor, job_id, timeout_seconds):
+        """
+        running -> applying dentro da transação de `executor` (Session ou Connection de quem vai
+        gravar o efeito do job), antes das gravações: se o job foi cancelado ou passou do prazo,
+        retorna False e quem chamou não grava nada. Como a transição é confirmada junto com as
+        gravações, um cancelamento concorrente ou acontece antes (e nada é gravado) ou não tem
+        efeito. O prazo é renovado para a gravação.
+        """
+        now = self._clock()
+        updated = executor.execute(update(self.table)
+                                   .where(self.table.c.id == job_id, self.table.c.status == 'running',
+                                          self.table.c.deadline_at > now)
+                                   .values(status='applying', deadline_at=now + datetime.timedelta(seconds=timeout_seconds)))
+        return updated.rowcount == 1
+
+    def cancel(self, job_id, user_id):
+        """Cancela um job pendente ou em execução do usuário. Retorna o job, ou None se não existir."""
+        with self.engine.begin() as conn:
+            conn.execute(update(self.table)
+                         .where(self.table.c.id == job_id, self.table.c.user_id == user_id,
+                                self.table.c.status.in_(AIJob.CANCELLABLE_STATUSES))
+                         .values(status='cancelled', finished_at=self._clock()))
+        return self.get(job_id, user_id)
+
+    def get(self, job_id, user_id):
+        """Retorna o job do usuário (aplicando o timeout) ou None se não existir ou for de outro usuário."""
+        jobs = self.table
+        with self.engine.begin() as conn:
+            self._expire(conn, user_id, self._clock())
+            row = conn.execute(select(jobs).where(jobs.c.id == job_id, jobs.c.user_id == user_id)).first()
+        return AIJob.from_row(row) if row is not None else None
+
+    def _transition(self, job_id, from_statuses, **values):
+        # Depois do prazo a transição não vale mais, mesmo que _expire ainda não tenha marcado o timeout
+        with self.engine.begin() as conn:
+            updated = conn.execute(update(self.table)
+                                   .where(self.table.c.id == job_id, self.table.c.status.in_(from_statuses),
+                                          self.table.c.deadline_at > self._clock())
+                                   .values(**values))
+        return updated.rowcount == 1
+
+    def _expire(self, conn, user_id, now, result_ttl_seconds=None):
+        jobs = self.table
+        overdue = conn.execute(select(jobs.c.id, jobs.c.status, jobs.c.started_at, jobs.c.deadline_at).where(
+            jobs.c.user_id == user_id, jobs.c.status.in_(AIJob.ACTIVE_STATUSES), jobs.c.deadline_at <= now)).all()
+        for job_id, status, started_at, deadline_at in overdue:
+            if status == 'applying':
+                error = "O job de IA foi interrompido enquanto gravava o resultado."
+            elif started_at is not None:
+                error = f"A IA não respondeu em {round((deadline_at - started_at).total_seconds())} segundos."
+            else:
+                error = "O job de IA não foi iniciado a tempo."
+            conn.execute(update(jobs).where(jobs.c.id == job_id, jobs.c.status == status)
+                         .values(status='timeout' if status != 'applying' else 'error', error=error, finished_at=now))
+        if result_ttl_seconds is not None:
+            conn.execute(delete(jobs).where(and_(
+                jobs.c.user_id == user_id, jobs.c.status.in_(AIJob.FINISHED_STATUSES),
+                jobs.c.finished_at <= now - datetime.timedelta(seconds=result_ttl_seconds))))
+
+
+class AIJobQueue:
+    """
+    Fila de jobs de IA em um pool de threads limitado, com limite de jobs ativos por usuário,
+    timeout e cancelamento.
+
+    O estado dos jobs fica no `store` (SQLJobStore, configurado com init_store), então o cliente
+    pode consultar o resultado em qualquer worker; o pool e os futures são do processo que
+    aceitou o job.
+
+    Threads não podem ser interrompidas: o timeout marca o job como 'timeout' e libera a vaga do
+    usuário, e o resultado que chegar depois é descartado. Para que a thread do pool também seja
+    liberada, a função enfileirada deve repassar o mesmo limite para o cliente da API. Funções
+    que gravam dados são enfileiradas com pass_job_id=True e chamam mark_applying na transação
+    das gravações, para que um job cancelado ou expirado não altere nada.
+    """
+
+    def __init__(self, store=None, max_workers=4, per_user_limit=2, timeout_seconds=30, result_ttl_seconds=600):
+        self.store = store
+        self.max_workers = max_workers
+        self.per_user_limit = per_user_limit
+        self.timeout_seconds = timeout_seconds
+        self.result_ttl_seconds = result_ttl_seconds
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def init_store(self, store):
+        self.store = store
+
+    def submit(self, user_id, kind, fn, *args, pass_job_id=False, **kwargs):
+        """
+        Enfileira fn(*args, **kwargs) (fn(job_id, *args, **kwargs) com pass_job_id) e retorna o
+        AIJob; levanta JobLimitExceeded se o usuário estiver no limite.
+        """
+        job = self.store.create(user_id, kind, self.per_user_limit, self.timeout_seconds, self.result_ttl_seconds)
+        if pass_job_id:
+            args = (job.id, *args)
+        with self._lock:
+            if self._executor is None:
+                # Criado sob demanda: importar o app não sobe threads
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ai-job')
+            future = self._executor.submit(self._run, job, fn, args, kwargs)
+            self._futures[job.id] = future
+        future.add_done_callback(lambda _: self._forget(job.id))
+        return job
+
+    def _forget(self, job_id):
+        with self._lock:
+            self._futures.pop(job_id, None)
+
+    def _run(self, job, fn, args, kwargs):
+        if not self.store.start(job.id, job.timeout_seconds):
+            return
+        try:
+            result, error = fn(*args, **kwargs), None
+        except Exception as e:
+            result, error = None, str(e) or e.__class__.__name__
+        self.store.finish(job.id, result, error)
+
+    def get(self, job_id, user_id):
+        """Retorna o job do usuário (aplicando o timeout) ou None se não existir ou for de outro usuário."""
+        return self.store.get(job_id, user_id)
+
+    def mark_applying(self, executor, job_id):
+        """Ver SQLJobStore.mark_applying; o prazo da gravação é o mesmo timeout dos jobs."""
+        return self.store.mark_applying(executor, job_id, self.timeout_seconds)
+
+    def cancel(self, job_id, user_id):
+        """Cancela um job pendente ou em execução. Retorna o job, ou None se não existir."""
+        job = self.store.cancel(job_id, user_id)
+        if job is not None:
+            with self._lock:
+                future = self._futures.get(job_id)
+            if future is not None:
+                future.cancel()  # Só tem efeito se ainda não começou (e se o job é deste processo)
+        return job
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
@@ -1,34 +1,41 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, send_from_directory, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 import datetime
 import os
+import click
 from dateutil.relativedelta import relativedelta # Para cálculo de datas recorrentes
 import calendar # Para obter o número de dias no mês
 import json
-import google.generativeai as genai
+import csv
+import threading
+import time
+import base64
+import hashlib
+import hmac
 import random
 import string
-import smtplib
-import ssl
 from email.mime.text import MIMEText
 from flask_migrate import Migrate # Importar Flask-Migrate
-import io # Para lidar com arquivos em memória
-from openpyxl import Workbook # Para exportar para Excel
-from openpyxl.styles import Font, PatternFill # Para estilos no Excel
-from openpyxl.styles.numbers import FORMAT_CURRENCY_USD_SIMPLE # Para formato de moeda no Excel
-from fpdf import FPDF # Para exportar para PDF
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+import tempfile # Para gerar exportações grandes em disco
 
 # Importa a nova função de gerenciamento de recorrências
 # A importação agora é apenas da função, não dos modelos
 from manage_recurring import process_subscriptions_and_generate_transactions
+from caching import create_cache_backend
+from ai_jobs import AIJobQueue, JobLimitExceeded, SQLJobStore
+from mailer import MailQueue
+from instrumentation import RequestInstrumentation
+from metrics import AppMetrics
+from profiler import RequestProfiler
 
 app = Flask(__name__)
 
 # --- CONFIGURAÇÃO DA API KEY GEMINI ---
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', 'SUA_CHAVE_DE_API_GEMINI_AQUI')
-genai.configure(api_key=GEMINI_API_KEY)
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', 'SUA_CHAVE_DE_API_GEMINI_AQUI') # Aplicada em get_genai()
 
 
 # Configuração da Chave Secreta para Flask-Login e Flask-WTF
@@ -42,6 +49,86 @@ if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
 app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL or 'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'finance.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Cache do dashboard: LRU local por processo ou Redis compartilhado se CACHE_REDIS_URL estiver definido
+app.config['CACHE_REDIS_URL'] = os.getenv('CACHE_REDIS_URL')
+app.config['DASHBOARD_CACHE_TTL'] = int(os.getenv('DASHBOARD_CACHE_TTL', 300))
+app.config['DASHBOARD_CACHE_MAX_ENTRIES'] = int(os.getenv('DASHBOARD_CACHE_MAX_ENTRIES', 1024))
+
+# Processamento de recorrências: o agendador (flask process-recurring ou o worker periódico,
+# ligado com RECURRING_SCHEDULER_INTERVAL > 0 segundos) processa todos os usuários em lotes.
+# Nos workers do gunicorn (wsgi.py) a thread não sobe: o agendador roda no processo `scheduler` do Procfile.
+# Com RECURRING_PROCESS_ON_ACCESS ligado, o dashboard processa como fallback se a marca d'água estiver atrasada.
+app.config['RECURRING_SCHEDULER_INTERVAL'] = int(os.getenv('RECURRING_SCHEDULER_INTERVAL', 0))
+app.config['RECURRING_BATCH_SIZE'] = int(os.getenv('RECURRING_BATCH_SIZE', 500))
+app.config['RECURRING_PROCESS_ON_ACCESS'] = os.getenv('RECURRING_PROCESS_ON_ACCESS', 'true').lower() in ['true', 'on', '1']
+
+# Exportações em arquivo temporário: até este tamanho (bytes) ficam em memória, acima disso vão para disco
+app.config['EXPORT_SPOOL_MAX_MEMORY'] = int(os.getenv('EXPORT_SPOOL_MAX_MEMORY', 5 * 1024 * 1024))
+
+# Tamanho da página das listagens de transações e contas no index (paginação por keyset)
+app.config['LIST_PAGE_SIZE'] = int(os.getenv('LIST_PAGE_SIZE', 50))
+
+# Instrumentação por requisição: cabeçalho Server-Timing, linha de log JSON por requisição
+# (PERF_LOG_REQUESTS) e log de comandos SQL acima de SLOW_QUERY_MS milissegundos (0 desliga)
+app.config['PERF_INSTRUMENTATION'] = os.getenv('PERF_INSTRUMENTATION', 'true').lower() in ['true', 'on', '1']
+app.config['PERF_LOG_REQUESTS'] = os.getenv('PERF_LOG_REQUESTS', 'true').lower() in ['true', 'on', '1']
+app.config['SLOW_QUERY_MS'] = float(os.getenv('SLOW_QUERY_MS', 200))
+
+# Métricas do Prometheus em /metrics (agregadas entre workers e agendador via PROMETHEUS_MULTIPROC_DIR).
+# /metrics exige o cabeçalho Authorization: Bearer <METRICS_TOKEN>; sem METRICS_TOKEN o endpoint fica
+# desligado (o servidor escuta em 0.0.0.0), mas as métricas continuam sendo registradas
+app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'true').lower() in ['true', 'on', '1']
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+app_metrics = AppMetrics()
+
+# Profiler sob demanda (desligado por padrão). Requisições com `X-Profile: <PROFILER_TOKEN>` ou sorteadas
+# com PROFILER_SAMPLE_RATE (0 a 1) são perfiladas; os arquivos ficam em PROFILER_DIR (no máximo
+# PROFILER_MAX_FILES) e são listados em /admin/profiles com Authorization: Bearer <PROFILER_TOKEN>
+app.config['PROFILER_ENABLED'] = os.getenv('PROFILER_ENABLED', 'false').lower() in ['true', 'on', '1']
+app.config['PROFILER_TOKEN'] = os.getenv('PROFILER_TOKEN')
+app.config['PROFILER_DIR'] = os.getenv('PROFILER_DIR', os.path.join(tempfile.gettempdir(), 'finance-profiles'))
+app.config['PROFILER_MAX_FILES'] = int(os.getenv('PROFILER_MAX_FILES', 200))
+app.config['PROFILER_SAMPLE_RATE'] = float(os.getenv('PROFILER_SAMPLE_RATE', 0))
+app.config['PROFILER_SAMPLE_MODE'] = os.getenv('PROFILER_SAMPLE_MODE', 'sample')  # 'sample' ou 'cprofile'
+app.config['PROFILER_SAMPLE_INTERVAL_MS'] = float(os.getenv('PROFILER_SAMPLE_INTERVAL_MS', 5))
+
+# create_app() cria as tabelas que faltarem (db.create_all); desligue quando o schema vier só de `flask db upgrade`
+app.config['AUTO_CREATE_TABLES'] = os.getenv('AUTO_CREATE_TABLES', 'true').lower() in ['true', 'on', '1']
+
+# Fila de jobs de IA: chamadas ao Gemini rodam em um pool limitado fora da requisição.
+# AI_JOB_TIMEOUT (segundos) também é repassado ao cliente da API; resultados ficam AI_JOB_RESULT_TTL segundos.
+# O estado dos jobs fica na tabela ai_job, então qualquer worker responde /ai_jobs/<id>
+app.config['AI_JOB_WORKERS'] = int(os.getenv('AI_JOB_WORKERS', 4))
+app.config['AI_JOB_PER_USER_LIMIT'] = int(os.getenv('AI_JOB_PER_USER_LIMIT', 2))
+app.config['AI_JOB_TIMEOUT'] = int(os.getenv('AI_JOB_TIMEOUT', 30))
+app.config['AI_JOB_RESULT_TTL'] = int(os.getenv('AI_JOB_RESULT_TTL', 600))
+
+# Cache de respostas da IA, chaveado pelo hash do prompt normalizado e da versão dos dados do usuário.
+# Usa o mesmo backend do dashboard (LRU local ou Redis); com AI_CACHE_PERSISTENT também grava na tabela ai_response
+app.config['AI_CACHE_TTL'] = int(os.getenv('AI_CACHE_TTL', 24 * 60 * 60))
+app.config['AI_CACHE_MAX_ENTRIES'] = int(os.getenv('AI_CACHE_MAX_ENTRIES', 1024))
+app.config['AI_CACHE_PERSISTENT'] = os.getenv('AI_CACHE_PERSISTENT', 'false').lower() in ['true', 'on', '1']
+dashboard_cache = create_cache_backend(
+    app.config['CACHE_REDIS_URL'],
+    prefix='finance:dashboard:',
+    max_entries=app.config['DASHBOARD_CACHE_MAX_ENTRIES'],
+    ttl_seconds=app.config['DASHBOARD_CACHE_TTL']
+)
+
+ai_response_cache = create_cache_backend(
+    app.config['CACHE_REDIS_URL'],
+    prefix='finance:ai:',
+    max_entries=app.config['AI_CACHE_MAX_ENTRIES'],
+    ttl_seconds=app.config['AI_CACHE_TTL']
+)
+
+ai_job_queue = AIJobQueue(
+    max_workers=app.config['AI_JOB_WORKERS'],
+    per_user_limit=app.config['AI_JOB_PER_USER_LIMIT'],
+    timeout_seconds=app.config['AI_JOB_TIMEOUT'],
+    result_ttl_seconds=app.config['AI_JOB_RESULT_TTL']
+)
+
 db = SQLAlchemy()
 migrate = Migrate() # Inicialize Migrate sem app e db ainda
 
@@ -50,18 +137,52 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+request_profiler = None
+if app.config['PROFILER_ENABLED']:
+    request_profiler = RequestProfiler(
+        app,
+        directory=app.config['PROFILER_DIR'],
+        token=app.config['PROFILER_TOKEN'],
+        sample_rate=app.config['PROFILER_SAMPLE_RATE'],
+        sample_mode=app.config['PROFILER_SAMPLE_MODE'],
+        max_files=app.config['PROFILER_MAX_FILES'],
+        sample_interval=app.config['PROFILER_SAMPLE_INTERVAL_MS'] / 1000
+    )
+
+if app.config['PERF_INSTRUMENTATION']:
+    request_instrumentation = RequestInstrumentation(
+        app,
+        slow_query_ms=app.config['SLOW_QUERY_MS'],
+        log_requests=app.config['PERF_LOG_REQUESTS']
+    )
+
 # --- Configuração de E-mail para Recuperação de Senha ---
 EMAIL_USERNAME = os.getenv('EMAIL_USERNAME')
 EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
 EMAIL_SERVER = os.getenv('EMAIL_SERVER', 'smtp.gmail.com')
 EMAIL_PORT = int(os.getenv('EMAIL_PORT', 587))
-
-# --- DEBUG: Imprimir valores das variáveis de ambiente de e-mail ---
-print(f"DEBUG APP START: EMAIL_USERNAME: {'SET' if EMAIL_USERNAME else 'NOT SET'}")
-print(f"DEBUG APP START: EMAIL_PASSWORD: {'SET' if EMAIL_PASSWORD else 'NOT SET'}")
-print(f"DEBUG APP START: EMAIL_SERVER: {EMAIL_SERVER}")
-print(f"DEBUG APP START: EMAIL_PORT: {EMAIL_PORT}")
-# --- FIM DEBUG ---
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'true').lower() in ['true', 'on', '1']
+
+# Fila de e-mails: os workers mantêm a sessão SMTP aberta entre mensagens e reenviam falhas com backoff
+app.config['MAIL_QUEUE_WORKERS'] = int(os.getenv('MAIL_QUEUE_WORKERS', 1))
+app.config['MAIL_QUEUE_MAX_SIZE'] = int(os.getenv('MAIL_QUEUE_MAX_SIZE', 1000))
+app.config['MAIL_MAX_RETRIES'] = int(os.getenv('MAIL_MAX_RETRIES', 5))
+app.config['MAIL_RETRY_BACKOFF'] = float(os.getenv('MAIL_RETRY_BACKOFF', 2.0))
+app.config['MAIL_SMTP_IDLE_TIMEOUT'] = float(os.getenv('MAIL_SMTP_IDLE_TIMEOUT', 60))
+
+mail_queue = MailQueue(
+    EMAIL_SERVER,
+    EMAIL_PORT,
+    username=EMAIL_USERNAME,
+    password=EMAIL_PASSWORD,
+    use_tls=EMAIL_USE_TLS,
+    workers=app.config['MAIL_QUEUE_WORKERS'],
+    max_size=app.config['MAIL_QUEUE_MAX_SIZE'],
+    max_retries=app.config['MAIL_MAX_RETRIES'],
+    backoff_seconds=app.config['MAIL_RETRY_BACKOFF'],
+    idle_timeout=app.config['MAIL_SMTP_IDLE_TIMEOUT'],
+    listener=app_metrics.record_mail_event
+)
 
 
 # --- Definição dos Modelos do Banco de Dados (ORM) ---
@@ -77,6 +198,12 @@ class User(UserMixin, db.Model):
     recovery_code = db.Column(db.String(6), nullable=True)
     recovery_code_expires_at = db.Column(db.DateTime, nullable=True)
 
+    # Incrementado a cada escrita nos dados do usuário; compõe a chave do cache do dashboard
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Marca d'água do processamento de recorrências: última data já processada para o usuário
+    recurring_processed_through = db.Column(db.Date, nullable=True)
+
     transactions = db.relationship('Transaction', backref='user', lazy=True, cascade='all, delete-orphan')
     bills = db.relationship('Bill', backref='user', lazy=True, cascade='all, delete-orphan')
     budgets = db.relationship('Budget', backref='user_budget_owner', lazy=True, cascade='all, delete-orphan')
@@ -88,6 +215,9 @@ class User(UserMixin, db.Model):
     # --- NOVO --- Relacionamentos para Dívidas e Investimentos
     debts = db.relationship('Debt', backref='user', lazy=True, cascade='all, delete-orphan')
     investments = db.relationship('Investment', backref='user', lazy=True, cascade='all, delete-orphan')
+    monthly_rollups = db.relationship('MonthlyRollup', backref='user', lazy=True, cascade='all, delete-orphan')
+    ai_responses = db.relationship('AIResponse', backref='user', lazy=True, cascade='all, delete-orphan')
+    ai_jobs = db.relationship('AIJobRecord', backref='user', lazy=True, cascade='all, delete-orphan')
 
 
     def set_password(self, password):
@@ -113,7 +243,10 @@ class Category(db.Model):
     budgets = db.relationship('Budget', backref='category', lazy=True) 
     subscriptions = db.relationship('Subscription', backref='category', lazy=True)
 
-    __table_args__ = (db.UniqueConstraint('name', 'type', 'user_id', name='_user_category_type_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('name', 'type', 'user_id', name='_user_category_type_uc'),
+        db.Index('ix_category_user_type', 'user_id', 'type'),
+    )
 
 
     def __repr__(self):
@@ -129,7 +262,10 @@ class Account(db.Model):
     bills = db.relationship('Bill', backref='account_bill', lazy=True)
     subscriptions = db.relationship('Subscription', backref='account', lazy=True)
 
-    __table_args__ = (db.UniqueConstraint('name', 'user_id', name='_user_account_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('name', 'user_id', name='_user_account_uc'),
+        db.Index('ix_account_user', 'user_id'),
+    )
 
     def __repr__(self):
         return f"<Account {self.name} (Balance: {self.balance:.2f})>"
@@ -139,22 +275,78 @@ class Transaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(200), nullable=False)
     amount = db.Column(db.Float, nullable=False)
-    date = db.Column(db.String(10), nullable=False) # Armazenar como StringYYYY-MM-DD
+    date = db.Column(db.Date, nullable=False)
     type = db.Column(db.String(10), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True)
     account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=True)
     goal_id = db.Column(db.Integer, db.ForeignKey('goal.id'), nullable=True)
 
+    # Índices compostos seguindo os filtros usados nas consultas por usuário.
+    # O índice (user_id, type, date, amount) cobre os SUMs do dashboard sem tocar na tabela.
+    __table_args__ = (
+        db.Index('ix_transaction_user_date', 'user_id', 'date'),
+        db.Index('ix_transaction_user_type_date_amount', 'user_id', 'type', 'date', 'amount'),
+        db.Index('ix_transaction_user_category_date', 'user_id', 'category_id', 'date'),
+    )
 
     def __repr__(self):
         return f"<Transaction {self.description} - {self.amount}>"
 
+class MonthlyRollup(db.Model):
+    """Totais de transações por usuário × mês × categoria × tipo, mantidos a cada escrita no ledger."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    month_year = db.Column(db.String(7), nullable=False) # 'YYYY-MM'
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True)
+    type = db.Column(db.String(10), nullable=False)
+    total = db.Column(db.Float, default=0.0, nullable=False)
+    transaction_count = db.Column(db.Integer, default=0, nullable=False)
+
+    # Uma linha por fatia; COALESCE porque NULLs não colidem em índice único (transações sem categoria)
+    __table_args__ = (
+        db.Index('uq_monthly_rollup_slot', user_id, month_year, db.func.coalesce(category_id, db.literal_column('0')), type, unique=True),
+    )
+
+    def __repr__(self):
+        return f"<MonthlyRollup {self.month_year} {self.type} cat={self.category_id}: {self.total}>"
+
+class AIResponse(db.Model):
+    """Respostas da IA persistidas (AI_CACHE_PERSISTENT) para sobreviver a reinícios; response guarda o JSON."""
+    __tablename__ = 'ai_response'
+    cache_key = db.Column(db.String(64), primary_key=True) # sha256 de tipo, usuário, versão dos dados e prompt
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    kind = db.Column(db.String(30), nullable=False)
+    response = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<AIResponse {self.kind} user={self.user_id} {self.cache_key[:12]}>"
+
+class AIJobRecord(db.Model):
+    """Estado dos jobs da fila de IA (ai_jobs.SQLJobStore), compartilhado entre os workers; result guarda o JSON."""
+    __tablename__ = 'ai_job'
+    id = db.Column(db.String(32), primary_key=True) # uuid4 hex
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(30), nullable=False)
+    status = db.Column(db.String(10), nullable=False) # 'pending', 'running', 'done', 'error', 'timeout', 'cancelled'
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    deadline_at = db.Column(db.DateTime, nullable=False) # Pendente: limite para começar; em execução: timeout
+
+    __table_args__ = (db.Index('ix_ai_job_user_status', 'user_id', 'status'),)
+
+    def __repr__(self):
+        return f"<AIJobRecord {self.kind} user={self.user_id} {self.status}>"
+
 class Bill(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(200), nullable=False)
     amount = db.Column(db.Float, nullable=False)
-    dueDate = db.Column(db.String(10), nullable=False) # Data de vencimento como string
+    dueDate = db.Column(db.Date, nullable=False) # Data de vencimento
     status = db.Column(db.String(10), nullable=False) # 'pending', 'paid', 'overdue'
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
@@ -163,8 +355,8 @@ class Bill(db.Model):
     recurring_child_number = db.Column(db.Integer, nullable=True)
     
     recurring_frequency = db.Column(db.String(20), nullable=True)
-    recurring_start_date = db.Column(db.String(10), nullable=True)
-    recurring_next_due_date = db.Column(db.String(10), nullable=True)
+    recurring_start_date = db.Column(db.Date, nullable=True)
+    recurring_next_due_date = db.Column(db.Date, nullable=True)
     recurring_total_occurrences = db.Column(db.Integer, nullable=True)
     recurring_installments_generated = db.Column(db.Integer, nullable=True, default=0)
     is_active_recurring = db.Column(db.Boolean, default=False, nullable=False)
@@ -175,6 +367,12 @@ class Bill(db.Model):
     payment_transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'), nullable=True)
     payment_transaction = db.relationship('Transaction', foreign_keys=[payment_transaction_id], post_update=True)
 
+    __table_args__ = (
+        db.Index('ix_bill_user_due_date', 'user_id', 'dueDate'),
+        db.Index('ix_bill_user_status_master_due_amount', 'user_id', 'status', 'is_master_recurring_bill', 'dueDate', 'amount'),
+        db.Index('ix_bill_user_master_active_next_due', 'user_id', 'is_master_recurring_bill', 'is_active_recurring', 'recurring_next_due_date'),
+        db.Index('ix_bill_recurring_parent_status', 'recurring_parent_id', 'status'),
+    )
 
     def __repr__(self):
         return f"<Bill {self.description} - {self.dueDate} - {self.status}>"
@@ -187,7 +385,10 @@ class Budget(db.Model):
     month_year = db.Column(db.String(7), nullable=False) # 'YYYY-MM'
     current_spent = db.Column(db.Float, default=0.0, nullable=False)
 
-    __table_args__ = (db.UniqueConstraint('user_id', 'category_id', 'month_year', name='_user_category_month_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'category_id', 'month_year', name='_user_category_month_uc'),
+        db.Index('ix_budget_user_month', 'user_id', 'month_year'),
+    )
 
     def __repr__(self):
         return f"<Budget {self.category.name} for {self.month_year}: {self.budget_amount}>"
@@ -198,10 +399,12 @@ class Goal(db.Model):
     name = db.Column(db.String(100), nullable=False)
     target_amount = db.Column(db.Float, nullable=False)
     current_amount = db.Column(db.Float, default=0.0, nullable=False)
-    due_date = db.Column(db.String(10), nullable=True) #YYYY-MM-DD
+    due_date = db.Column(db.Date, nullable=True)
     status = db.Column(db.String(20), default='in_progress', nullable=False) # 'in_progress', 'achieved', 'abandoned'
     transactions = db.relationship('Transaction', backref='goal', lazy=True)
 
+    __table_args__ = (db.Index('ix_goal_user_status', 'user_id', 'status'),)
+
     def __repr__(self):
         return f"<Goal {self.name}: {self.current_amount}/{self.target_amount}>"
 
@@ -212,11 +415,13 @@ class Subscription(db.Model):
     amount = db.Column(db.Float, nullable=False)
     billing_cycle = db.Column(db.String(20), nullable=False) 
     due_date_of_month = db.Column(db.Integer, nullable=False) 
-    next_due_date = db.Column(db.String(10), nullable=False) # YYYY-MM-DD
+    next_due_date = db.Column(db.Date, nullable=False)
     status = db.Column(db.String(20), default='active', nullable=False) # active, inactive, cancelled
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True)
     account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=True)
 
+    __table_args__ = (db.Index('ix_subscription_user_next_due_date', 'user_id', 'next_due_date'),)
+
     def __repr__(self):
         return f"<Subscription {self.name}: R${self.amount} {self.billing_cycle}>"
 
@@ -230,8 +435,10 @@ class Debt(db.Model):
     total_amount = db.Column(db.Float, nullable=False)
     outstanding_balance = db.Column(db.Float, nullable=False)
     interest_rate = db.Column(db.Float, nullable=True)
-    start_date = db.Column(db.String(10), nullable=False)
-    end_date = db.Column(db.String(10), nullable=True)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=True)
+
+    __table_args__ = (db.Index('ix_debt_user', 'user_id'),)
 
     def __repr__(self):
         return f"<Debt {self.name} - Outstanding: {self.outstanding_balance}>"
@@ -242,17 +449,35 @@ class Investment(db.Model):
     name = db.Column(db.String(100), nullable=False)
     type = db.Column(db.String(50), nullable=False) # Ex: Ação, Fundo, Cripto
     current_value = db.Column(db.Float, nullable=False)
-    purchase_date = db.Column(db.String(10), nullable=True)
+    purchase_date = db.Column(db.Date, nullable=True)
     institution = db.Column(db.String(100), nullable=True) # Ex: XP, Nubank, Binance
 
+    __table_args__ = (db.Index('ix_investment_user', 'user_id'),)
+
     def __repr__(self):
         return f"<Investment {self.name} - Value: {self.current_value}>"
 
 
-# --- Funções de Lógica de Negócios (TODAS DEFINIDAS ANTES DAS ROTAS) ---
+# --- Políticas de carregamento antecipado (eager loading) por view ---
+# Toda listagem cujos itens têm relacionamentos lidos em laço (no Python ou no template) passa por
+# with_eager_loading com o preset da sua view. Os relacionamentos são lazy=True; sem o preset,
+# cada objeto relacionado distinto custa uma consulta extra (N+1).
+# Os presets são funções porque os relacionamentos via backref só existem depois da configuração dos mappers.
+EAGER_LOADING_PRESETS = {
+    'transaction_list': lambda: (db.joinedload(Transaction.category),),
+    'budget_list': lambda: (db.joinedload(Budget.category),),
+    'subscription_list': lambda: (db.joinedload(Subscription.category), db.joinedload(Subscription.account)),
+}
+
+def with_eager_loading(query, preset):
+    """Aplica à consulta as opções de carregamento do preset da view."""
+    return query.options(*EAGER_LOADING_PRESETS[preset]())
 
-TODAY_DATE = datetime.date.today()
 
+# --- Funções de Lógica de Negócios (TODAS DEFINIDAS ANTES DAS ROTAS) ---
+
+# A data de hoje é lida no ponto de uso (datetime.date.today()), nunca guardada em global de módulo:
+# com preload_app os workers nascem do mestre e manteriam a data do boot indefinidamente
 def get_current_month_year_str():
     return datetime.date.today().strftime('%Y-%m')
 
@@ -262,14 +487,198 @@ def get_month_start_end_dates(month_year_str):
     end_date = start_date.replace(day=calendar.monthrange(year, month)[1])
     return start_date, end_date
 
-def add_transaction_db(description, amount, date, type, user_id, category_id=None, account_id=None, goal_id=None):
+def parse_date(value):
+    """Converte 'YYYY-MM-DD' (ou um date já convertido) em datetime.date. Valores vazios viram None."""
+    if not value:
+        return None
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(value)
+
+def format_date(value):
+    """Serializa um datetime.date como 'YYYY-MM-DD' para respostas JSON (None permanece None)."""
+    return value.isoformat() if value else None
+
+# --- Atualizações atômicas de saldos e contadores ---
+def apply_atomic_delta_db(column, delta, criteria, guard=None):
+    """
+    Soma `delta` à coluna direto no banco (UPDATE ... SET coluna = coluna + :delta WHERE ...), sem
+    o ciclo ler-alterar-gravar no Python, que perde atualizações entre workers concorrentes.
+
+    `criteria` identifica a(s) linha(s); `guard` é uma condição extra avaliada na mesma instrução
+    (ex.: saldo suficiente). Retorna o novo valor — via RETURNING quando o banco suporta — ou None
+    se nenhuma linha casou.
+    """
+    conditions = list(criteria) + ([guard] if guard is not None else [])
+    statement = db.update(column.class_).where(*conditions).values({column: column + delta}) \
+        .execution_options(synchronize_session='fetch')
+
+    if db.engine.dialect.update_returning:
+        return db.session.execute(statement.returning(column)).scalar()
+
+    if db.session.execute(statement).rowcount == 0:
+        return None
+    return db.session.query(column).filter(*criteria).scalar()
+
+def adjust_account_balance_db(account_id, delta, min_balance=None):
+    """Move o saldo da conta em `delta`. Com min_balance, só aplica se o saldo atual for >= min_balance."""
+    guard = Account.balance >= min_balance if min_balance is not None else None
+    return apply_atomic_delta_db(Account.balance, delta, [Account.id == account_id], guard)
+
+def adjust_budget_spent_db(user_id, category_id, month_year, delta):
+    """Move o gasto do orçamento da categoria no mês, se existir um."""
+    return apply_atomic_delta_db(Budget.current_spent, delta, [
+        Budget.user_id == user_id,
+        Budget.category_id == category_id,
+        Budget.month_year == month_year
+    ])
+
+def adjust_goal_amount_db(goal, delta):
+    """Move o valor acumulado da meta e ajusta o status conforme o novo valor. Retorna o novo valor."""
+    new_amount = apply_atomic_delta_db(Goal.current_amount, delta, [Goal.id == goal.id])
+    if new_amount is None:
+        return None
+    if delta > 0 and new_amount >= goal.target_amount:
+        goal.status = 'achieved'
+    elif delta < 0 and goal.status == 'achieved' and new_amount < goal.target_amount:
+        goal.status = 'in_progress'
+    return new_amount
+
+
+# --- Rollup mensal (usuário × mês × categoria × tipo) ---
+ROLLUP_UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+def update_monthly_rollup_db(user_id, date, category_id, type, amount, count=1):
+    """
+    Aplica um delta ao rollup mensal na sessão atual (sem commit), para que a
+    atualização entre na mesma transação da escrita no ledger. Para remover uma
+    transação, passe amount negativo e count=-1.
+    """
+    month_year = parse_date(date).strftime('%Y-%m')
+    insert = ROLLUP_UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+    if insert is not None:
+        # Upsert atômico: duas primeiras escritas concorrentes na mesma fatia somam na mesma linha
+        statement = insert(MonthlyRollup).values(
+            user_id=user_id, month_year=month_year, category_id=category_id, type=type, total=amount, transaction_count=count
+        )
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[MonthlyRollup.user_id, MonthlyRollup.month_year,
+                            db.func.coalesce(MonthlyRollup.category_id, db.literal_column('0')), MonthlyRollup.type],
+            set_={
+                'total': MonthlyRollup.total + statement.excluded.total,
+                'transaction_count': MonthlyRollup.transaction_count + statement.excluded.transaction_count
+            }
+        ))
+        return
+
+    def apply_delta():
+        return MonthlyRollup.query.filter_by(
+            user_id=user_id,
+            month_year=month_year,
+            category_id=category_id,
+            type=type
+        ).update({
+            MonthlyRollup.total: MonthlyRollup.total + amount,
+            MonthlyRollup.transaction_count: MonthlyRollup.transaction_count + count
+        }, synchronize_session=False)
+
+    # Demais bancos: se outra transação criar a fatia entre o UPDATE e o INSERT, o índice único
+    # rejeita o INSERT, o savepoint é desfeito e o delta é aplicado sobre a linha dela
+    if not apply_delta():
+        try:
+            with db.session.begin_nested():
+                db.session.add(MonthlyRollup(
+                    user_id=user_id,
+                    month_year=month_year,
+                    category_id=category_id,
+                    type=type,
+                    total=amount,
+                    transaction_count=count
+                ))
+        except IntegrityError:
+            apply_delta()
+
+def rebuild_monthly_rollups_db(user_id=None):
+    """Regera o rollup mensal a partir do ledger (de um usuário ou de todos). Retorna o número de linhas geradas."""
+    delete_query = MonthlyRollup.query
+    if user_id is not None:
+        delete_query = delete_query.filter_by(user_id=user_id)
+    delete_query.delete(synchronize_session=False)
+
+    year_col = db.extract('year', Transaction.date)
+    month_col = db.extract('month', Transaction.date)
+    aggregate_query = db.session.query(
+        Transaction.user_id, year_col, month_col, Transaction.category_id, Transaction.type,
+        db.func.sum(Transaction.amount), db.func.count(Transaction.id)
+    )
+    if user_id is not None:
+        aggregate_query = aggregate_query.filter(Transaction.user_id == user_id)
+    aggregate_rows = aggregate_query.group_by(
+        Transaction.user_id, year_col, month_col, Transaction.category_id, Transaction.type
+    ).all()
+
+    db.session.bulk_insert_mappings(MonthlyRollup, [
+        {
+            'user_id': row_user_id,
+            'month_year': f"{int(year):04d}-{int(month):02d}",
+            'category_id': category_id,
+            'type': t_type,
+            'total': total or 0.0,
+            'transaction_count': count
+        }
+        for row_user_id, year, month, category_id, t_type, total, count in aggregate_rows
+    ])
+    db.session.commit()
+    return len(aggregate_rows)
+
+def get_category_spent_in_month_db(user_id, category_id, month_year):
+    """Total de despesas de uma categoria no mês, lido do rollup."""
+    return db.session.query(db.func.sum(MonthlyRollup.total)).filter(
+        MonthlyRollup.user_id == user_id,
+        MonthlyRollup.category_id == int(category_id),
+        MonthlyRollup.type == 'expense',
+        MonthlyRollup.month_year == month_year
+    ).scalar() or 0.0
+
+def get_budgets_with_spent_db(user_id, month_year):
+    """Orçamentos do mês com o gasto da categoria no mês (rollup), numa única consulta: [(budget, gasto), ...]."""
+    spent_by_category = db.session.query(
+        MonthlyRollup.category_id,
+        db.func.sum(MonthlyRollup.total).label('spent')
+    ).filter(
+        MonthlyRollup.user_id == user_id,
+        MonthlyRollup.type == 'expense',
+        MonthlyRollup.month_year == month_year
+    ).group_by(MonthlyRollup.category_id).subquery()
+
+    return with_eager_loading(Budget.query, 'budget_list') \
+        .add_columns(db.func.coalesce(spent_by_category.c.spent, 0.0)) \
+        .outerjoin(spent_by_category, spent_by_category.c.category_id == Budget.category_id) \
+        .filter(Budget.user_id == user_id, Budget.month_year == month_year) \
+        .all()
+
+def get_monthly_totals_by_type_db(user_id, month_years):
+    """Soma o rollup por (mês, tipo) para os meses informados: {('YYYY-MM', 'income'): total, ...}."""
+    rows = db.session.query(MonthlyRollup.month_year, MonthlyRollup.type, db.func.sum(MonthlyRollup.total)).filter(
+        MonthlyRollup.user_id == user_id,
+        MonthlyRollup.month_year.in_(month_years)
+    ).group_by(MonthlyRollup.month_year, MonthlyRollup.type).all()
+    return {(month_year, t_type): total or 0.0 for month_year, t_type, total in rows}
+
+def add_transaction_db(description, amount, date, type, user_id, category_id=None, account_id=None, goal_id=None,
+                       require_funds=False):
+    """
+    Registra a transação e move saldo, orçamento e meta de forma atômica. Com require_funds, uma
+    despesa só é registrada se a conta tiver saldo suficiente no momento do débito; caso
+    contrário nada é gravado e a função retorna None.
+    """
     amount = float(amount)
-    date_obj = datetime.datetime.strptime(date, '%Y-%m-%d').date()
+    date_obj = parse_date(date)
 
     new_transaction = Transaction(
         description=description,
         amount=amount,
-        date=date,
+        date=date_obj,
         type=type,
         user_id=user_id,
         category_id=category_id,
@@ -278,35 +687,29 @@ def add_transaction_db(description, amount, date, type, user_id, category_id=Non
     )
     db.session.add(new_transaction)
     db.session.flush()
+    update_monthly_rollup_db(user_id, date_obj, category_id, type, amount)
 
     if account_id:
-        account = Account.query.get(account_id)
-        if account:
-            if type == 'income':
-                account.balance += amount
-            else: # expense
-                account.balance -= amount
+        if type == 'income':
+            adjust_account_balance_db(account_id, amount)
+        elif require_funds:
+            if adjust_account_balance_db(account_id, -amount, min_balance=amount) is None:
+                db.session.rollback()
+                return None
+        else: # expense
+            adjust_account_balance_db(account_id, -amount)
 
     if type == 'expense' and category_id:
-        transaction_month_year = date_obj.strftime('%Y-%m')
-        budget = Budget.query.filter_by(
-            user_id=user_id,
-            category_id=category_id,
-            month_year=transaction_month_year
-        ).first()
-        if budget:
-            budget.current_spent += amount
-            db.session.add(budget)
+        adjust_budget_spent_db(user_id, category_id, date_obj.strftime('%Y-%m'), amount)
 
     if goal_id:
         goal = Goal.query.get(goal_id)
         if goal and goal.user_id == user_id:
-            goal.current_amount += amount
-            if goal.current_amount >= goal.target_amount:
-                goal.status = 'achieved'
+            adjust_goal_amount_db(goal, amount)
+            if goal.status == 'achieved':
                 flash(f'Parabéns! Com esta transação, a meta "{goal.name}" foi atingida!', 'success')
-            db.session.add(goal)
     
+    bump_user_data_version(user_id)
     db.session.commit()
     return new_transaction
 
@@ -320,31 +723,28 @@ def edit_transaction_db(transaction_id, description, amount, date, type, user_id
     old_category_id = transaction.category_id
     old_account_id = transaction.account_id
     old_goal_id = transaction.goal_id
-    old_date_obj = datetime.datetime.strptime(transaction.date, '%Y-%m-%d').date()
+    old_date_obj = transaction.date
 
     new_amount = float(amount)
-    new_date_obj = datetime.datetime.strptime(date, '%Y-%m-%d').date()
+    new_date_obj = parse_date(date)
 
     # Reverte valores antigos
     if old_account_id:
-        old_account = Account.query.get(old_account_id)
-        if old_account:
-            if old_type == 'income': old_account.balance -= old_amount
-            else: old_account.balance += old_amount
+        adjust_account_balance_db(old_account_id, -old_amount if old_type == 'income' else old_amount)
     if old_type == 'expense' and old_category_id:
-        old_budget = Budget.query.filter_by(user_id=user_id, category_id=old_category_id, month_year=old_date_obj.strftime('%Y-%m')).first()
-        if old_budget: old_budget.current_spent -= old_amount
+        adjust_budget_spent_db(user_id, old_category_id, old_date_obj.strftime('%Y-%m'), -old_amount)
     if old_goal_id:
         old_goal = Goal.query.get(old_goal_id)
         if old_goal:
-            old_goal.current_amount -= old_amount
-            if old_goal.status == 'achieved' and old_goal.current_amount < old_goal.target_amount:
-                old_goal.status = 'in_progress'
+            adjust_goal_amount_db(old_goal, -old_amount)
+
+    update_monthly_rollup_db(user_id, old_date_obj, old_category_id, old_type, -old_amount, count=-1)
+    update_monthly_rollup_db(user_id, new_date_obj, category_id, type, new_amount)
 
     # Atualiza a transação
     transaction.description = description
     transaction.amount = new_amount
-    transaction.date = date
+    transaction.date = new_date_obj
     transaction.type = type
     transaction.category_id = category_id
     transaction.account_id = account_id
@@ -352,21 +752,17 @@ def edit_transaction_db(transaction_id, description, amount, date, type, user_id
 
     # Aplica novos valores
     if account_id:
-        new_account = Account.query.get(account_id)
-        if new_account:
-            if type == 'income': new_account.balance += new_amount
-            else: new_account.balance -= new_amount
+        adjust_account_balance_db(account_id, new_amount if type == 'income' else -new_amount)
     if type == 'expense' and category_id:
-        new_budget = Budget.query.filter_by(user_id=user_id, category_id=category_id, month_year=new_date_obj.strftime('%Y-%m')).first()
-        if new_budget: new_budget.current_spent += new_amount
+        adjust_budget_spent_db(user_id, category_id, new_date_obj.strftime('%Y-%m'), new_amount)
     if goal_id:
         new_goal = Goal.query.get(goal_id)
         if new_goal:
-            new_goal.current_amount += new_amount
-            if new_goal.current_amount >= new_goal.target_amount:
-                new_goal.status = 'achieved'
+            adjust_goal_amount_db(new_goal, new_amount)
+            if new_goal.status == 'achieved':
                 flash(f'Parabéns! Com esta transação, a meta "{new_goal.name}" foi atingida!', 'success')
 
+    bump_user_data_version(user_id)
     db.session.commit()
     return True
 
@@ -376,105 +772,107 @@ def delete_transaction_db(transaction_id, user_id):
         return False
 
     if transaction.account_id:
-        account = Account.query.get(transaction.account_id)
-        if account:
-            if transaction.type == 'income':
-                account.balance -= transaction.amount
-            else: # expense
-                account.balance += transaction.amount
+        adjust_account_balance_db(transaction.account_id, -transaction.amount if transaction.type == 'income' else transaction.amount)
 
     if transaction.type == 'expense' and transaction.category_id:
-        transaction_month_year = datetime.datetime.strptime(transaction.date, '%Y-%m-%d').strftime('%Y-%m')
-        budget = Budget.query.filter_by(
-            user_id=user_id,
-            category_id=transaction.category_id,
-            month_year=transaction_month_year
-        ).first()
-        if budget:
-            budget.current_spent -= transaction.amount
-            db.session.add(budget)
+        adjust_budget_spent_db(user_id, transaction.category_id, transaction.date.strftime('%Y-%m'), -transaction.amount)
 
     if transaction.goal_id:
         goal = Goal.query.get(transaction.goal_id)
         if goal and goal.user_id == user_id:
-            goal.current_amount -= transaction.amount
-            if goal.status == 'achieved' and goal.current_amount < goal.target_amount:
-                goal.status = 'in_progress'
-            db.session.add(goal)
+            adjust_goal_amount_db(goal, -transaction.amount)
     
+    update_monthly_rollup_db(user_id, transaction.date, transaction.category_id, transaction.type, -transaction.amount, count=-1)
     db.session.delete(transaction)
+    bump_user_data_version(user_id)
     db.session.commit()
     return True
 
+def _recurring_step(frequency, steps):
+    """Deslocamento de `steps` ocorrências para a frequência de uma série recorrente."""
+    if frequency == 'monthly' or frequency == 'installments':
+        return relativedelta(months=steps)
+    elif frequency == 'weekly':
+        return relativedelta(weeks=steps)
+    elif frequency == 'yearly':
+        return relativedelta(years=steps)
+    return relativedelta()
+
+def expand_recurring_series(master_bill):
+    """Calcula de uma vez as ocorrências da série: lista de (número da ocorrência, data de vencimento)."""
+    total_to_generate = master_bill.recurring_total_occurrences if master_bill.recurring_total_occurrences and master_bill.recurring_total_occurrences > 0 else 12
+    return [
+        (i, master_bill.recurring_start_date + _recurring_step(master_bill.recurring_frequency, i - 1))
+        for i in range(1, total_to_generate + 1)
+    ]
+
 def _generate_future_recurring_bills(master_bill):
-    print(f"DEBUG: _generate_future_recurring_bills chamada para master_bill ID: {master_bill.id}, Desc: {master_bill.description}")
-    
+    """
+    Regera as Bills filhas de uma mestra recorrente por diferença: expande a série, compara com as
+    filhas existentes (uma consulta), insere as que faltam em lote e apaga em lote as pendentes
+    obsoletas, tudo em um único commit. Filhas pagas ou em atraso são preservadas.
+    """
     if not master_bill.id:
         print("ERROR: Master Bill does not have an ID yet. Cannot generate children.")
         return
 
-    generated_count_for_master = 0
-    
-    Bill.query.filter_by(recurring_parent_id=master_bill.id, user_id=master_bill.user_id, status='pending').delete()
-    db.session.commit()
-
-    current_occurrence_date_from_master_start = datetime.datetime.strptime(master_bill.recurring_start_date, '%Y-%m-%d').date()
-    
-    total_to_generate = master_bill.recurring_total_occurrences if master_bill.recurring_total_occurrences and master_bill.recurring_total_occurrences > 0 else 12
-    
-    print(f"DEBUG: Total de ocorrências para gerar para {master_bill.description}: {total_to_generate}")
+    today = datetime.date.today()
 
-    for i in range(1, total_to_generate + 1):
-        occurrence_date_for_child = datetime.datetime.strptime(master_bill.recurring_start_date, '%Y-%m-%d').date()
-        
-        if master_bill.recurring_frequency == 'monthly' or master_bill.recurring_frequency == 'installments':
-            occurrence_date_for_child += relativedelta(months=i-1)
-        elif master_bill.recurring_frequency == 'weekly':
-            occurrence_date_for_child += relativedelta(weeks=i-1)
-        elif master_bill.recurring_frequency == 'yearly':
-            occurrence_date_for_child += relativedelta(years=i-1)
-
-        existing_child_item = Bill.query.filter_by(
-            recurring_parent_id=master_bill.id,
-            dueDate=occurrence_date_for_child.isoformat(),
-            recurring_child_number=i,
-            user_id=master_bill.user_id
-        ).first()
-
-        if not existing_child_item:
-            if master_bill.recurring_frequency == 'installments' and master_bill.recurring_total_occurrences > 0:
-                child_description = f"{master_bill.description.replace(' (Mestra)', '')} (Parcela {i}/{master_bill.recurring_total_occurrences})"
-            else:
-                child_description = master_bill.description.replace(' (Mestra)', '')
-
-            new_child_bill_status = 'pending'
-            if occurrence_date_for_child < TODAY_DATE:
-                new_child_bill_status = 'overdue'
-
-            new_child_bill = Bill(
-                description=child_description,
-                amount=master_bill.amount,
-                dueDate=occurrence_date_for_child.isoformat(),
-                status=new_child_bill_status,
-                user_id=master_bill.user_id,
-                recurring_parent_id=master_bill.id,
-                recurring_child_number=i,
-                is_master_recurring_bill=False,
-                recurring_frequency=None,
-                recurring_start_date=None,
-                recurring_next_due_date=None,
-                recurring_total_occurrences=0,
-                recurring_installments_generated=0,
-                is_active_recurring=False,
-                type=master_bill.type,
-                category_id=master_bill.category_id,
-                account_id=master_bill.account_id
-            )
-            db.session.add(new_child_bill)
-            generated_count_for_master += 1
-            print(f"    Gerada Bill filha: {child_description} em {occurrence_date_for_child.isoformat()} com status {new_child_bill_status}")
+    base_description = master_bill.description.replace(' (Mestra)', '')
+    is_installments = master_bill.recurring_frequency == 'installments' and master_bill.recurring_total_occurrences > 0
+
+    desired_children = {}
+    for occurrence_number, occurrence_date in expand_recurring_series(master_bill):
+        desired_children[(occurrence_number, occurrence_date)] = {
+            'description': f"{base_description} (Parcela {occurrence_number}/{master_bill.recurring_total_occurrences})" if is_installments else base_description,
+            'amount': master_bill.amount,
+            'dueDate': occurrence_date,
+            'status': 'overdue' if occurrence_date < today else 'pending',
+            'user_id': master_bill.user_id,
+            'recurring_parent_id': master_bill.id,
+            'recurring_child_number': occurrence_number,
+            'is_master_recurring_bill': False,
+            'recurring_total_occurrences': 0,
+            'recurring_installments_generated': 0,
+            'is_active_recurring': False,
+            'type': master_bill.type,
+            'category_id': master_bill.category_id,
+            'account_id': master_bill.account_id
+        }
+
+    existing_children = db.session.query(
+        Bill.id, Bill.recurring_child_number, Bill.dueDate, Bill.status, Bill.description,
+        Bill.amount, Bill.type, Bill.category_id, Bill.account_id
+    ).filter_by(recurring_parent_id=master_bill.id, user_id=master_bill.user_id).all()
+
+    # Ocorrências já ocupadas por filhas não pendentes (pagas/em atraso) não são regeradas
+    settled_slots = {(c.recurring_child_number, c.dueDate) for c in existing_children if c.status != 'pending'}
+
+    kept_slots = set()
+    stale_child_ids = []
+    for child in existing_children:
+        if child.status != 'pending':
+            continue
+        slot = (child.recurring_child_number, child.dueDate)
+        desired = desired_children.get(slot)
+        if (desired is None or slot in settled_slots or slot in kept_slots or
+                (child.status, child.description, child.amount, child.type, child.category_id, child.account_id) !=
+                (desired['status'], desired['description'], desired['amount'], desired['type'], desired['category_id'], desired['account_id'])):
+            stale_child_ids.append(child.id)
         else:
-            print(f"    Bill filha já existe para {master_bill.description}, ocorrência {i} em {occurrence_date_for_child.isoformat()}, pulando.")
+            kept_slots.add(slot)
+
+    missing_children = [row for slot, row in desired_children.items() if slot not in settled_slots and slot not in kept_slots]
+
+    if stale_child_ids:
+        Bill.query.filter(Bill.id.in_(stale_child_ids)).delete(synchronize_session=False)
+    if missing_children:
+        db.session.execute(db.insert(Bill), missing_children)
+        app_metrics.recurring_bills_generated.inc(len(missing_children))
+
+    generated_count_for_master = len(kept_slots) + len(missing_children)
+    print(f"DEBUG: Série '{master_bill.description}' (ID: {master_bill.id}): {len(missing_children)} filhas inseridas, "
+          f"{len(stale_child_ids)} pendentes obsoletas removidas, {len(kept_slots)} mantidas.")
 
     master_bill.recurring_installments_generated = generated_count_for_master
     
@@ -486,53 +884,156 @@ def _generate_future_recurring_bills(master_bill):
             master_bill.is_active_recurring = False
             master_bill.recurring_next_due_date = None # Não há mais datas futuras
         else:
-            next_due_date_for_master = datetime.datetime.strptime(master_bill.recurring_start_date, '%Y-%m-%d').date()
-            if master_bill.recurring_frequency == 'monthly' or master_bill.recurring_frequency == 'installments':
-                next_due_date_for_master += relativedelta(months=next_occurrence_number - 1)
-            elif master_bill.recurring_frequency == 'weekly':
-                next_due_date_for_master += relativedelta(weeks=next_occurrence_number - 1)
-            elif master_bill.recurring_frequency == 'yearly':
-                next_due_date_for_master += relativedelta(years=next_occurrence_number - 1)
-            master_bill.recurring_next_due_date = next_due_date_for_master.isoformat()
+            master_bill.recurring_next_due_date = master_bill.recurring_start_date + _recurring_step(master_bill.recurring_frequency, next_occurrence_number - 1)
             print(f"DEBUG: Próximo vencimento da semente '{master_bill.description}' atualizado para: {master_bill.recurring_next_due_date}")
     else: # Indefinido (recurring_total_occurrences é 0)
-        next_due_date_for_master = TODAY_DATE
-        if master_bill.recurring_frequency == 'monthly' or master_bill.recurring_frequency == 'installments':
-            next_due_date_for_master += relativedelta(months=1)
-        elif master_bill.recurring_frequency == 'weekly':
-            next_due_date_for_master += relativedelta(weeks=1)
-        elif master_bill.recurring_frequency == 'yearly':
-            next_due_date_for_master += relativedelta(years=1)
-        
-        master_bill.recurring_next_due_date = next_due_date_for_master.isoformat()
+        master_bill.recurring_next_due_date = today + _recurring_step(master_bill.recurring_frequency, 1)
         print(f"DEBUG: Próximo vencimento da semente '{master_bill.description}' (indefinida) atualizado para: {master_bill.recurring_next_due_date}")
 
     db.session.add(master_bill)
+    bump_user_data_version(master_bill.user_id)
     db.session.commit()
     # --- FIM DA CORREÇÃO ---
 
-def process_recurring_items_on_access(user_id):
-    """Processa Bills mestras recorrentes e Assinaturas que precisam gerar novas ocorrências."""
+def claim_due_recurring_bill_db(bill_id, as_of):
+    """
+    Reivindica uma Bill mestra vencida antes de regerar as filhas: UPDATE condicional na própria
+    linha, que o banco serializa entre processos (lock da linha no PostgreSQL, de escrita no
+    SQLite) até o commit. Quem chega depois só casa se a mestra continuar vencida e, nesse caso,
+    já enxerga as filhas geradas pelo primeiro. Retorna True se a mestra foi reivindicada.
+    """
+    return Bill.query.filter(
+        Bill.id == bill_id,
+        Bill.is_active_recurring == True,
+        Bill.recurring_next_due_date <= as_of
+    ).update({Bill.recurring_next_due_date: Bill.recurring_next_due_date}, synchronize_session=False) == 1
+
+def process_recurring_items_for_user(user_id, as_of=None):
+    """
+    Processa Bills mestras recorrentes e Assinaturas que precisam gerar novas ocorrências e avança a marca d'água.
+    Seguro com vários processos ao mesmo tempo (agendador e workers): cada mestra e cada
+    assinatura é reivindicada no banco antes de gerar qualquer coisa.
+    """
+    as_of = as_of or datetime.date.today()
     recurring_seed_bills_to_process = Bill.query.filter(
         Bill.user_id == user_id,
         Bill.is_master_recurring_bill == True,
         Bill.is_active_recurring == True,
-        db.cast(Bill.recurring_next_due_date, db.Date) <= TODAY_DATE
+        Bill.recurring_next_due_date <= as_of
     ).all()
-    
-    print(f"\n--- process_recurring_items_on_access chamada. Processando {len(recurring_seed_bills_to_process)} Bills mestras recorrentes devidas ---")
+
+    print(f"\n--- process_recurring_items_for_user chamada. Processando {len(recurring_seed_bills_to_process)} Bills mestras recorrentes devidas ---")
 
     for bill_seed in recurring_seed_bills_to_process:
+        if not claim_due_recurring_bill_db(bill_seed.id, as_of):
+            db.session.rollback()
+            print(f"    Mestra '{bill_seed.description}' (ID: {bill_seed.id}) já processada por outro processo.")
+            continue
+        db.session.refresh(bill_seed)
         print(f"    Acionando geração em massa para mestra '{bill_seed.description}' (ID: {bill_seed.id}) por estar vencida.")
         _generate_future_recurring_bills(bill_seed)
-    
-    process_subscriptions_and_generate_transactions(user_id, db, Transaction, Subscription, Account, Category, TODAY_DATE)
+
+    process_subscriptions_and_generate_transactions(user_id, db, Transaction, Subscription, Account, Category, as_of,
+                                                    rollup_recorder=_record_generated_subscription_transaction)
+
+    User.query.filter_by(id=user_id).update({User.recurring_processed_through: as_of}, synchronize_session=False)
+    db.session.commit()
+
+def process_recurring_items_on_access(user):
+    """
+    Caminho da requisição: só compara a marca d'água do usuário com a data de hoje.
+    O processamento em si fica com o agendador (flask process-recurring ou o worker periódico);
+    se ele ainda não rodou hoje, processa aqui como fallback, a menos que
+    RECURRING_PROCESS_ON_ACCESS esteja desligado.
+    """
+    if user.recurring_processed_through and user.recurring_processed_through >= datetime.date.today():
+        return
+    if not app.config['RECURRING_PROCESS_ON_ACCESS']:
+        return
+    process_recurring_items_for_user(user.id)
+
+def process_all_recurring_items_db(as_of=None, batch_size=500):
+    """
+    Processa as recorrências de todos os usuários com marca d'água atrasada, em lotes por id.
+    Por lote, descobre com duas consultas quais usuários têm algo devido; os demais só têm a
+    marca d'água avançada em um único UPDATE. Retorna (usuários verificados, usuários processados).
+    """
+    as_of = as_of or datetime.date.today()
+    checked_users, processed_users = 0, 0
+    last_user_id = 0
+
+    while True:
+        user_ids = [row.id for row in db.session.query(User.id).filter(
+            User.id > last_user_id,
+            db.or_(User.recurring_processed_through == None, User.recurring_processed_through < as_of)
+        ).order_by(User.id.asc()).limit(batch_size).all()]
+        if not user_ids:
+            break
+        last_user_id = user_ids[-1]
+        checked_users += len(user_ids)
+
+        due_user_ids = {row.user_id for row in db.session.query(Bill.user_id).filter(
+            Bill.user_id.in_(user_ids),
+            Bill.is_master_recurring_bill == True,
+            Bill.is_active_recurring == True,
+            Bill.recurring_next_due_date <= as_of
+        ).distinct()}
+        due_user_ids.update(row.user_id for row in db.session.query(Subscription.user_id).filter(
+            Subscription.user_id.in_(user_ids),
+            Subscription.status == 'active',
+            Subscription.next_due_date <= as_of
+        ).distinct())
+
+        for user_id in sorted(due_user_ids):
+            try:
+                process_recurring_items_for_user(user_id, as_of)
+                processed_users += 1
+            except Exception as e:
+                db.session.rollback()
+                print(f"ERRO ao processar recorrências do usuário {user_id}: {e}")
+
+        idle_user_ids = [user_id for user_id in user_ids if user_id not in due_user_ids]
+        if idle_user_ids:
+            User.query.filter(User.id.in_(idle_user_ids)).update(
+                {User.recurring_processed_through: as_of}, synchronize_session=False
+            )
+            db.session.commit()
+
+    return checked_users, processed_users
+
+def run_recurring_scheduler(interval_seconds, batch_size=None):
+    """Roda process_all_recurring_items_db a cada intervalo, para sempre (thread do agendador ou `flask process-recurring --every`)."""
+    while True:
+        with app.app_context():
+            try:
+                checked_users, processed_users = process_all_recurring_items_db(
+                    batch_size=batch_size or app.config['RECURRING_BATCH_SIZE']
+                )
+                print(f"Agendador de recorrências: {checked_users} usuários verificados, {processed_users} processados.")
+            except Exception as e:
+                db.session.rollback()
+                print(f"ERRO no agendador de recorrências: {e}")
+            finally:
+                db.session.remove()
+        time.sleep(interval_seconds)
+
+def start_recurring_scheduler(interval_seconds):
+    """Inicia run_recurring_scheduler em uma thread daemon."""
+    worker = threading.Thread(target=run_recurring_scheduler, args=(interval_seconds,), name='recurring-scheduler', daemon=True)
+    worker.start()
+    return worker
+
+def _record_generated_subscription_transaction(user_id, date, category_id, type, amount):
+    update_monthly_rollup_db(user_id, date, category_id, type, amount)
+    app_metrics.subscription_transactions_generated.inc()
+    bump_user_data_version(user_id)
 
 
 def add_bill_db(description, amount, due_date, user_id, 
                 is_recurring=False, recurring_frequency=None, recurring_total_occurrences=0, bill_type='expense', category_id=None, account_id=None):
     
     amount = float(amount)
+    due_date = parse_date(due_date)
     if is_recurring and recurring_frequency == 'installments' and (recurring_total_occurrences is None or recurring_total_occurrences < 1):
         recurring_total_occurrences = 1 
     elif not is_recurring or recurring_frequency != 'installments':
@@ -556,6 +1057,7 @@ def add_bill_db(description, amount, due_date, user_id,
         account_id=account_id
     )
     db.session.add(new_bill)
+    bump_user_data_version(user_id)
     db.session.commit()
     
     if new_bill.is_master_recurring_bill and new_bill.is_active_recurring:
@@ -596,40 +1098,45 @@ def pay_bill_db(bill_id, user_id, payment_account_id): # Adicionado payment_acco
     new_payment_transaction = add_transaction_db(
         description=f"Pagamento: {bill.description}",
         amount=bill.amount,
-        date=TODAY_DATE.isoformat(),
+        date=datetime.date.today(),
         type='expense',
         user_id=user_id,
         category_id=category_for_payment_id,
-        account_id=payment_account_id # Usa payment_account_id
+        account_id=payment_account_id, # Usa payment_account_id
+        require_funds=True
     )
 
-    if new_payment_transaction:
-        bill.payment_transaction_id = new_payment_transaction.id
-        bill.status = 'paid'
-        db.session.add(bill)
-        
-        master_bill_to_process = None
-        if bill.is_master_recurring_bill:
-            master_bill_to_process = bill
-        elif bill.recurring_parent_id:
-            master_bill_to_process = Bill.query.filter_by(id=bill.recurring_parent_id, user_id=user_id, is_master_recurring_bill=True).first()
-
-        if master_bill_to_process and master_bill_to_process.is_active_recurring:
-            _generate_future_recurring_bills(master_bill_to_process)
+    if not new_payment_transaction:
+        # Outro pagamento concorrente consumiu o saldo entre a verificação acima e o débito
+        flash(f'Saldo insuficiente na conta {account.name} para pagar a conta "{bill.description}".', 'danger')
+        return False
 
-        db.session.commit()
-        return True
+    bill.payment_transaction_id = new_payment_transaction.id
+    bill.status = 'paid'
+    db.session.add(bill)
     
-    return False
+    master_bill_to_process = None
+    if bill.is_master_recurring_bill:
+        master_bill_to_process = bill
+    elif bill.recurring_parent_id:
+        master_bill_to_process = Bill.query.filter_by(id=bill.recurring_parent_id, user_id=user_id, is_master_recurring_bill=True).first()
+
+    if master_bill_to_process and master_bill_to_process.is_active_recurring:
+        _generate_future_recurring_bills(master_bill_to_process)
+
+    bump_user_data_version(user_id)
+    db.session.commit()
+    return True
 
 
 def reschedule_bill_db(bill_id, new_date, user_id):
     bill = Bill.query.filter_by(id=bill_id, user_id=user_id).first()
     if bill:
-        bill.dueDate = new_date
-        if datetime.datetime.strptime(new_date, '%Y-%m-%d').date() >= TODAY_DATE and bill.status == 'overdue':
+        bill.dueDate = parse_date(new_date)
+        if bill.dueDate >= datetime.date.today() and bill.status == 'overdue':
             bill.status = 'pending'
         db.session.add(bill)
+        bump_user_data_version(user_id)
         db.session.commit()
         return True
     return False
@@ -645,22 +1152,15 @@ def delete_bill_db(bill_id, user_id):
         payment_transaction = Transaction.query.get(bill.payment_transaction_id)
         if payment_transaction and payment_transaction.user_id == user_id:
             if payment_transaction.account_id:
-                account = Account.query.get(payment_transaction.account_id)
-                if account:
-                    account.balance += payment_transaction.amount
-                    db.session.add(account)
+                adjust_account_balance_db(payment_transaction.account_id, payment_transaction.amount)
 
             if payment_transaction.type == 'expense' and payment_transaction.category_id:
-                transaction_month_year = datetime.datetime.strptime(payment_transaction.date, '%Y-%m-%d').strftime('%Y-%m')
-                budget = Budget.query.filter_by(
-                    user_id=user_id,
-                    category_id=payment_transaction.category_id,
-                    month_year=transaction_month_year
-                ).first()
-                if budget:
-                    budget.current_spent -= payment_transaction.amount
-                    db.session.add(budget)
-                    print(f"DEBUG: Budget {budget.category.name} reverted for deleted payment. New spent: {budget.current_spent}")
+                new_spent = adjust_budget_spent_db(user_id, payment_transaction.category_id,
+                                                   payment_transaction.date.strftime('%Y-%m'), -payment_transaction.amount)
+                if new_spent is not None:
+                    print(f"DEBUG: Budget da categoria {payment_transaction.category_id} revertido para o pagamento excluído. Novo gasto: {new_spent}")
+            update_monthly_rollup_db(user_id, payment_transaction.date, payment_transaction.category_id,
+                                     payment_transaction.type, -payment_transaction.amount, count=-1)
             db.session.delete(payment_transaction)
             print(f"DEBUG: Deleted associated payment transaction ID: {payment_transaction.id}")
         else:
@@ -674,6 +1174,7 @@ def delete_bill_db(bill_id, user_id):
         print(f"DEBUG: Deleted {len(child_bills)} child bills for master '{bill.description}'.")
         
         db.session.delete(bill)
+        bump_user_data_version(user_id)
         db.session.commit()
         print(f"DEBUG: Master bill '{bill.description}' (ID: {bill.id}) and its children deleted.")
         return True
@@ -699,16 +1200,19 @@ def delete_bill_db(bill_id, user_id):
                 db.session.delete(child)
                 print(f"DEBUG: Deleting another child bill (from master): ID {child.id}, Desc: '{child.description}'")
             
+            bump_user_data_version(user_id)
             db.session.commit()
             print(f"DEBUG: Recurring series for master '{master_bill.description}' (ID: {master_bill.id}) cancelled and all its children deleted.")
             return True
         else:
             print(f"DEBUG: Child bill '{bill.description}' (ID: {bill.id}) deleted, but master recurring bill (ID: {bill.recurring_parent_id}) not found or is not a master.")
             db.session.delete(bill)
+            bump_user_data_version(user_id)
             db.session.commit()
             return True
     else:
         db.session.delete(bill)
+        bump_user_data_version(user_id)
         db.session.commit()
         print(f"DEBUG: Non-recurring bill '{bill.description}' (ID: {bill.id}) deleted.")
         return True
@@ -722,7 +1226,7 @@ def edit_bill_db(bill_id, description, amount, dueDate, user_id,
 
     bill.description = description
     bill.amount = float(amount)
-    bill.dueDate = dueDate
+    bill.dueDate = parse_date(dueDate)
     bill.type = bill_type
     bill.category_id = category_id
     bill.account_id = account_id
@@ -771,47 +1275,40 @@ def edit_bill_db(bill_id, description, amount, dueDate, user_id,
         bill.recurring_total_occurrences = 0
         bill.recurring_installments_generated = 0
 
+    bump_user_data_version(user_id)
     db.session.commit()
     return True
 
 # --- ALTERADO --- Função do dashboard para incluir Dívidas, Investimentos e Patrimônio Líquido
 def get_dashboard_data_db(user_id):
-    current_month_start = TODAY_DATE.replace(day=1)
+    current_month_start = datetime.date.today().replace(day=1)
     next_month_start = (current_month_start + relativedelta(months=1))
-    
-    start_date_str = current_month_start.isoformat()
-    end_date_str = next_month_start.isoformat()
 
     total_balance = db.session.query(db.func.sum(Account.balance)).filter_by(user_id=user_id).scalar() or 0.0
 
-    monthly_income = db.session.query(db.func.sum(Transaction.amount)).filter(
-        Transaction.user_id == user_id,
-        Transaction.type == 'income',
-        Transaction.date >= start_date_str,
-        Transaction.date < end_date_str
-    ).scalar() or 0.0
-
-    monthly_expenses = db.session.query(db.func.sum(Transaction.amount)).filter(
-        Transaction.user_id == user_id,
-        Transaction.type == 'expense',
-        Transaction.date >= start_date_str,
-        Transaction.date < end_date_str
-    ).scalar() or 0.0
+    current_month_year = current_month_start.strftime('%Y-%m')
+    monthly_totals = get_monthly_totals_by_type_db(user_id, [current_month_year])
+    monthly_income = monthly_totals.get((current_month_year, 'income'), 0.0)
+    monthly_expenses = monthly_totals.get((current_month_year, 'expense'), 0.0)
     
     monthly_pending_bills_amount = db.session.query(db.func.sum(Bill.amount)).filter(
         Bill.user_id == user_id,
         Bill.status == 'pending',
         Bill.is_master_recurring_bill == False,
-        db.cast(Bill.dueDate, db.Date) < next_month_start,
-        db.cast(Bill.dueDate, db.Date) >= current_month_start.replace(day=1)
+        Bill.dueDate < next_month_start,
+        Bill.dueDate >= current_month_start
     ).scalar() or 0.0
 
-    all_pending_bills_list = Bill.query.filter(
-        Bill.user_id == user_id,
-        Bill.status == 'pending',
-        Bill.is_master_recurring_bill == False,
-        db.cast(Bill.dueDate, db.Date) < next_month_start
-    ).order_by(db.cast(Bill.dueDate, db.Date).asc()).all()
+    all_pending_bills_list = [
+        {'id': bill.id, 'description': bill.description, 'amount': bill.amount,
+         'dueDate': format_date(bill.dueDate), 'status': bill.status}
+        for bill in Bill.query.filter(
+            Bill.user_id == user_id,
+            Bill.status == 'pending',
+            Bill.is_master_recurring_bill == False,
+            Bill.dueDate < next_month_start
+        ).order_by(Bill.dueDate.asc()).all()
+    ]
 
     # --- NOVO --- Cálculos de Dívidas e Investimentos
     total_investments = db.session.query(db.func.sum(Investment.current_value)).filter_by(user_id=user_id).scalar() or 0.0
@@ -831,18 +1328,166 @@ def get_dashboard_data_db(user_id):
         'net_worth': net_worth
     }
 
+def bump_user_data_version(user_id):
+    """Invalida os dados cacheados do usuário; deve rodar na mesma transação da escrita."""
+    User.query.filter_by(id=user_id).update({User.data_version: User.data_version + 1}, synchronize_session=False)
+
+def get_dashboard_data_cached(user):
+    """Dashboard do usuário via cache, chaveado por usuário, versão dos dados e dia."""
+    cache_key = f"{user.id}:{user.data_version}:{datetime.date.today().isoformat()}"
+    dashboard_data = dashboard_cache.get(cache_key)
+    if dashboard_data is None:
+        dashboard_data = get_dashboard_data_db(user.id)
+        dashboard_cache.set(cache_key, dashboard_data)
+    return dashboard_data
+
 # --- FUNÇÕES GEMINI ---
-def generate_text_with_gemini(prompt_text):
+_genai = None
+
+def get_genai():
+    """
+    Importa e configura google.generativeai na primeira chamada de IA. A importação custa perto
+    de um segundo e dezenas de MB, então só os processos que realmente chamam a IA pagam por ela.
+    """
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=GEMINI_API_KEY)
+        _genai = genai
+    return _genai
+
+GEMINI_FALLBACK_MESSAGE = "Não foi possível gerar uma sugestão/resumo no momento. Verifique sua chave de API e conexão."
+
+def request_gemini_text(prompt_text, timeout=None):
+    """Chama o Gemini e retorna o texto da resposta; erros da API são propagados."""
+    app_metrics.gemini_calls.inc()
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(prompt_text)
+        model = get_genai().GenerativeModel('gemini-1.5-flash')
+        request_options = {'timeout': timeout} if timeout else None
+        response = model.generate_content(prompt_text, request_options=request_options)
         return response.text
+    except Exception:
+        app_metrics.gemini_failures.inc()
+        raise
+
+def generate_text_with_gemini(prompt_text, timeout=None):
+    try:
+        return request_gemini_text(prompt_text, timeout)
+    except Exception as e:
+        print(f"ERROR: Erro ao chamar Gemini API: {e}")
+        return GEMINI_FALLBACK_MESSAGE
+
+# --- CACHE DE RESPOSTAS DA IA ---
+def ai_cache_key(kind, user_id, data_version, prompt_text):
+    """Chave do cache de IA: sha256 do tipo, usuário, versão dos dados e prompt com espaços normalizados."""
+    normalized_prompt = " ".join(prompt_text.split())
+    payload = f"{kind}\n{user_id}\n{data_version}\n{normalized_prompt}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def get_cached_ai_response(cache_key):
+    """Busca no cache em memória/Redis e, com AI_CACHE_PERSISTENT, na tabela ai_response. Retorna None se não houver."""
+    value = ai_response_cache.get(cache_key)
+    if value is None and app.config['AI_CACHE_PERSISTENT']:
+        stored = db.session.get(AIResponse, cache_key)
+        now = datetime.datetime.now()
+        if stored is not None and stored.expires_at > now:
+            value = json.loads(stored.response)
+            ai_response_cache.set(cache_key, value, ttl_seconds=(stored.expires_at - now).total_seconds())
+    return value
+
+def store_ai_response(cache_key, user_id, kind, value):
+    """Guarda uma resposta válida da IA (texto ou JSON já interpretado); respostas de erro não devem passar por aqui."""
+    ai_response_cache.set(cache_key, value)
+    if app.config['AI_CACHE_PERSISTENT']:
+        now = datetime.datetime.now()
+        AIResponse.query.filter(AIResponse.user_id == user_id, AIResponse.expires_at <= now).delete(synchronize_session=False)
+        db.session.merge(AIResponse(
+            cache_key=cache_key,
+            user_id=user_id,
+            kind=kind,
+            response=json.dumps(value),
+            expires_at=now + datetime.timedelta(seconds=app.config['AI_CACHE_TTL'])
+        ))
+        db.session.commit()
+
+def generate_ai_insight_job(user_id, cache_key, prompt_text):
+    """Job da fila de IA para /ai_insight: chama o Gemini e cacheia só respostas bem-sucedidas."""
+    try:
+        insight = request_gemini_text(prompt_text, timeout=app.config['AI_JOB_TIMEOUT'])
     except Exception as e:
         print(f"ERROR: Erro ao chamar Gemini API: {e}")
-        return "Não foi possível gerar uma sugestão/resumo no momento. Verifique sua chave de API e conexão."
+        return GEMINI_FALLBACK_MESSAGE
+    with app.app_context():
+        store_ai_response(cache_key, user_id, 'insight', insight)
+    return insight
+
+def apply_budget_suggestions_db(user_id, month_year, suggestions, job_id=None):
+    """
+    Grava os orçamentos sugeridos pela IA ({'sugestoes': [{'categoria', 'valor_sugerido'}]}) em
+    uma única transação. Retorna quantos foram gravados.
+
+    Com job_id (job da fila de IA), a transição running -> applying do job entra na mesma
+    transação: se o job foi cancelado ou expirou enquanto esperava o Gemini, nada é gravado e
+    retorna None.
+    """
+    if job_id is not None and not ai_job_queue.mark_applying(db.session, job_id):
+        db.session.rollback()
+        return None
+    created = 0
+    for sug in suggestions['sugestoes']:
+        category = Category.query.filter_by(user_id=user_id, name=sug['categoria'], type='expense').first()
+        if category:
+            add_budget_db(user_id, category.id, sug['valor_sugerido'], month_year, commit=False)
+            created += 1
+    db.session.commit()
+    return created
+
+def store_budget_suggestion(user_id, prompt, suggestions):
+    """
+    Cacheia a sugestão já aplicada sob a versão de dados resultante da própria aplicação:
+    repetir o pedido sem outras mudanças reaproveita o JSON em vez de chamar o modelo.
+    """
+    data_version = db.session.query(User.data_version).filter_by(id=user_id).scalar()
+    store_ai_response(ai_cache_key('budget_suggestion', user_id, data_version, prompt), user_id, 'budget_suggestion', suggestions)
+
+def apply_budget_suggestion_job(job_id, user_id, month_year, prompt):
+    """
+    Job da fila de IA (enfileirado com pass_job_id): pede a sugestão de orçamento ao Gemini e
+    grava os valores sugeridos, a menos que o job tenha sido cancelado ou expirado nesse meio tempo.
+    Roda em uma thread do pool, então abre o próprio contexto de aplicação (e sessão).
+
+    Retorna:
+        dict: {'created': número de orçamentos criados/atualizados}, ou None se nada foi gravado.
+    """
+    ai_response_text = request_gemini_text(prompt, timeout=app.config['AI_JOB_TIMEOUT'])
+    suggestions = json.loads(ai_response_text.replace("```json", "").replace("```", "").strip())
+
+    if 'sugestoes' not in suggestions:
+        raise ValueError("Resposta da IA não contém a chave 'sugestoes'.")
+
+    with app.app_context():
+        created = apply_budget_suggestions_db(user_id, month_year, suggestions, job_id)
+        if created is None:
+            return None  # Cancelado ou expirado: o resultado é descartado pela fila
+        store_budget_suggestion(user_id, prompt, suggestions)
+    return {'created': created}
+
+def submit_ai_job(kind, fn, *args, pass_job_id=False):
+    """Enfileira um job de IA do usuário logado e monta a resposta 202 (ou 429 se ele estiver no limite)."""
+    try:
+        job = ai_job_queue.submit(current_user.id, kind, fn, *args, pass_job_id=pass_job_id)
+    except JobLimitExceeded as e:
+        return jsonify({'error': str(e)}), 429
+    response = job.to_dict()
+    response['status_url'] = url_for('get_ai_job', job_id=job.id)
+    return jsonify(response), 202
+
+def cached_ai_job_response(kind, result):
+    """Resposta no formato de um job já concluído, para acertos no cache de IA (sem passar pela fila)."""
+    return jsonify({'job_id': None, 'kind': kind, 'status': 'done', 'result': result, 'cached': True})
 
 # --- NOVAS FUNÇÕES PARA ORÇAMENTOS E METAS (DB operations) ---
-def add_budget_db(user_id, category_id, budget_amount, month_year):
+def add_budget_db(user_id, category_id, budget_amount, month_year, commit=True):
     existing_budget = Budget.query.filter_by(
         user_id=user_id,
         category_id=category_id,
@@ -860,17 +1505,7 @@ def add_budget_db(user_id, category_id, budget_amount, month_year):
         )
         db.session.add(new_budget)
     
-    start_date, end_date = get_month_start_end_dates(month_year)
-    start_date_str = start_date.isoformat()
-    end_date_str = end_date.isoformat()
-
-    total_spent_in_category = db.session.query(db.func.sum(Transaction.amount)).filter(
-        Transaction.user_id == user_id,
-        Transaction.category_id == category_id,
-        Transaction.type == 'expense',
-        Transaction.date >= start_date_str,
-        Transaction.date <= end_date_str
-    ).scalar() or 0.0
+    total_spent_in_category = get_category_spent_in_month_db(user_id, category_id, month_year)
 
     if existing_budget:
         existing_budget.current_spent = total_spent_in_category
@@ -879,7 +1514,9 @@ def add_budget_db(user_id, category_id, budget_amount, month_year):
         new_budget.current_spent = total_spent_in_category
         db.session.add(new_budget)
 
-    db.session.commit()
+    bump_user_data_version(user_id)
+    if commit:
+        db.session.commit()
     return True
 
 def edit_budget_db(budget_id, user_id, budget_amount=None):
@@ -888,18 +1525,9 @@ def edit_budget_db(budget_id, user_id, budget_amount=None):
         if budget_amount is not None:
             budget.budget_amount = float(budget_amount)
         
-        start_date, end_date = get_month_start_end_dates(budget.month_year)
-        start_date_str = start_date.isoformat()
-        end_date_str = end_date.isoformat()
-        
-        total_spent_in_category = db.session.query(db.func.sum(Transaction.amount)).filter(
-            Transaction.user_id == user_id,
-            Transaction.category_id == budget.category_id,
-            Transaction.type == 'expense',
-            Transaction.date >= start_date_str,
-            Transaction.date <= end_date_str
-        ).scalar() or 0.0
+        total_spent_in_category = get_category_spent_in_month_db(user_id, budget.category_id, budget.month_year)
         budget.current_spent = total_spent_in_category
+        bump_user_data_version(user_id)
         db.session.commit()
         return True
     return False
@@ -908,6 +1536,7 @@ def delete_budget_db(budget_id, user_id):
     budget = Budget.query.filter_by(id=budget_id, user_id=user_id).first()
     if budget:
         db.session.delete(budget)
+        bump_user_data_version(user_id)
         db.session.commit()
         return True
     return False
@@ -917,10 +1546,11 @@ def add_goal_db(user_id, name, target_amount, due_date=None):
         user_id=user_id,
         name=name,
         target_amount=float(target_amount),
-        due_date=due_date if due_date else None,
+        due_date=parse_date(due_date),
         status='in_progress'
     )
     db.session.add(new_goal)
+    bump_user_data_version(user_id)
     db.session.commit()
     return True
 
@@ -934,9 +1564,10 @@ def edit_goal_db(goal_id, user_id, name=None, target_amount=None, current_amount
         if current_amount is not None:
             goal.current_amount = float(current_amount)
         if due_date:
-            goal.due_date = due_date
+            goal.due_date = parse_date(due_date)
         if status:
             goal.status = status
+        bump_user_data_version(user_id)
         db.session.commit()
         return True
     return False
@@ -945,6 +1576,7 @@ def delete_goal_db(goal_id, user_id):
     goal = Goal.query.filter_by(id=goal_id, user_id=user_id).first()
     if goal:
         db.session.delete(goal)
+        bump_user_data_version(user_id)
         db.session.commit()
         return True
     return False
@@ -972,47 +1604,48 @@ def contribute_to_goal_db(goal_id, user_id, amount, source_account_id):
 
     if goal.current_amount + amount_to_add >= goal.target_amount:
         amount_to_add_actual = goal.target_amount - goal.current_amount
-        goal.status = 'achieved'
-        flash(f'Parabéns! Com esta contribuição, a meta "{goal.name}" foi atingida!', 'success')
     else:
         amount_to_add_actual = amount_to_add
-        flash(f'Contribuição de R$ {amount_to_add_actual:.2f} adicionada à meta "{goal.name}".', 'success')
-        
-    goal.current_amount += amount_to_add_actual
-    db.session.add(goal)
 
     poupanca_metas_category = Category.query.filter_by(name='Poupança para Metas', type='expense', user_id=user_id).first()
-    
+    today = datetime.date.today()
+    if poupanca_metas_category:
+        # Débito condicionado ao saldo na própria instrução: dois aportes concorrentes não deixam a conta negativa
+        if adjust_account_balance_db(source_account_id, -amount_to_add_actual, min_balance=amount_to_add) is None:
+            db.session.rollback()
+            flash(f'Saldo insuficiente na conta {source_account.name} para pagar a conta "{goal.name}".', 'danger')
+            return False
+
+    adjust_goal_amount_db(goal, amount_to_add_actual)
+    if goal.status == 'achieved':
+        flash(f'Parabéns! Com esta contribuição, a meta "{goal.name}" foi atingida!', 'success')
+    else:
+        flash(f'Contribuição de R$ {amount_to_add_actual:.2f} adicionada à meta "{goal.name}".', 'success')
+
     if poupanca_metas_category:
         new_transaction = Transaction(
             description=f"Contribuição para Meta: {goal.name}",
             amount=amount_to_add_actual,
-            date=TODAY_DATE.isoformat(),
+            date=today,
             type='expense',
             user_id=user_id,
             category_id=poupanca_metas_category.id,
             account_id=source_account_id
         )
         db.session.add(new_transaction)
-        source_account.balance -= amount_to_add_actual
-        db.session.add(source_account)
+        update_monthly_rollup_db(user_id, today, poupanca_metas_category.id, 'expense', amount_to_add_actual)
 
-        transaction_month_year = TODAY_DATE.strftime('%Y-%m')
-        budget = Budget.query.filter_by(
-            user_id=user_id,
-            category_id=poupanca_metas_category.id,
-            month_year=transaction_month_year
-        ).first()
-        if budget:
-            budget.current_spent += amount_to_add_actual
-            db.session.add(budget)
-            print(f"DEBUG: Budget for category '{poupanca_metas_category.name}' updated with goal contribution. New spent: {budget.current_spent}")
+        transaction_month_year = today.strftime('%Y-%m')
+        new_spent = adjust_budget_spent_db(user_id, poupanca_metas_category.id, transaction_month_year, amount_to_add_actual)
+        if new_spent is not None:
+            print(f"DEBUG: Budget for category '{poupanca_metas_category.name}' updated with goal contribution. New spent: {new_spent}")
         else:
             print(f"DEBUG: No budget found for category 'Poupança para Metas' for {transaction_month_year} to update.")
     else:
         print("WARNING: Could not create transaction for goal contribution (missing category 'Poupança para Metas').")
         flash("Aviso: Categoria 'Poupança para Metas' não encontrada. A transação da meta não foi registrada.", 'warning')
 
+    bump_user_data_version(user_id)
     db.session.commit()
     return True
 
@@ -1030,6 +1663,7 @@ def add_account_db(user_id, name, initial_balance):
         balance=float(initial_balance)
     )
     db.session.add(new_account)
+    bump_user_data_version(user_id)
     db.session.commit()
     return True
 
@@ -1048,6 +1682,7 @@ def edit_account_db(account_id, user_id, new_name=None, new_balance=None):
     if new_balance is not None:
         account.balance = float(new_balance)
     
+    bump_user_data_version(user_id)
     db.session.commit()
     return True
 
@@ -1062,6 +1697,7 @@ def delete_account_db(account_id, user_id):
     Subscription.query.filter_by(account_id=account_id, user_id=user_id).update({'account_id': None})
     
     db.session.delete(account)
+    bump_user_data_version(user_id)
     db.session.commit()
     return True
 
@@ -1087,102 +1723,121 @@ def transfer_funds_db(user_id, source_account_id, destination_account_id, amount
         flash(f'Saldo insuficiente na conta de origem ({source_account.name}) para realizar a transferência.', 'danger')
         return False
 
-    source_account.balance -= amount
-    db.session.add(source_account)
-
-    destination_account.balance += amount
-    db.session.add(destination_account)
-
-    add_transaction_db(
-        description=f"Transferência para {destination_account.name}",
+    # Os saldos são movidos pelas próprias transações (add_transaction_db), com o débito condicionado ao saldo
+    source_name, destination_name = source_account.name, destination_account.name
+    today = datetime.date.today()
+    debit_transaction = add_transaction_db(
+        description=f"Transferência para {destination_name}",
         amount=amount,
-        date=TODAY_DATE.isoformat(),
+        date=today,
         type='expense',
         user_id=user_id,
         category_id=None,
-        account_id=source_account_id
+        account_id=source_account_id,
+        require_funds=True
     )
+    if not debit_transaction:
+        flash(f'Saldo insuficiente na conta de origem ({source_name}) para realizar a transferência.', 'danger')
+        return False
 
     add_transaction_db(
-        description=f"Transferência de {source_account.name}",
+        description=f"Transferência de {source_name}",
         amount=amount,
-        date=TODAY_DATE.isoformat(),
+        date=today,
         type='income',
         user_id=user_id,
         category_id=None,
         account_id=destination_account_id
     )
 
+    bump_user_data_version(user_id)
     db.session.commit()
     flash('Transferência realizada com sucesso!', 'success')
     return True
 
 # --- Funções para Relatórios Detalhados ---
+def _signed_amount_expr():
+    """Expressão SQL do valor com sinal: receitas somam, demais tipos subtraem."""
+    return db.case((Transaction.type == 'income', Transaction.amount), else_=-Transaction.amount)
+
+def get_balance_evolution_series_db(user_id, start_date, end_date):
+    """
+    Calcula a evolução diária do saldo entre start_date e end_date (inclusive).
+
+    O saldo de abertura vem de um único SUM sobre as transações anteriores ao
+    período; as variações diárias vêm de um GROUP BY por data e a série é montada
+    com uma soma acumulada. O custo cresce com (dias + datas distintas), não com
+    dias × transações.
+
+    Retorna uma tupla (labels, values), com labels no formato DD/MM/AAAA.
+    """
+    signed_amount = _signed_amount_expr()
+
+    opening_balance = db.session.query(db.func.sum(signed_amount)).filter(
+        Transaction.user_id == user_id,
+        Transaction.date < start_date
+    ).scalar() or 0.0
+
+    daily_deltas = dict(db.session.query(Transaction.date, db.func.sum(signed_amount)).filter(
+        Transaction.user_id == user_id,
+        Transaction.date >= start_date,
+        Transaction.date <= end_date
+    ).group_by(Transaction.date).all())
+
+    labels = []
+    values = []
+    current_balance = opening_balance
+    current_date_iter = start_date
+    while current_date_iter <= end_date:
+        current_balance += daily_deltas.get(current_date_iter, 0.0)
+        labels.append(current_date_iter.strftime('%d/%m/%Y'))
+        values.append(current_balance)
+        current_date_iter += datetime.timedelta(days=1)
+
+    return labels, values
+
 def get_detailed_report_data_db(user_id, start_date_str, end_date_str, transaction_type=None, category_id=None):
     try:
-        start_date = datetime.datetime.strptime(start_date_str, '%Y-%m-%d').date()
-        end_date = datetime.datetime.strptime(end_date_str, '%Y-%m-%d').date()
+        start_date = parse_date(start_date_str)
+        end_date = parse_date(end_date_str)
     except ValueError:
         return {'error': 'Formato de data inválido.'}
 
-    transactions_query = Transaction.query.filter(
-        Transaction.user_id == user_id,
-        Transaction.date >= start_date_str,
-        Transaction.date <= end_date_str
-    )
-
-    if transaction_type and transaction_type in ['income', 'expense']:
-        transactions_query = transactions_query.filter(Transaction.type == transaction_type)
-    
-    if category_id:
-        transactions_query = transactions_query.filter(Transaction.category_id == category_id)
-
-    transactions = transactions_query.all()
+    def filtered(query):
+        query = query.filter(
+            Transaction.user_id == user_id,
+            Transaction.date >= start_date,
+            Transaction.date <= end_date
+        )
+        if transaction_type and transaction_type in ['income', 'expense']:
+            query = query.filter(Transaction.type == transaction_type)
+        if category_id:
+            query = query.filter(Transaction.category_id == category_id)
+        return query
+
+    # Agregado no banco: o relatório (e a exportação) não carrega as transações do período em memória
+    totals_by_type = {
+        row.type: (row.total, row.count) for row in filtered(db.session.query(
+            Transaction.type,
+            db.func.sum(Transaction.amount).label('total'),
+            db.func.count(Transaction.id).label('count')
+        )).group_by(Transaction.type)
+    }
 
     expenses_by_category = {}
-    total_expenses_in_period = 0.0
-    for t in transactions:
-        if t.type == 'expense' and t.category:
-            category_name = t.category.name
-            expenses_by_category[category_name] = expenses_by_category.get(category_name, 0) + t.amount
-            total_expenses_in_period += t.amount
+    for row in filtered(db.session.query(Category.name, db.func.sum(Transaction.amount).label('total'))) \
+            .join(Category, Transaction.category_id == Category.id) \
+            .filter(Transaction.type == 'expense') \
+            .group_by(Category.name) \
+            .order_by(db.func.min(Transaction.date), db.func.min(Transaction.id)):
+        expenses_by_category[row.name] = row.total
     
     expenses_chart_data = {
         'labels': list(expenses_by_category.keys()),
         'values': list(expenses_by_category.values())
     }
     
-    all_user_transactions_until_end_date = Transaction.query.filter(
-        Transaction.user_id == user_id,
-        Transaction.date <= end_date_str
-    ).order_by(Transaction.date.asc()).all()
-
-    balance_evolution_labels = []
-    balance_evolution_values = []
-    
-    balance_before_report_start = 0.0
-    for t in all_user_transactions_until_end_date:
-        t_date = datetime.datetime.strptime(t.date, '%Y-%m-%d').date()
-        if t_date < start_date:
-            if t.type == 'income':
-                balance_before_report_start += t.amount
-            else:
-                balance_before_report_start -= t.amount
-    current_balance = balance_before_report_start
-    
-    current_date_iter = start_date
-    while current_date_iter <= end_date:
-        balance_evolution_labels.append(current_date_iter.strftime('%d/%m/%Y'))
-        
-        for t in all_user_transactions_until_end_date:
-            t_date = datetime.datetime.strptime(t.date, '%Y-%m-%d').date()
-            if t_date == current_date_iter:
-                if t.type == 'income':
-                    current_balance += t.amount
-                else:
-                    current_balance -= t.amount
-        balance_evolution_values.append(current_balance)
-        current_date_iter += datetime.timedelta(days=1)
+    balance_evolution_labels, balance_evolution_values = get_balance_evolution_series_db(user_id, start_date, end_date)
 
     # --- ALTERADO --- Renomeado para refletir que é o saldo da conta, não patrimônio líquido
     account_balance_evolution_chart_data = {
@@ -1190,8 +1845,8 @@ def get_detailed_report_data_db(user_id, start_date_str, end_date_str, transacti
         'values': balance_evolution_values
     }
 
-    total_income_in_period = sum(t.amount for t in transactions if t.type == 'income')
-    total_expenses_in_period_for_ai = sum(t.amount for t in transactions if t.type == 'expense')
+    total_income_in_period = totals_by_type.get('income', (0.0, 0))[0]
+    total_expenses_in_period_for_ai = totals_by_type.get('expense', (0.0, 0))[0]
     balance_in_period = total_income_in_period - total_expenses_in_period_for_ai
 
     ai_summary_data = {
@@ -1201,7 +1856,7 @@ def get_detailed_report_data_db(user_id, start_date_str, end_date_str, transacti
         'total_expenses': total_expenses_in_period_for_ai,
         'balance': balance_in_period,
         'expenses_by_category': expenses_by_category,
-        'transaction_count': len(transactions)
+        'transaction_count': sum(count for _, count in totals_by_type.values())
     }
 
     return {
@@ -1211,6 +1866,167 @@ def get_detailed_report_data_db(user_id, start_date_str, end_date_str, transacti
     }
 
 
+# --- Exportação de relatórios ---
+EXPORT_HEADERS = ["Descrição", "Valor", "Data", "Tipo", "Categoria", "Conta", "Meta"]
+
+def build_export_transactions_query(user_id, start_date, end_date, transaction_type=None, category_id=None):
+    """Transações exportadas em ordem de data, já com os nomes de categoria, conta e meta via JOIN."""
+    query = db.session.query(
+        Transaction.description,
+        Transaction.amount,
+        Transaction.date,
+        Transaction.type,
+        db.func.coalesce(Category.name, 'N/A').label('category_name'),
+        db.func.coalesce(Account.name, 'N/A').label('account_name'),
+        db.func.coalesce(Goal.name, 'N/A').label('goal_name')
+    ).outerjoin(Category, Transaction.category_id == Category.id) \
+     .outerjoin(Account, Transaction.account_id == Account.id) \
+     .outerjoin(Goal, Transaction.goal_id == Goal.id) \
+     .filter(
+        Transaction.user_id == user_id,
+        Transaction.date >= start_date,
+        Transaction.date <= end_date
+    )
+    if transaction_type and transaction_type in ['income', 'expense']:
+        query = query.filter(Transaction.type == transaction_type)
+    if category_id:
+        query = query.filter(Transaction.category_id == category_id)
+    return query.order_by(Transaction.date.asc(), Transaction.id.asc())
+
+def get_export_column_widths_db(export_query, extra_rows=()):
+    """
+    Largura das colunas da planilha (maior conteúdo + 2), calculada com um MAX(LENGTH()) no banco
+    para as transações e em Python para `extra_rows` (as poucas linhas do resumo no fim da planilha).
+    A planilha write-only do openpyxl exige as larguras antes da primeira linha.
+    """
+    rows = export_query.order_by(None).subquery()
+    max_lengths = db.session.query(
+        db.func.max(db.func.length(rows.c.description)),
+        db.func.max(db.func.length(db.cast(rows.c.amount, db.String))),
+        db.func.max(db.func.length(rows.c.category_name)),
+        db.func.max(db.func.length(rows.c.account_name)),
+        db.func.max(db.func.length(rows.c.goal_name))
+    ).one()
+    description_len, amount_len, category_len, account_len, goal_len = [length or 0 for length in max_lengths]
+    content_lengths = [description_len, amount_len, len('AAAA-MM-DD'), len('Receita'), category_len, account_len, goal_len]
+    for row in extra_rows:
+        for col_idx, value in enumerate(row):
+            content_lengths[col_idx] = max(content_lengths[col_idx], len(str(value)))
+    return [max(content_len, len(header)) + 2 for content_len, header in zip(content_lengths, EXPORT_HEADERS)]
+
+
+class _CSVLineEcho:
+    """'Arquivo' do csv.writer que devolve a linha em vez de guardá-la: writerow() retorna o texto."""
+
+    def write(self, value):
+        return value
+
+
+def iter_export_csv(export_query, batch_size=1000):
+    """Gera o CSV da exportação linha a linha, com as mesmas colunas da planilha."""
+    writer = csv.writer(_CSVLineEcho())
+    yield writer.writerow(EXPORT_HEADERS)
+    for t in export_query.yield_per(batch_size):
+        yield writer.writerow([t.description, t.amount, t.date.isoformat(), "Receita" if t.type == "income" else "Despesa",
+                               t.category_name, t.account_name, t.goal_name])
+
+def iter_export_ndjson(export_query, batch_size=1000):
+    """Gera a exportação como NDJSON (um objeto JSON por transação, por linha)."""
+    for t in export_query.yield_per(batch_size):
+        yield json.dumps({
+            'description': t.description,
+            'amount': t.amount,
+            'date': t.date.isoformat(),
+            'type': t.type,
+            'category': t.category_name,
+            'account': t.account_name,
+            'goal': t.goal_name
+        }, ensure_ascii=False) + '\n'
+
+
+# --- Paginação por keyset (seek) das listagens do index ---
+def encode_keyset_cursor(sort_value, row_id):
+    """Codifica a posição (valor de ordenação, id) da última linha de uma página."""
+    if isinstance(sort_value, datetime.date):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps([sort_value, row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+def decode_keyset_cursor(cursor, value_parser):
+    """Decodifica um cursor de encode_keyset_cursor; retorna None se vazio ou inválido."""
+    if not cursor:
+        return None
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return value_parser(sort_value), int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+def keyset_paginate(query, sort_column, id_column, descending, cursor_position, limit):
+    """
+    Aplica paginação por keyset sobre (sort_column, id_column): em vez de OFFSET, filtra
+    as linhas depois da posição do cursor, o que mantém cada página com custo constante.
+    Retorna (linhas, posição da última linha ou None se não houver mais páginas).
+    """
+    if cursor_position:
+        last_value, last_id = cursor_position
+        if descending:
+            query = query.filter(db.or_(sort_column < last_value, db.and_(sort_column == last_value, id_column < last_id)))
+        else:
+            query = query.filter(db.or_(sort_column > last_value, db.and_(sort_column == last_value, id_column > last_id)))
+
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (getattr(rows[-1], sort_column.key), getattr(rows[-1], id_column.key))
+
+def get_transactions_page_db(user_id, transaction_type, start_date=None, end_date=None, category_id=None,
+                             sort_by='date', order='desc', cursor=None, limit=50):
+    """Uma página de transações de um tipo, ordenada por (date, id) ou (amount, id). Retorna (transações, próximo cursor)."""
+    query = with_eager_loading(Transaction.query, 'transaction_list').filter_by(user_id=user_id, type=transaction_type)
+    if start_date:
+        query = query.filter(Transaction.date >= start_date)
+    if end_date:
+        query = query.filter(Transaction.date <= end_date)
+    if category_id:
+        query = query.filter_by(category_id=category_id)
+
+    if sort_by == 'amount':
+        sort_column, value_parser = Transaction.amount, float
+    else:
+        sort_column, value_parser = Transaction.date, parse_date
+
+    transactions, last_position = keyset_paginate(
+        query, sort_column, Transaction.id, order != 'asc', decode_keyset_cursor(cursor, value_parser), limit
+    )
+    return transactions, encode_keyset_cursor(*last_position) if last_position else None
+
+def get_bills_page_db(user_id, bill_status=None, cursor=None, limit=50):
+    """Uma página de contas (não mestras) ordenada por (dueDate, id). Retorna (contas, próximo cursor)."""
+    query = Bill.query.filter(
+        Bill.user_id == user_id,
+        Bill.is_master_recurring_bill == False
+    )
+    if bill_status and bill_status in ['pending', 'paid', 'overdue']:
+        if bill_status == 'overdue':
+            query = query.filter(Bill.dueDate < datetime.date.today(), Bill.status == 'pending')
+        else:
+            query = query.filter_by(status=bill_status)
+    elif not bill_status:
+        query = query.filter_by(status='pending')
+
+    bills, last_position = keyset_paginate(
+        query, Bill.dueDate, Bill.id, False, decode_keyset_cursor(cursor, parse_date), limit
+    )
+    return bills, encode_keyset_cursor(*last_position) if last_position else None
+
+
 # --- Funções de Email ---
 def generate_recovery_code(length=6):
     characters = string.ascii_uppercase + string.digits
@@ -1222,9 +2038,6 @@ def send_recovery_email(recipient_email, recovery_code):
         return False
 
     sender_email = EMAIL_USERNAME
-    sender_password = EMAIL_PASSWORD
-    smtp_server = EMAIL_SERVER
-    smtp_port = EMAIL_PORT
 
     message = MIMEText(
         f"Seu código de recuperação de senha é: {recovery_code}\n"
@@ -1233,20 +2046,13 @@ def send_recovery_email(recipient_email, recovery_code):
     message["Subject"] = "Código de Recuperação de Senha"
     message["From"] = sender_email
     message["To"] = recipient_email
-    
-    try:
-        print(f"DEBUG: send_recovery_email - Tentando conectar a {smtp_server}:{smtp_port}")
-        context = ssl.create_default_context()
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls(context=context)
-            server.login(sender_email, sender_password)
-            print(f"DEBUG: send_recovery_email - Login SMTP bem-sucedido")
-            server.sendmail(sender_email, recipient_email, message.as_string())
-        print(f"DEBUG: send_recovery_email - Email enviado para {recipient_email}")
-        return True
-    except Exception as e:
-        print(f"ERROR: send_recovery_email - Erro ao enviar email: {e}")
+
+    # Só enfileira: a conexão SMTP, o envio e as novas tentativas ficam com o worker da mail_queue
+    if not mail_queue.enqueue(sender_email, [recipient_email], message):
+        print(f"ERROR: send_recovery_email - Não foi possível enfileirar o email para {recipient_email}")
         return False
+    print(f"DEBUG: send_recovery_email - Email para {recipient_email} enfileirado")
+    return True
 
 
 # --- ROTAS DA APLICAÇÃO ---
@@ -1254,61 +2060,42 @@ def send_recovery_email(recipient_email, recovery_code):
 @app.route('/')
 @login_required
 def index():
-    process_recurring_items_on_access(current_user.id) 
+    process_recurring_items_on_access(current_user)
     
-    dashboard_data = get_dashboard_data_db(current_user.id)
+    dashboard_data = get_dashboard_data_cached(current_user)
     
-    transactions_query_obj = Transaction.query.filter_by(user_id=current_user.id) 
-
     transaction_type_filter = request.args.get('transaction_type')
-    if transaction_type_filter and transaction_type_filter in ['income', 'expense']:
-        transactions_query_obj = transactions_query_obj.filter_by(type=transaction_type_filter)
-
     start_date_filter = request.args.get('start_date')
     end_date_filter = request.args.get('end_date')
-    if start_date_filter:
-        transactions_query_obj = transactions_query_obj.filter(Transaction.date >= start_date_filter)
-    if end_date_filter:
-        transactions_query_obj = transactions_query_obj.filter(Transaction.date <= end_date_filter)
-
     category_filter_id = request.args.get('category_filter', type=int)
-    if category_filter_id:
-        transactions_query_obj = transactions_query_obj.filter_by(category_id=category_filter_id)
-
     sort_by_transactions = request.args.get('sort_by_transactions', 'date')
     order_transactions = request.args.get('order_transactions', 'desc')
+    page_size = app.config['LIST_PAGE_SIZE']
 
-    if sort_by_transactions == 'date':
-        if order_transactions == 'asc':
-            transactions_query_obj = transactions_query_obj.order_by(Transaction.date.asc())
-        else:
-            transactions_query_obj = transactions_query_obj.order_by(Transaction.date.desc())
-    elif sort_by_transactions == 'amount':
-        if order_transactions == 'asc':
-            transactions_query_obj = transactions_query_obj.order_by(Transaction.amount.asc())
-        else:
-            transactions_query_obj = transactions_query_obj.order_by(Transaction.amount.desc())
-            
-    all_transactions = transactions_query_obj.all()
-    
-    income_transactions = [t for t in all_transactions if t.type == 'income']
-    expense_transactions = [t for t in all_transactions if t.type == 'expense']
-
+    start_date, end_date = None, None
+    try:
+        start_date = parse_date(start_date_filter)
+        end_date = parse_date(end_date_filter)
+    except ValueError:
+        flash('Formato de data inválido no filtro.', 'danger')
 
-    bills_query_obj = Bill.query.filter( 
-        Bill.user_id == current_user.id,
-        Bill.is_master_recurring_bill == False
+    transaction_filters = dict(
+        start_date=start_date,
+        end_date=end_date,
+        category_id=category_filter_id,
+        sort_by=sort_by_transactions,
+        order=order_transactions,
+        limit=page_size
     )
+    income_transactions, income_next_cursor = [], None
+    expense_transactions, expense_next_cursor = [], None
+    if transaction_type_filter != 'expense':
+        income_transactions, income_next_cursor = get_transactions_page_db(current_user.id, 'income', **transaction_filters)
+    if transaction_type_filter != 'income':
+        expense_transactions, expense_next_cursor = get_transactions_page_db(current_user.id, 'expense', **transaction_filters)
+
     bill_status_filter = request.args.get('bill_status')
-    if bill_status_filter and bill_status_filter in ['pending', 'paid', 'overdue']:
-        if bill_status_filter == 'overdue':
-            bills_query_obj = bills_query_obj.filter(db.cast(Bill.dueDate, db.Date) < TODAY_DATE, Bill.status == 'pending')
-        else:
-            bills_query_obj = bills_query_obj.filter_by(status=bill_status_filter)
-    elif not bill_status_filter:
-            bills_query_obj = bills_query_obj.filter_by(status='pending')
-            
-    filtered_bills = bills_query_obj.order_by(db.cast(Bill.dueDate, db.Date).asc()).all()
+    filtered_bills, bills_next_cursor = get_bills_page_db(current_user.id, bill_status_filter, limit=page_size)
 
     all_categories_formatted = [(c.id, c.type, c.name) for c in Category.query.filter_by(user_id=current_user.id).all()]
     
@@ -1317,7 +2104,7 @@ def index():
 
     current_month_year = get_current_month_year_str()
     budgets_with_alerts = []
-    all_budgets_for_month = Budget.query.filter_by(user_id=current_user.id, month_year=current_month_year).all()
+    all_budgets_for_month = with_eager_loading(Budget.query, 'budget_list').filter_by(user_id=current_user.id, month_year=current_month_year).all()
 
     for budget in all_budgets_for_month:
         if budget.budget_amount > 0:
@@ -1351,7 +2138,10 @@ def index():
         bills=filtered_bills,
         income_transactions=income_transactions,
         expense_transactions=expense_transactions,
-        current_date=TODAY_DATE.isoformat(),
+        current_date=datetime.date.today(),
+        income_next_cursor=income_next_cursor,
+        expense_next_cursor=expense_next_cursor,
+        bills_next_cursor=bills_next_cursor,
         current_user=current_user,
         current_transaction_type_filter=transaction_type_filter,
         current_bill_status_filter=bill_status_filter,
@@ -1455,7 +2245,7 @@ def get_transaction_data(transaction_id):
             'id': transaction.id,
             'description': transaction.description,
             'amount': transaction.amount,
-            'date': transaction.date,
+            'date': format_date(transaction.date),
             'type': transaction.type,
             'category_id': transaction.category_id,
             'account_id': transaction.account_id,
@@ -1463,6 +2253,62 @@ def get_transaction_data(transaction_id):
         })
     return jsonify({'error': 'Transação não encontrada'}), 404
 
+@app.route('/get_transactions_page', methods=['GET'])
+@login_required
+def get_transactions_page():
+    transaction_type = request.args.get('transaction_type')
+    if transaction_type not in ['income', 'expense']:
+        return jsonify({'error': 'Tipo de transação inválido.'}), 400
+
+    try:
+        transactions, next_cursor = get_transactions_page_db(
+            current_user.id,
+            transaction_type,
+            start_date=parse_date(request.args.get('start_date')),
+            end_date=parse_date(request.args.get('end_date')),
+            category_id=request.args.get('category_filter', type=int),
+            sort_by=request.args.get('sort_by_transactions', 'date'),
+            order=request.args.get('order_transactions', 'desc'),
+            cursor=request.args.get('cursor'),
+            limit=max(1, min(request.args.get('limit', app.config['LIST_PAGE_SIZE'], type=int), 500))
+        )
+    except ValueError:
+        return jsonify({'error': 'Formato de data inválido.'}), 400
+
+    return jsonify({
+        'transactions': [{
+            'id': t.id,
+            'description': t.description,
+            'amount': t.amount,
+            'date': format_date(t.date),
+            'type': t.type,
+            'category_name': t.category.name if t.category else 'Sem Categoria'
+        } for t in transactions],
+        'next_cursor': next_cursor
+    })
+
+@app.route('/get_bills_page', methods=['GET'])
+@login_required
+def get_bills_page():
+    bills, next_cursor = get_bills_page_db(
+        current_user.id,
+        request.args.get('bill_status'),
+        cursor=request.args.get('cursor'),
+        limit=max(1, min(request.args.get('limit', app.config['LIST_PAGE_SIZE'], type=int), 500))
+    )
+    today = datetime.date.today()
+    return jsonify({
+        'bills': [{
+            'id': bill.id,
+            'description': bill.description,
+            'amount': bill.amount,
+            'dueDate': format_date(bill.dueDate),
+            'status': bill.status,
+            'is_overdue': bill.status == 'pending' and bill.dueDate < today
+        } for bill in bills],
+        'next_cursor': next_cursor
+    })
+
 @app.route('/edit_transaction/<int:transaction_id>', methods=['POST'])
 @login_required
 def handle_edit_transaction(transaction_id):
@@ -1489,14 +2335,14 @@ def get_bill_data(bill_id):
             'id': bill.id,
             'description': bill.description,
             'amount': bill.amount,
-            'dueDate': bill.dueDate,
+            'dueDate': format_date(bill.dueDate),
             'status': bill.status,
             'is_master_recurring_bill': bill.is_master_recurring_bill,
             'recurring_parent_id': bill.recurring_parent_id,
             'recurring_child_number': bill.recurring_child_number,
             'recurring_frequency': bill.recurring_frequency,
-            'recurring_start_date': bill.recurring_start_date,
-            'recurring_next_due_date': bill.recurring_next_due_date,
+            'recurring_start_date': format_date(bill.recurring_start_date),
+            'recurring_next_due_date': format_date(bill.recurring_next_due_date),
             'recurring_total_occurrences': bill.recurring_total_occurrences,
             'recurring_installments_generated': bill.recurring_installments_generated,
             'is_active_recurring': bill.is_active_recurring,
@@ -1731,21 +2577,20 @@ def get_monthly_summary():
     start_date = datetime.date(year, month, 1)
     end_date = start_date.replace(day=calendar.monthrange(year, month)[1])
     
-    start_date_str = start_date.isoformat()
-    end_date_str = (end_date + datetime.timedelta(days=1)).isoformat()
-
-    monthly_transactions = Transaction.query.filter(
+    monthly_transactions = with_eager_loading(Transaction.query, 'transaction_list').filter(
         Transaction.user_id == current_user.id,
-        Transaction.date >= start_date_str,
-        Transaction.date < end_date_str
+        Transaction.date >= start_date,
+        Transaction.date <= end_date
     ).all()
 
-    monthly_income = sum(t.amount for t in monthly_transactions if t.type == 'income')
-    monthly_expenses = sum(t.amount for t in monthly_transactions if t.type == 'expense')
+    month_year = start_date.strftime('%Y-%m')
+    monthly_totals = get_monthly_totals_by_type_db(current_user.id, [month_year])
+    monthly_income = monthly_totals.get((month_year, 'income'), 0.0)
+    monthly_expenses = monthly_totals.get((month_year, 'expense'), 0.0)
     monthly_balance = monthly_income - monthly_expenses
     
     transactions_details = [
-        {'description': t.description, 'amount': t.amount, 'type': t.type, 'date': t.date,
+        {'description': t.description, 'amount': t.amount, 'type': t.type, 'date': format_date(t.date),
          'category': t.category.name if t.category else 'Sem Categoria'}
         for t in monthly_transactions
     ]
@@ -1812,9 +2657,29 @@ def get_ai_insight():
     )
 
     prompt_text = " ".join(prompt_parts)
+    cache_key = ai_cache_key('insight', current_user.id, current_user.data_version, prompt_text)
+    cached_insight = get_cached_ai_response(cache_key)
+    if cached_insight is not None:
+        return cached_ai_job_response('insight', cached_insight)
+
     print(f"DEBUG: Prompt enviado ao Gemini: {prompt_text}")
-    ai_text = generate_text_with_gemini(prompt_text)
-    return jsonify({'insight': ai_text})
+    return submit_ai_job('insight', generate_ai_insight_job, current_user.id, cache_key, prompt_text)
+
+@app.route('/ai_jobs/<job_id>', methods=['GET'])
+@login_required
+def get_ai_job(job_id):
+    job = ai_job_queue.get(job_id, current_user.id)
+    if job is None:
+        return jsonify({'error': 'Job não encontrado.'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/ai_jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_ai_job(job_id):
+    job = ai_job_queue.cancel(job_id, current_user.id)
+    if job is None:
+        return jsonify({'error': 'Job não encontrado.'}), 404
+    return jsonify(job.to_dict())
 
 
 @app.route('/profile/update_picture', methods=['POST'])
@@ -1834,56 +2699,35 @@ def get_chart_data():
     today = datetime.date.today()
     
     month_labels = []
-    monthly_income_data = {}
-    monthly_expenses_data = {}
-
+    month_keys = []
     for i in range(6, -1, -1):
         target_month_date = today - relativedelta(months=i)
-        target_month = target_month_date.month
-        target_year = target_month_date.year
-        
-        month_name = datetime.date(target_year, target_month, 1).strftime('%b/%Y')
-        month_labels.append(month_name)
-        
-        start_date_of_month = target_month_date.replace(day=1)
-        end_date_of_month = target_month_date.replace(day=calendar.monthrange(target_year, target_month)[1])
+        month_labels.append(datetime.date(target_month_date.year, target_month_date.month, 1).strftime('%b/%Y'))
+        month_keys.append(target_month_date.strftime('%Y-%m'))
 
-        start_date_str = start_date_of_month.isoformat()
-        end_date_str = (end_date_of_month + datetime.timedelta(days=1)).isoformat()
-
-        transactions_in_month = Transaction.query.filter(
-            Transaction.user_id == user_id,
-            Transaction.date >= start_date_str,
-            Transaction.date < end_date_str
-        ).all()
-        
-        monthly_income_data[month_name] = sum(t.amount for t in transactions_in_month if t.type == 'income')
-        monthly_expenses_data[month_name] = sum(t.amount for t in transactions_in_month if t.type == 'expense')
+    # Totais por (mês, tipo) lidos do rollup mensal: no máximo algumas linhas por mês.
+    totals_by_month_type = get_monthly_totals_by_type_db(user_id, month_keys)
 
     monthly_overview_chart_data = {
         'labels': month_labels,
-        'income': [monthly_income_data[m] for m in month_labels],
-        'expenses': [monthly_expenses_data[m] for m in month_labels]
+        'income': [totals_by_month_type.get((month_year, 'income'), 0) for month_year in month_keys],
+        'expenses': [totals_by_month_type.get((month_year, 'expense'), 0) for month_year in month_keys]
     }
 
-    expenses_by_category = {}
-    
-    current_year_start = today.replace(month=1, day=1)
-    current_year_end = today.replace(month=12, day=31)
+    # Despesas do ano por categoria a partir do rollup, com JOIN para o nome.
+    category_totals = db.session.query(Category.name, db.func.sum(MonthlyRollup.total)).select_from(MonthlyRollup).outerjoin(
+        Category, MonthlyRollup.category_id == Category.id
+    ).filter(
+        MonthlyRollup.user_id == user_id,
+        MonthlyRollup.type == 'expense',
+        MonthlyRollup.month_year >= f"{today.year:04d}-01",
+        MonthlyRollup.month_year <= f"{today.year:04d}-12"
+    ).group_by(Category.name).all()
 
-    start_year_str = current_year_start.isoformat()
-    end_year_str = (current_year_end + datetime.timedelta(days=1)).isoformat()
-
-    current_year_transactions = Transaction.query.filter(
-        Transaction.user_id == user_id,
-        Transaction.type == 'expense',
-        Transaction.date >= start_year_str,
-        Transaction.date < end_year_str
-    ).all()
-
-    for transaction in current_year_transactions:
-        category_name = transaction.category.name if transaction.category else 'Sem Categoria'
-        expenses_by_category[category_name] = expenses_by_category.get(category_name, 0) + transaction.amount
+    expenses_by_category = {}
+    for category_name, total in category_totals:
+        category_name = category_name or 'Sem Categoria'
+        expenses_by_category[category_name] = expenses_by_category.get(category_name, 0) + total
 
     expenses_by_category_chart_data = {
         'labels': list(expenses_by_category.keys()),
@@ -1902,24 +2746,25 @@ def budgets_page():
     
     selected_month_year = request.args.get('month_year', get_current_month_year_str())
     
-    budgets = Budget.query.filter_by(user_id=user_id, month_year=selected_month_year).all()
+    budgets_with_spent = get_budgets_with_spent_db(user_id, selected_month_year)
     expense_categories = Category.query.filter_by(user_id=user_id, type='expense').all()
 
     start_date_obj, end_date_obj = get_month_start_end_dates(selected_month_year)
-    start_date_str = start_date_obj.isoformat()
-    end_date_str = end_date_obj.isoformat()
 
-    for budget in budgets:
-        total_spent_in_category = db.session.query(db.func.sum(Transaction.amount)).filter(
-            Transaction.user_id == user_id,
-            Transaction.category_id == budget.category_id,
-            Transaction.type == 'expense',
-            Transaction.date >= start_date_str,
-            Transaction.date <= end_date_str
-        ).scalar() or 0.0
-        budget.current_spent = total_spent_in_category
+    # O gasto denormalizado só é gravado quando diverge do calculado, num único UPDATE em lote
+    changed_spent = [
+        {'id': budget.id, 'current_spent': total_spent_in_category}
+        for budget, total_spent_in_category in budgets_with_spent
+        if abs((budget.current_spent or 0.0) - total_spent_in_category) > 0.005
+    ]
+    if changed_spent:
+        db.session.execute(db.update(Budget), changed_spent)
+        bump_user_data_version(user_id)
+        db.session.commit()
+        budgets_with_spent = get_budgets_with_spent_db(user_id, selected_month_year)
+    budgets = [budget for budget, _ in budgets_with_spent]
 
-    current_date = datetime.datetime.strptime(selected_month_year + '-01', '%Y-%m-%d').date()
+    current_date = start_date_obj
     prev_month = (current_date - relativedelta(months=1)).strftime('%Y-%m')
     next_month = (current_date + relativedelta(months=1)).strftime('%Y-%m')
 
@@ -2056,7 +2901,7 @@ def suggest_budget_ai():
     last_month_year = last_month_date.strftime('%Y-%m')
     current_month_year = current_month_date.strftime('%Y-%m')
 
-    last_month_budgets = Budget.query.filter_by(user_id=current_user.id, month_year=last_month_year).all()
+    last_month_budgets = with_eager_loading(Budget.query, 'budget_list').filter_by(user_id=current_user.id, month_year=last_month_year).all()
 
     if not last_month_budgets:
         flash('Nenhum orçamento encontrado no mês anterior para a sugestão.', 'warning')
@@ -2079,22 +2924,27 @@ def suggest_budget_ai():
         f"Dados:\n{data_summary}"
     )
 
-    try:
-        ai_response_text = generate_text_with_gemini(prompt).replace("```json", "").replace("```", "").strip()
-        suggestions = json.loads(ai_response_text)
+    cached_suggestions = get_cached_ai_response(ai_cache_key('budget_suggestion', current_user.id, current_user.data_version, prompt))
+    if cached_suggestions is not None:
+        created = apply_budget_suggestions_db(current_user.id, current_month_year, cached_suggestions)
+        store_budget_suggestion(current_user.id, prompt, cached_suggestions)
+        if request.accept_mimetypes.best == 'application/json':
+            return cached_ai_job_response('budget_suggestion', {'created': created})
+        flash('Orçamento sugerido pela IA foi criado! Revise e ajuste.', 'success')
+        return redirect(url_for('budgets_page'))
 
-        if 'sugestoes' not in suggestions:
-            raise ValueError("Resposta da IA não contém a chave 'sugestoes'.")
+    # A chamada ao Gemini vai para a fila de IA: chamadas via fetch recebem o job (202) e
+    # consultam /ai_jobs/<id>; o link sem JavaScript volta para a página de orçamentos
+    if request.accept_mimetypes.best == 'application/json':
+        return submit_ai_job('budget_suggestion', apply_budget_suggestion_job, current_user.id, current_month_year, prompt,
+                             pass_job_id=True)
 
-        for sug in suggestions['sugestoes']:
-            category = Category.query.filter_by(user_id=current_user.id, name=sug['categoria'], type='expense').first()
-            if category:
-                add_budget_db(current_user.id, category.id, sug['valor_sugerido'], current_month_year)
-        
-        flash('Orçamento sugerido pela IA foi criado! Revise e ajuste.', 'success')
-    except Exception as e:
-        print(f"ERROR: Erro ao processar sugestão da IA: {e}")
-        flash('Não foi possível gerar uma sugestão da IA.', 'danger')
+    try:
+        ai_job_queue.submit(current_user.id, 'budget_suggestion', apply_budget_suggestion_job, current_user.id, current_month_year, prompt,
+                            pass_job_id=True)
+        flash('A IA está preparando a sugestão de orçamento. Atualize a página em alguns instantes.', 'info')
+    except JobLimitExceeded as e:
+        flash(str(e), 'warning')
 
     return redirect(url_for('budgets_page'))
 
@@ -2204,6 +3054,28 @@ def export_report(format):
         flash('Datas de início e fim são obrigatórias para exportação.', 'danger')
         return redirect(url_for('reports_page'))
 
+    if format in ['csv', 'ndjson']:
+        # Formatos de streaming: as linhas saem do cursor direto para a resposta, sem resumo do relatório
+        try:
+            export_query = build_export_transactions_query(
+                current_user.id, parse_date(start_date_str), parse_date(end_date_str), transaction_type, category_id
+            )
+        except ValueError:
+            flash('Erro ao gerar dados para exportação: Formato de data inválido.', 'danger')
+            return redirect(url_for('reports_page'))
+
+        if format == 'csv':
+            return Response(
+                stream_with_context(iter_export_csv(export_query)),
+                mimetype='text/csv',
+                headers={'Content-Disposition': 'attachment; filename=relatorio_financeiro.csv'}
+            )
+        return Response(
+            stream_with_context(iter_export_ndjson(export_query)),
+            mimetype='application/x-ndjson',
+            headers={'Content-Disposition': 'attachment; filename=relatorio_financeiro.ndjson'}
+        )
+
     report_data = get_detailed_report_data_db(current_user.id, start_date_str, end_date_str, transaction_type, category_id)
 
     if 'error' in report_data:
@@ -2213,135 +3085,39 @@ def export_report(format):
     # --- ALTERADO --- Chave renomeada
     report_data['net_worth_evolution_chart'] = report_data.pop('account_balance_evolution_chart')
 
-    transactions_query = Transaction.query.filter(
-        Transaction.user_id == current_user.id,
-        Transaction.date >= start_date_str,
-        Transaction.date <= end_date_str
+    export_query = build_export_transactions_query(
+        current_user.id, parse_date(start_date_str), parse_date(end_date_str), transaction_type, category_id
     )
-    if transaction_type and transaction_type in ['income', 'expense']:
-        transactions_query = transactions_query.filter(Transaction.type == transaction_type)
-    if category_id:
-        transactions_query = transactions_query.filter(Transaction.category_id == category_id)
-    
-    filtered_transactions = transactions_query.order_by(Transaction.date.asc()).all()
 
     if format == 'excel':
-        output = io.BytesIO()
-        workbook = Workbook()
-        sheet = workbook.active
-        sheet.title = "Relatorio Financeiro"
-
-        headers = ["Descrição", "Valor", "Data", "Tipo", "Categoria", "Conta", "Meta"]
-        sheet.append(headers)
-
-        header_font = Font(bold=True)
-        header_fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
-        for col_idx in range(1, len(headers) + 1):
-            cell = sheet.cell(row=1, column=col_idx)
-            cell.font = header_font
-            cell.fill = header_fill
-        for row_idx, t in enumerate(filtered_transactions, start=2):
-            category_name = t.category.name if t.category else "N/A"
-            account_name = t.account.name if t.account else "N/A"
-            goal_name = t.goal.name if t.goal else "N/A"
-            row_data = [t.description, t.amount, t.date, "Receita" if t.type == "income" else "Despesa", category_name, account_name, goal_name]
-            sheet.append(row_data)
-            sheet.cell(row=row_idx, column=2).number_format = FORMAT_CURRENCY_USD_SIMPLE
-
-        for column in sheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = (max_length + 2)
-            sheet.column_dimensions[column_letter].width = adjusted_width
-        
-        if report_data['expenses_by_category_chart']['labels']:
-            sheet.append([])
-            sheet.append(["Despesas por Categoria"])
-            for i, label in enumerate(report_data['expenses_by_category_chart']['labels']):
-                value = report_data['expenses_by_category_chart']['values'][i]
-                sheet.append([label, value])
-                sheet.cell(row=sheet.max_row, column=2).number_format = FORMAT_CURRENCY_USD_SIMPLE
-        if report_data['net_worth_evolution_chart']['labels']:
-            sheet.append([])
-            sheet.append(["Evolução do Saldo em Contas"]) # --- ALTERADO ---
-            sheet.append(["Data", "Saldo"])
-            for i, label in enumerate(report_data['net_worth_evolution_chart']['labels']):
-                value = report_data['net_worth_evolution_chart']['values'][i]
-                if value > 0.01 or value < 0.00:
-                    sheet.append([label, value])
-                    sheet.cell(row=sheet.max_row, column=2).number_format = FORMAT_CURRENCY_USD_SIMPLE
-
-        workbook.save(output)
+        from excel_report import render_transactions_workbook, summary_rows # openpyxl só é importado quando alguém exporta
+
+        output = tempfile.SpooledTemporaryFile(max_size=app.config['EXPORT_SPOOL_MAX_MEMORY'])
+        render_transactions_workbook(
+            output,
+            EXPORT_HEADERS,
+            get_export_column_widths_db(export_query, summary_rows(report_data['expenses_by_category_chart'],
+                                                                   report_data['net_worth_evolution_chart'])),
+            export_query.yield_per(1000),
+            report_data['expenses_by_category_chart'],
+            report_data['net_worth_evolution_chart']
+        )
         output.seek(0)
         return send_file(output, download_name="relatorio_financeiro.xlsx", as_attachment=True, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
 
     elif format == 'pdf':
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size = 12)
-
-        pdf.cell(200, 10, text = f"Relatório de {start_date_str} a {end_date_str}", new_x="LMARGIN", new_y="NEXT", align = 'C')
-        pdf.ln(10)
-
-        if filtered_transactions:
-            pdf.set_font("Arial", size = 10, style='B')
-            pdf.cell(0, 10, text="Transações:", new_x="LMARGIN", new_y="NEXT")
-            pdf.set_font("Arial", size = 8)
-            
-            col_widths = [60, 20, 20, 20, 40, 30] 
-            pdf.cell(col_widths[0], 7, "Descrição", 1)
-            pdf.cell(col_widths[1], 7, "Valor", 1)
-            pdf.cell(col_widths[2], 7, "Data", 1)
-            pdf.cell(col_widths[3], 7, "Tipo", 1)
-            pdf.cell(col_widths[4], 7, "Categoria", 1)
-            pdf.cell(col_widths[5], 7, "Conta", 1)
-            pdf.ln()
-
-            for t in filtered_transactions:
-                category_name = t.category.name if t.category else "N/A"
-                account_name = t.account.name if t.account else "N/A"
-                description_display = t.description.replace('\n', ' ').replace('\r', ' ')
-                if len(description_display) > 35:
-                    description_display = description_display[:32] + "..."
-
-                pdf.cell(col_widths[0], 7, description_display, 1)
-                pdf.cell(col_widths[1], 7, f"R$ {t.amount:.2f}", 1)
-                pdf.cell(col_widths[2], 7, t.date, 1)
-                pdf.cell(col_widths[3], 7, "Receita" if t.type == "income" else "Despesa", 1)
-                pdf.cell(col_widths[4], 7, category_name, 1)
-                pdf.cell(col_widths[5], 7, account_name, 1)
-                pdf.ln()
-        else:
-            pdf.cell(0, 10, text="Nenhuma transação encontrada.", new_x="LMARGIN", new_y="NEXT")
-        
-        pdf.ln(10)
-
-        if report_data['expenses_by_category_chart']['labels']:
-            pdf.set_font("Arial", size = 10, style='B')
-            pdf.cell(0, 10, text="Despesas por Categoria:", new_x="LMARGIN", new_y="NEXT")
-            pdf.set_font("Arial", size = 8)
-            for i, label in enumerate(report_data['expenses_by_category_chart']['labels']):
-                value = report_data['expenses_by_category_chart']['values'][i]
-                pdf.cell(0, 7, text=f"{label}: R$ {value:.2f}", new_x="LMARGIN", new_y="NEXT")
-        
-        pdf.ln(10)
-
-        if report_data['net_worth_evolution_chart']['labels']:
-            pdf.set_font("Arial", size = 10, style='B')
-            pdf.cell(0, 10, text="Evolução do Saldo em Contas:", new_x="LMARGIN", new_y="NEXT") # --- ALTERADO ---
-            pdf.set_font("Arial", size = 8)
-            for i, label in enumerate(report_data['net_worth_evolution_chart']['labels']):
-                value = report_data['net_worth_evolution_chart']['values'][i]
-                if value > 0.01 or value < 0.00:
-                    pdf.cell(0, 7, text=f"{label}: R$ {value:.2f}", new_x="LMARGIN", new_y="NEXT")
-
-        return send_file(io.BytesIO(pdf.output(dest='S')), download_name="relatorio_financeiro.pdf", as_attachment=True, mimetype='application/pdf')
+        from pdf_report import render_transactions_report # fpdf só é importado quando alguém exporta
+
+        output = tempfile.SpooledTemporaryFile(max_size=app.config['EXPORT_SPOOL_MAX_MEMORY'])
+        render_transactions_report(
+            output,
+            f"Relatório de {start_date_str} a {end_date_str}",
+            export_query.yield_per(1000),
+            report_data['expenses_by_category_chart'],
+            report_data['net_worth_evolution_chart']
+        )
+        output.seek(0)
+        return send_file(output, download_name="relatorio_financeiro.pdf", as_attachment=True, mimetype='application/pdf')
 
     else:
         flash('Formato de exportação inválido.', 'danger')
@@ -2352,7 +3128,7 @@ def export_report(format):
 @login_required
 def subscriptions_page():
     user_id = current_user.id
-    subscriptions = Subscription.query.filter_by(user_id=user_id).all()
+    subscriptions = with_eager_loading(Subscription.query, 'subscription_list').filter_by(user_id=user_id).all()
     expense_categories = Category.query.filter_by(user_id=user_id, type='expense').all()
     user_accounts = Account.query.filter_by(user_id=user_id).all()
     return render_template('subscriptions.html', 
@@ -2402,10 +3178,11 @@ def handle_add_subscription():
 
     new_subscription = Subscription(
         user_id=current_user.id, name=name, amount=float(amount), billing_cycle=billing_cycle,
-        due_date_of_month=int(due_date_of_month), next_due_date=next_due_date_obj.isoformat(),
+        due_date_of_month=int(due_date_of_month), next_due_date=next_due_date_obj,
         status='active', category_id=category_id, account_id=account_id
     )
     db.session.add(new_subscription)
+    bump_user_data_version(current_user.id)
     db.session.commit()
     flash('Assinatura adicionada com sucesso!', 'success')
     return redirect(url_for('subscriptions_page'))
@@ -2418,7 +3195,7 @@ def get_subscription_data(subscription_id):
         return jsonify({
             'id': subscription.id, 'name': subscription.name, 'amount': subscription.amount,
             'billing_cycle': subscription.billing_cycle, 'due_date_of_month': subscription.due_date_of_month,
-            'next_due_date': subscription.next_due_date, 'status': subscription.status,
+            'next_due_date': format_date(subscription.next_due_date), 'status': subscription.status,
             'category_id': subscription.category_id, 'account_id': subscription.account_id
         })
     return jsonify({'error': 'Assinatura não encontrada'}), 404
@@ -2474,11 +3251,12 @@ def handle_edit_subscription(subscription_id):
             return redirect(url_for('subscriptions_page'))
         
         if next_due_date_obj:
-            subscription.next_due_date = next_due_date_obj.isoformat()
+            subscription.next_due_date = next_due_date_obj
         else:
             flash('Não foi possível recalcular a data de vencimento.', 'danger')
             return redirect(url_for('subscriptions_page'))
 
+    bump_user_data_version(current_user.id)
     db.session.commit()
     flash('Assinatura atualizada com sucesso!', 'success')
     return redirect(url_for('subscriptions_page'))
@@ -2492,6 +3270,7 @@ def handle_delete_subscription(subscription_id):
         return redirect(url_for('subscriptions_page'))
     
     db.session.delete(subscription)
+    bump_user_data_version(current_user.id)
     db.session.commit()
     flash('Assinatura excluída com sucesso!', 'info')
     return redirect(url_for('subscriptions_page'))
@@ -2522,10 +3301,11 @@ def add_debt():
         total_amount=float(total_amount),
         outstanding_balance=float(outstanding_balance),
         interest_rate=float(interest_rate) if interest_rate else None,
-        start_date=start_date,
-        end_date=end_date if end_date else None
+        start_date=parse_date(start_date),
+        end_date=parse_date(end_date)
     )
     db.session.add(new_debt)
+    bump_user_data_version(current_user.id)
     db.session.commit()
     flash('Dívida adicionada com sucesso!', 'success')
     return redirect(url_for('debts_page'))
@@ -2539,8 +3319,9 @@ def edit_debt(debt_id):
     debt.total_amount = float(request.form['total_amount'])
     debt.outstanding_balance = float(request.form['outstanding_balance'])
     debt.interest_rate = float(request.form.get('interest_rate')) if request.form.get('interest_rate') else None
-    debt.start_date = request.form['start_date']
-    debt.end_date = request.form.get('end_date') or None
+    debt.start_date = parse_date(request.form['start_date'])
+    debt.end_date = parse_date(request.form.get('end_date'))
+    bump_user_data_version(current_user.id)
     db.session.commit()
     flash('Dívida atualizada com sucesso!', 'success')
     return redirect(url_for('debts_page'))
@@ -2550,6 +3331,7 @@ def edit_debt(debt_id):
 def delete_debt(debt_id):
     debt = Debt.query.filter_by(id=debt_id, user_id=current_user.id).first_or_404()
     db.session.delete(debt)
+    bump_user_data_version(current_user.id)
     db.session.commit()
     flash('Dívida excluída com sucesso!', 'info')
     return redirect(url_for('debts_page'))
@@ -2561,7 +3343,7 @@ def get_debt_data(debt_id):
     return jsonify({
         'id': debt.id, 'name': debt.name, 'type': debt.type,
         'total_amount': debt.total_amount, 'outstanding_balance': debt.outstanding_balance,
-        'interest_rate': debt.interest_rate, 'start_date': debt.start_date, 'end_date': debt.end_date
+        'interest_rate': debt.interest_rate, 'start_date': format_date(debt.start_date), 'end_date': format_date(debt.end_date)
     })
 
 @app.route('/investments')
@@ -2584,10 +3366,11 @@ def add_investment():
         name=name,
         type=inv_type,
         current_value=float(current_value),
-        purchase_date=purchase_date if purchase_date else None,
+        purchase_date=parse_date(purchase_date),
         institution=institution
     )
     db.session.add(new_investment)
+    bump_user_data_version(current_user.id)
     db.session.commit()
     flash('Investimento adicionado com sucesso!', 'success')
     return redirect(url_for('investments_page'))
@@ -2599,8 +3382,9 @@ def edit_investment(investment_id):
     inv.name = request.form['name']
     inv.type = request.form['type']
     inv.current_value = float(request.form['current_value'])
-    inv.purchase_date = request.form.get('purchase_date') or None
+    inv.purchase_date = parse_date(request.form.get('purchase_date'))
     inv.institution = request.form.get('institution') or None
+    bump_user_data_version(current_user.id)
     db.session.commit()
     flash('Investimento atualizado com sucesso!', 'success')
     return redirect(url_for('investments_page'))
@@ -2610,6 +3394,7 @@ def edit_investment(investment_id):
 def delete_investment(investment_id):
     inv = Investment.query.filter_by(id=investment_id, user_id=current_user.id).first_or_404()
     db.session.delete(inv)
+    bump_user_data_version(current_user.id)
     db.session.commit()
     flash('Investimento excluído com sucesso!', 'info')
     return redirect(url_for('investments_page'))
@@ -2620,16 +3405,127 @@ def get_investment_data(investment_id):
     inv = Investment.query.filter_by(id=investment_id, user_id=current_user.id).first_or_404()
     return jsonify({
         'id': inv.id, 'name': inv.name, 'type': inv.type,
-        'current_value': inv.current_value, 'purchase_date': inv.purchase_date,
+        'current_value': inv.current_value, 'purchase_date': format_date(inv.purchase_date),
         'institution': inv.institution
     })
 
-# --- INICIALIZAÇÃO DO BANCO DE DADOS ---
+# --- MÉTRICAS ---
+@app.route('/metrics')
+def metrics():
+    if not app.config['METRICS_ENABLED']:
+        return jsonify({'error': 'Métricas desativadas.'}), 404
+    token = app.config['METRICS_TOKEN']
+    if not token:
+        return jsonify({'error': 'Métricas desativadas: defina METRICS_TOKEN.'}), 404
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'error': 'Não autorizado.'}), 401
+    body, content_type = app_metrics.render()
+    return Response(body, content_type=content_type)
+
+# --- PROFILER (ADMIN) ---
+def profiler_access_error():
+    """Resposta de erro se o profiler estiver desligado ou o token não bater; None se o acesso for permitido."""
+    if request_profiler is None:
+        return jsonify({'error': 'Profiler desativado.'}), 404
+    authorization = request.headers.get('Authorization', '')
+    if not request_profiler.is_authorized(authorization.removeprefix('Bearer ')):
+        return jsonify({'error': 'Não autorizado.'}), 401
+    return None
+
+@app.route('/admin/profiles')
+def list_profiles():
+    error = profiler_access_error()
+    if error:
+        return error
+    return jsonify({'profiles': request_profiler.list_profiles()})
+
+@app.route('/admin/profiles/<name>')
+def download_profile(name):
+    error = profiler_access_error()
+    if error:
+        return error
+    return send_from_directory(request_profiler.directory, name, as_attachment=True)
+
+@app.route('/admin/profiles/sample', methods=['POST'])
+def sample_process_profile():
+    """Amostra as pilhas de todas as threads deste worker por `seconds` segundos (máximo 300)."""
+    error = profiler_access_error()
+    if error:
+        return error
+    seconds = min(max(request.args.get('seconds', 30, type=float), 1), 300)
+    name = request_profiler.sample_process(seconds)
+    return jsonify({'name': name, 'seconds': seconds, 'download_url': url_for('download_profile', name=name)}), 202
+
+# --- COMANDOS DE LINHA DE COMANDO (flask <comando>) ---
+@app.cli.command('rebuild-rollups')
+@click.option('--user-id', type=int, default=None, help='Regera apenas o rollup deste usuário.')
+def rebuild_rollups_command(user_id):
+    """Regera a tabela MonthlyRollup a partir do ledger de transações."""
+    generated_rows = rebuild_monthly_rollups_db(user_id)
+    print(f"Rollup mensal regerado: {generated_rows} linhas.")
+
+@app.cli.command('process-recurring')
+@click.option('--batch-size', type=int, default=None, help='Usuários por lote (padrão: RECURRING_BATCH_SIZE).')
+@click.option('--every', type=int, default=None, help='Repete a cada N segundos, sem terminar (processo agendador).')
+def process_recurring_command(batch_size, every):
+    """Processa contas recorrentes e assinaturas devidas de todos os usuários."""
+    if every:
+        run_recurring_scheduler(every, batch_size)
+    checked_users, processed_users = process_all_recurring_items_db(
+        batch_size=batch_size or app.config['RECURRING_BATCH_SIZE']
+    )
+    print(f"Recorrências processadas: {checked_users} usuários verificados, {processed_users} com itens devidos.")
+
+# --- INICIALIZAÇÃO ---
+# Importar o módulo só registra rotas e extensões: nenhuma conexão é aberta e nenhuma thread sobe,
+# então ele pode ser pré-carregado no processo mestre antes do fork dos workers (gunicorn preload_app).
+db.init_app(app)
+migrate.init_app(app, db)
+
+if app.config['METRICS_ENABLED']:
+    with app.app_context():
+        app_metrics.init_app(app, db.engine)
+
 with app.app_context():
-    db.init_app(app)
-    migrate.init_app(app, db)
-    db.create_all()
+    ai_job_queue.init_store(SQLJobStore(db.engine, AIJobRecord.__table__, User.__table__))
+
+_app_initialized = False
+
+def create_app(start_scheduler=None):
+    """
+    Inicializa o app uma vez por processo e o retorna: cria as tabelas
+    (AUTO_CREATE_TABLES) e, se start_scheduler (padrão: RECURRING_SCHEDULER_INTERVAL > 0), sobe o
+    agendador de recorrências. As conexões abertas aqui são descartadas no fim para que os
+    workers criados por fork não herdem o pool.
+    """
+    global _app_initialized
+    if _app_initialized:
+        return app
+    _app_initialized = True
+
+    # --- DEBUG: Imprimir valores das variáveis de ambiente de e-mail ---
+    print(f"DEBUG APP START: EMAIL_USERNAME: {'SET' if EMAIL_USERNAME else 'NOT SET'}")
+    print(f"DEBUG APP START: EMAIL_PASSWORD: {'SET' if EMAIL_PASSWORD else 'NOT SET'}")
+    print(f"DEBUG APP START: EMAIL_SERVER: {EMAIL_SERVER}")
+    print(f"DEBUG APP START: EMAIL_PORT: {EMAIL_PORT}")
+    # --- FIM DEBUG ---
+
+    if app.config['AUTO_CREATE_TABLES']:
+        with app.app_context():
+            db.create_all()
+            db.engine.dispose()
+
+    if start_scheduler is None:
+        start_scheduler = app.config['RECURRING_SCHEDULER_INTERVAL'] > 0
+    if start_scheduler:
+        start_recurring_scheduler(app.config['RECURRING_SCHEDULER_INTERVAL'])
+    return app
+
+def reset_connections_after_fork():
+    """Chamado em cada worker logo após o fork: descarta o pool herdado do mestre sem fechar as conexões dele."""
+    with app.app_context():
+        db.engine.dispose(close=False)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
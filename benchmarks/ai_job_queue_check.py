@@ -0,0 +1,232 @@
+"""
+Verificação da fila de jobs de IA (/ai_insight, /suggest_budget_ai e /ai_jobs/<id>).
+
+Troca genai.GenerativeModel por um modelo local que só dorme --model-delay segundos e devolve
+um texto fixo, e confere que:
+  - /ai_insight responde 202 sem esperar o modelo e o resultado aparece em /ai_jobs/<id>;
+  - o limite por usuário devolve 429 e o job de um usuário não é visível para outro;
+  - outra fila sobre o mesmo banco (outro worker) enxerga o job e conta no limite do usuário;
+  - jobs pendentes podem ser cancelados e jobs lentos terminam como 'timeout';
+  - /suggest_budget_ai (via fetch) grava os orçamentos sugeridos no fim do job, e um job de
+    sugestão cancelado enquanto roda ou expirado não altera nenhum orçamento;
+  - várias requisições simultâneas de usuários diferentes não seguram a thread da requisição;
+  - pedidos repetidos acertam o cache de IA (zero chamadas ao modelo), mudanças nos dados o
+    invalidam e, com AI_CACHE_PERSISTENT, a tabela ai_response sobrevive à limpeza da memória.
+Termina com código 1 se alguma verificação falhar.
+
+Uso:
+    python benchmarks/ai_job_queue_check.py
+    python benchmarks/ai_job_queue_check.py --model-delay 1 --users 20
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_jobs import AIJobQueue, JobLimitExceeded, SQLJobStore
+
+
+def summary(income=1000.0):
+    """Corpo de /ai_insight; rendas diferentes geram prompts diferentes (e não acertam o cache de IA)."""
+    return {'summary_data': {'income': income, 'expenses': 400.0, 'balance': income - 400.0, 'transactions_details': []}}
+
+
+class StubModel:
+    """Substituto local de genai.GenerativeModel: dorme `delay` segundos e responde sem rede."""
+
+    delay = 0.5
+    calls = []
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, request_options=None):
+        StubModel.calls.append(request_options)
+        time.sleep(StubModel.delay)
+        if "'sugestoes'" in prompt:
+            return types.SimpleNamespace(text=json.dumps({'sugestoes': [{'categoria': 'Alimentação', 'valor_sugerido': 321.0}]}))
+        return types.SimpleNamespace(text='Insight de teste.')
+
+
+def login(app_module, username):
+    client = app_module.app.test_client()
+    client.post('/register', data={'username': username, 'email': f'{username}@example.com', 'password': 'ai_password'})
+    client.post('/login', data={'identifier': username, 'password': 'ai_password'})
+    return client
+
+
+def wait_for(client, job, timeout=30):
+    deadline = time.monotonic() + timeout
+    while job['status'] in ('pending', 'running') and time.monotonic() < deadline:
+        time.sleep(0.05)
+        job = client.get(f"/ai_jobs/{job['job_id']}").get_json()
+    return job
+
+
+def budgets_snapshot(app_module, user_id):
+    with app_module.app.app_context():
+        return sorted((b.id, b.month_year, b.category_id, b.budget_amount, b.current_spent)
+                      for b in app_module.Budget.query.filter_by(user_id=user_id))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--model-delay', type=float, default=0.5, help='Segundos que o modelo local leva para responder.')
+    parser.add_argument('--users', type=int, default=8, help='Usuários pedindo insight ao mesmo tempo.')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'ai_jobs.db')
+
+    import app as app_module
+    app_module.create_app()
+    app_module.get_genai().GenerativeModel = StubModel
+    StubModel.delay = args.model_delay
+    queue = app_module.ai_job_queue
+    failures = []
+
+    def check(condition, message):
+        print(f"{'ok ' if condition else 'FALHOU'} {message}")
+        if not condition:
+            failures.append(message)
+
+    alice, bob = login(app_module, 'ai_alice'), login(app_module, 'ai_bob')
+    with app_module.app.app_context():
+        alice_id = app_module.User.query.filter_by(username='ai_alice').first().id
+        # Fila de "outro worker": mesmo banco, outro pool e nenhum estado em memória compartilhado
+        other_worker = AIJobQueue(SQLJobStore(app_module.db.engine, app_module.AIJobRecord.__table__, app_module.User.__table__),
+                                  per_user_limit=queue.per_user_limit)
+
+    started = time.perf_counter()
+    response = alice.post('/ai_insight', json=summary(1001.0))
+    elapsed = time.perf_counter() - started
+    job = response.get_json()
+    check(response.status_code == 202 and elapsed < args.model_delay, f"/ai_insight devolve 202 em {elapsed * 1000:.0f} ms")
+    check(bob.get(f"/ai_jobs/{job['job_id']}").status_code == 404, "job de outro usuário responde 404")
+    job = wait_for(alice, job)
+    check(job == {'job_id': job['job_id'], 'kind': 'insight', 'status': 'done', 'result': 'Insight de teste.'}, "resultado disponível em /ai_jobs/<id>")
+    check(StubModel.calls[-1] == {'timeout': app_module.app.config['AI_JOB_TIMEOUT']}, "timeout repassado ao cliente da API")
+    seen = other_worker.get(job['job_id'], alice_id)
+    check(seen is not None and seen.to_dict() == job, "outro worker enxerga o job e o resultado")
+
+    pending = [alice.post('/ai_insight', json=summary(1100.0 + i)) for i in range(queue.per_user_limit + 1)]
+    check([r.status_code for r in pending] == [202] * queue.per_user_limit + [429], "limite por usuário devolve 429")
+    try:
+        other_worker.submit(alice_id, 'insight', lambda: None)
+        limited = False
+    except JobLimitExceeded:
+        limited = True
+    check(limited, "limite por usuário vale também em outro worker")
+    cancelled = alice.post(f"/ai_jobs/{pending[-2].get_json()['job_id']}/cancel").get_json()
+    check(cancelled['status'] == 'cancelled', "job cancelado")
+    check(alice.post('/ai_insight', json=summary(1003.0)).status_code == 202, "cancelar libera a vaga do usuário")
+    for r in pending[:-1]:
+        wait_for(alice, r.get_json())
+    check(alice.get(f"/ai_jobs/{cancelled['job_id']}").get_json()['status'] == 'cancelled', "resultado de job cancelado é descartado")
+
+    queue.timeout_seconds = args.model_delay / 5
+    slow = wait_for(bob, bob.post('/ai_insight', json=summary(1004.0)).get_json())
+    check(slow['status'] == 'timeout' and 'error' in slow, "job lento termina como timeout")
+    queue.timeout_seconds = app_module.app.config['AI_JOB_TIMEOUT']
+    time.sleep(args.model_delay)
+
+    with app_module.app.app_context():
+        user_id = app_module.User.query.filter_by(username='ai_bob').first().id
+        category = app_module.Category.query.filter_by(user_id=user_id, name='Alimentação', type='expense').first()
+        last_month = (datetime.date.today().replace(day=1) - datetime.timedelta(days=1)).strftime('%Y-%m')
+        app_module.db.session.add(app_module.Budget(user_id=user_id, category_id=category.id, budget_amount=100.0,
+                                                    current_spent=0.0, month_year=last_month))
+        app_module.db.session.commit()
+
+    # Cancelar ou expirar o job enquanto o modelo responde não pode deixar orçamentos gravados
+    before = budgets_snapshot(app_module, user_id)
+    job = bob.get('/suggest_budget_ai', headers={'Accept': 'application/json'}).get_json()
+    deadline = time.monotonic() + 10
+    while job['status'] == 'pending' and time.monotonic() < deadline:
+        time.sleep(0.01)
+        job = bob.get(f"/ai_jobs/{job['job_id']}").get_json()
+    cancelled = bob.post(f"/ai_jobs/{job['job_id']}/cancel").get_json()
+    time.sleep(args.model_delay * 2)
+    check(job['status'] == 'running' and cancelled['status'] == 'cancelled'
+          and bob.get(f"/ai_jobs/{job['job_id']}").get_json()['status'] == 'cancelled'
+          and budgets_snapshot(app_module, user_id) == before, "sugestão de orçamento cancelada durante a execução não grava orçamentos")
+    queue.timeout_seconds = args.model_delay / 5
+    expired = wait_for(bob, bob.get('/suggest_budget_ai', headers={'Accept': 'application/json'}).get_json())
+    queue.timeout_seconds = app_module.app.config['AI_JOB_TIMEOUT']
+    time.sleep(args.model_delay * 2)
+    check(expired['status'] == 'timeout' and budgets_snapshot(app_module, user_id) == before,
+          "sugestão de orçamento expirada não grava orçamentos")
+
+    response = bob.get('/suggest_budget_ai', headers={'Accept': 'application/json'})
+    job = wait_for(bob, response.get_json())
+    with app_module.app.app_context():
+        suggested = app_module.Budget.query.filter_by(user_id=user_id, month_year=datetime.date.today().strftime('%Y-%m')).all()
+    check(response.status_code == 202 and job.get('result') == {'created': 1}
+          and [b.budget_amount for b in suggested] == [321.0], "/suggest_budget_ai grava a sugestão no fim do job")
+
+    clients = [login(app_module, f'ai_user_{i}') for i in range(args.users)]
+    latencies, jobs = [], []
+
+    def request_insight(client):
+        started = time.perf_counter()
+        job = client.post('/ai_insight', json=summary(1005.0)).get_json()
+        latencies.append(time.perf_counter() - started)
+        jobs.append(wait_for(client, job))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=request_insight, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = time.perf_counter() - started
+    check(all(j['status'] == 'done' for j in jobs), f"{args.users} usuários simultâneos: todos os jobs concluídos em {total:.1f}s "
+          f"(pool de {queue.max_workers}, resposta mais lenta da requisição {max(latencies) * 1000:.0f} ms)")
+
+    calls_before = len(StubModel.calls)
+    started = time.perf_counter()
+    response = alice.post('/ai_insight', json=summary(1001.0))
+    elapsed = time.perf_counter() - started
+    cached = response.get_json()
+    check(response.status_code == 200 and cached['status'] == 'done' and cached['result'] == 'Insight de teste.'
+          and cached['cached'] and len(StubModel.calls) == calls_before, f"insight repetido vem do cache em {elapsed * 1000:.1f} ms")
+    check(bob.post('/ai_insight', json=summary(1001.0)).status_code == 202, "cache separado por usuário")
+
+    response = bob.get('/suggest_budget_ai', headers={'Accept': 'application/json'})
+    check(response.status_code == 200 and response.get_json()['result'] == {'created': 1}
+          and len(StubModel.calls) == calls_before + 1, "sugestão de orçamento repetida vem do cache")
+    response = bob.get('/suggest_budget_ai', headers={'Accept': 'application/json'})
+    check(response.status_code == 200, "sugestão continua no cache depois de reaplicada")
+
+    with app_module.app.app_context():
+        app_module.bump_user_data_version(alice_id)
+        app_module.db.session.commit()
+    response = alice.post('/ai_insight', json=summary(1001.0))
+    check(response.status_code == 202, "mudança nos dados do usuário invalida o cache")
+    wait_for(alice, response.get_json())
+
+    app_module.app.config['AI_CACHE_PERSISTENT'] = True
+    wait_for(alice, alice.post('/ai_insight', json=summary(1200.0)).get_json())
+    app_module.ai_response_cache.clear()
+    calls_before = len(StubModel.calls)
+    response = alice.post('/ai_insight', json=summary(1200.0))
+    with app_module.app.app_context():
+        stored = app_module.AIResponse.query.filter_by(user_id=alice_id).count()
+    check(response.status_code == 200 and len(StubModel.calls) == calls_before and stored == 1,
+          "tabela ai_response atende depois de limpar o cache em memória")
+
+    queue.shutdown()
+    other_worker.shutdown()
+    print(f"{len(failures)} verificações falharam.")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
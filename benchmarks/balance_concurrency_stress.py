@@ -0,0 +1,199 @@
+"""
+Teste de estresse de concorrência dos saldos.
+
+Várias threads movimentam dinheiro ao mesmo tempo nas mesmas contas, metas e orçamentos
+(receitas, despesas com meta e categoria, edições, exclusões e transferências), cada uma com
+sua própria sessão, como workers diferentes. No fim confere os valores denormalizados contra o
+ledger de transações:
+  - Account.balance     == saldo inicial + soma com sinal das transações da conta;
+  - Goal.current_amount == soma das transações da meta;
+  - Budget.current_spent == soma das despesas da categoria no mês;
+  - MonthlyRollup        == uma linha por (mês, categoria, tipo) com a soma e a contagem do
+                            ledger (as receitas não têm categoria: a fatia com category_id NULL
+                            também é disputada pelas threads).
+Termina com código 1 se algum valor divergir.
+
+Com --legacy, troca apply_atomic_delta_db por um ler-alterar-gravar no Python (o padrão
+anterior) para mostrar as atualizações perdidas.
+
+Uso:
+    python benchmarks/balance_concurrency_stress.py --threads 8 --operations 200
+    python benchmarks/balance_concurrency_stress.py --legacy
+    python benchmarks/balance_concurrency_stress.py --database-url postgresql://localhost/stress
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+INITIAL_BALANCE = 1_000_000.0
+
+
+def legacy_apply_delta(app_module):
+    """Versão ler-alterar-gravar do primitivo atômico, com uma pausa que alarga a janela de corrida."""
+    def apply_delta(column, delta, criteria, guard=None):
+        conditions = list(criteria) + ([guard] if guard is not None else [])
+        row = column.class_.query.filter(*conditions).first()
+        if row is None:
+            return None
+        current = getattr(row, column.key)
+        time.sleep(0.001)
+        setattr(row, column.key, current + delta)
+        return current + delta
+    return apply_delta
+
+
+def seed(app_module):
+    db = app_module.db
+    user = app_module.User(username='stress_user', email='stress@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    category = app_module.Category(name='Estresse', type='expense', user_id=user.id)
+    accounts = [app_module.Account(name=f'Estresse {i}', balance=INITIAL_BALANCE, user_id=user.id) for i in range(3)]
+    goal = app_module.Goal(name='Meta Estresse', target_amount=1e12, current_amount=0.0, user_id=user.id)
+    db.session.add_all([category, goal, *accounts])
+    db.session.flush()
+    db.session.add(app_module.Budget(user_id=user.id, category_id=category.id, budget_amount=1e12, current_spent=0.0,
+                                     month_year=datetime.date.today().strftime('%Y-%m')))
+    db.session.commit()
+    return user.id, category.id, [account.id for account in accounts], goal.id
+
+
+def worker(app_module, worker_id, operations, ids, errors):
+    user_id, category_id, account_ids, goal_id = ids
+    rnd = random.Random(worker_id)
+    today = datetime.date.today()
+    own_transactions = []
+
+    with app_module.app.test_request_context():
+        for _ in range(operations):
+            operation = rnd.choice(['income', 'expense', 'expense', 'edit', 'delete', 'transfer'])
+            amount = float(rnd.randint(1, 100))
+            account_id = rnd.choice(account_ids)
+            try:
+                if operation == 'income':
+                    transaction = app_module.add_transaction_db('estresse', amount, today, 'income', user_id, account_id=account_id)
+                    own_transactions.append(transaction.id)
+                elif operation == 'expense':
+                    transaction = app_module.add_transaction_db('estresse', amount, today, 'expense', user_id,
+                                                                category_id=category_id, account_id=account_id, goal_id=goal_id)
+                    own_transactions.append(transaction.id)
+                elif operation == 'edit' and own_transactions:
+                    app_module.edit_transaction_db(rnd.choice(own_transactions), 'estresse editada', amount, today.isoformat(),
+                                                   'expense', user_id, category_id=category_id, account_id=account_id, goal_id=goal_id)
+                elif operation == 'delete' and own_transactions:
+                    app_module.delete_transaction_db(own_transactions.pop(rnd.randrange(len(own_transactions))), user_id)
+                elif operation == 'transfer':
+                    source_id, destination_id = rnd.sample(account_ids, 2)
+                    app_module.transfer_funds_db(user_id, source_id, destination_id, amount)
+            except Exception as e:
+                app_module.db.session.rollback()
+                errors.append(f'{operation}: {e.__class__.__name__}: {str(e).splitlines()[0]}')
+        app_module.db.session.remove()
+
+
+def check_ledger(app_module, ids):
+    db, Transaction = app_module.db, app_module.Transaction
+    user_id, category_id, account_ids, goal_id = ids
+    signed = db.case((Transaction.type == 'income', Transaction.amount), else_=-Transaction.amount)
+    mismatches = []
+
+    for account_id in account_ids:
+        ledger = db.session.query(db.func.coalesce(db.func.sum(signed), 0.0)).filter(Transaction.account_id == account_id).scalar()
+        balance = db.session.get(app_module.Account, account_id).balance
+        mismatches.append(('conta', account_id, balance, INITIAL_BALANCE + ledger))
+
+    goal_ledger = db.session.query(db.func.coalesce(db.func.sum(Transaction.amount), 0.0)).filter(Transaction.goal_id == goal_id).scalar()
+    mismatches.append(('meta', goal_id, db.session.get(app_module.Goal, goal_id).current_amount, goal_ledger))
+
+    budget_ledger = db.session.query(db.func.coalesce(db.func.sum(Transaction.amount), 0.0)).filter(
+        Transaction.user_id == user_id, Transaction.category_id == category_id, Transaction.type == 'expense').scalar()
+    budget = app_module.Budget.query.filter_by(user_id=user_id, category_id=category_id).first()
+    mismatches.append(('orçamento', budget.id, budget.current_spent, budget_ledger))
+
+    failures = 0
+    for kind, row_id, stored, expected in mismatches:
+        ok = abs(stored - expected) < 0.005
+        failures += not ok
+        print(f"{kind:>10} {row_id}: gravado {stored:.2f}, ledger {expected:.2f} {'ok' if ok else '<- DIVERGENTE'}")
+    return failures + check_rollup(app_module, user_id)
+
+
+def check_rollup(app_module, user_id):
+    """Compara o rollup mensal do usuário com o ledger, fatia a fatia, e aponta fatias duplicadas."""
+    db, Transaction, MonthlyRollup = app_module.db, app_module.Transaction, app_module.MonthlyRollup
+    ledger = {}
+    for date, category_id, t_type, amount in db.session.query(
+            Transaction.date, Transaction.category_id, Transaction.type, Transaction.amount).filter_by(user_id=user_id):
+        slot = (date.strftime('%Y-%m'), category_id, t_type)
+        total, count = ledger.get(slot, (0.0, 0))
+        ledger[slot] = (total + amount, count + 1)
+
+    rollup = {}
+    for row in MonthlyRollup.query.filter_by(user_id=user_id):
+        rollup.setdefault((row.month_year, row.category_id, row.type), []).append((row.total, row.transaction_count))
+
+    failures = 0
+    for slot in sorted(set(ledger) | set(rollup), key=str):
+        rows = rollup.get(slot, [])
+        total, count = ledger.get(slot, (0.0, 0))
+        stored_total, stored_count = sum(r[0] for r in rows), sum(r[1] for r in rows)
+        # Fatia zerada (todas as transações excluídas) pode continuar no rollup
+        ok = len(rows) <= 1 and abs(stored_total - total) < 0.005 and stored_count == count
+        failures += not ok
+        month_year, category_id, t_type = slot
+        print(f"{'rollup':>10} {month_year} cat={category_id} {t_type}: {len(rows)} linha(s), gravado {stored_total:.2f} "
+              f"({stored_count}), ledger {total:.2f} ({count}) {'ok' if ok else '<- DIVERGENTE'}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--operations', type=int, default=150, help='Operações por thread.')
+    parser.add_argument('--legacy', action='store_true', help='Usa ler-alterar-gravar no Python (padrão anterior).')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'balance_stress.db')
+
+    import app as app_module
+    app_module.create_app()
+    if args.legacy:
+        app_module.apply_atomic_delta_db = legacy_apply_delta(app_module)
+
+    with app_module.app.app_context():
+        ids = seed(app_module)
+
+    errors = []
+    threads = [threading.Thread(target=worker, args=(app_module, i, args.operations, ids, errors)) for i in range(args.threads)]
+    started = time.perf_counter()
+    # sys.stdout é global: os prints de depuração das threads são descartados aqui, uma vez só
+    with contextlib.redirect_stdout(io.StringIO()):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    print(f"{args.threads} threads x {args.operations} operações em {time.perf_counter() - started:.1f}s, "
+          f"{len(errors)} operações com erro (revertidas).")
+    for error in sorted(set(errors))[:5]:
+        print(f"    {error}")
+
+    with app_module.app.app_context():
+        failures = check_ledger(app_module, ids)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
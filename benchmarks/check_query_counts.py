@@ -0,0 +1,150 @@
+"""
+Verificação de consultas N+1 por rota.
+
+Sobe o app contra um banco descartável (ou --database-url), popula um usuário com
+--scale categorias, contas, assinaturas, orçamentos e transações espalhadas entre eles e
+conta quantas consultas cada rota emite. Depois dobra os dados relacionados e mede de novo:
+com os presets de with_eager_loading o número de consultas por rota não pode crescer junto
+com os dados. Termina com código 1 se alguma rota crescer (ou passar de --max-queries).
+
+/suggest_budget_ai fica de fora porque chama a API do Gemini.
+
+Uso:
+    python benchmarks/check_query_counts.py
+    python benchmarks/check_query_counts.py --scale 50 --database-url postgresql://localhost/counts
+"""
+import argparse
+import collections
+import datetime
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROUTES = [
+    '/',
+    '/get_transactions_page?transaction_type=expense&limit=100',
+    '/budgets',
+    '/subscriptions',
+    '/profile/monthly_summary',
+    '/get_chart_data',
+    '/get_detailed_report_data?start_date={start}&end_date={end}',
+    '/export_report/excel?start_date={start}&end_date={end}',
+    '/export_report/pdf?start_date={start}&end_date={end}',
+    '/export_report/csv?start_date={start}&end_date={end}',
+]
+
+
+def add_related_rows(app_module, user_id, count, offset):
+    """Cria `count` categorias, contas, metas, assinaturas e orçamentos, com transações em cada um."""
+    db = app_module.db
+    today = datetime.date.today()
+    this_month = today.strftime('%Y-%m')
+    last_month = (today.replace(day=1) - datetime.timedelta(days=1)).strftime('%Y-%m')
+
+    for i in range(offset, offset + count):
+        category = app_module.Category(name=f'count categoria {i}', type='expense', user_id=user_id)
+        account = app_module.Account(name=f'count conta {i}', balance=1000.0, user_id=user_id)
+        goal = app_module.Goal(name=f'count meta {i}', target_amount=1000.0, current_amount=0.0, user_id=user_id)
+        db.session.add_all([category, account, goal])
+        db.session.flush()
+
+        db.session.add(app_module.Subscription(
+            name=f'count assinatura {i}', amount=9.9, billing_cycle='monthly', due_date_of_month=1,
+            next_due_date=today + datetime.timedelta(days=30), status='active', user_id=user_id,
+            category_id=category.id, account_id=account.id))
+        for month_year in [this_month, last_month]:
+            db.session.add(app_module.Budget(user_id=user_id, category_id=category.id, budget_amount=100.0,
+                                             current_spent=0.0, month_year=month_year))
+        for day in range(3):
+            transaction_date = today.replace(day=1) + datetime.timedelta(days=day)
+            db.session.add(app_module.Transaction(
+                description=f'count {i}/{day}', amount=10.0 + day, date=transaction_date, type='expense',
+                user_id=user_id, category_id=category.id, account_id=account.id, goal_id=goal.id))
+            app_module.update_monthly_rollup_db(user_id, transaction_date, category.id, 'expense', 10.0 + day)
+
+    # Marca d'água em dia: o dashboard não dispara o processamento de recorrências durante a contagem
+    app_module.User.query.filter_by(id=user_id).update({app_module.User.recurring_processed_through: today})
+    db.session.commit()
+
+
+def count_queries(app_module, client, engine, event):
+    today = datetime.date.today()
+    start, end = (today - datetime.timedelta(days=60)).isoformat(), today.isoformat()
+    counts = {}
+    statements = collections.defaultdict(collections.Counter)
+    current = [None]
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        counts[current[0]] += 1
+        statements[current[0]][' '.join(statement.split())] += 1
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        for route in ROUTES:
+            url = route.format(start=start, end=end)
+            app_module.dashboard_cache.clear()
+            current[0] = route
+            counts[route] = 0
+            response = client.get(url)
+            response.get_data()
+            response.close()
+            if response.status_code >= 400:
+                raise SystemExit(f'{url}: HTTP {response.status_code}')
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    return counts, statements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--scale', type=int, default=20, help='Objetos relacionados criados em cada rodada.')
+    parser.add_argument('--max-queries', type=int, default=30, help='Limite absoluto de consultas por rota.')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'query_counts.db')
+
+    import app as app_module
+    app_module.create_app()
+    from sqlalchemy import event
+
+    client = app_module.app.test_client()
+    client.post('/register', data={'username': 'count_user', 'email': 'count@example.com', 'password': 'count_password'})
+    client.post('/login', data={'identifier': 'count_user', 'password': 'count_password'})
+
+    with app_module.app.app_context():
+        engine = app_module.db.engine
+        user_id = app_module.User.query.filter_by(username='count_user').first().id
+        add_related_rows(app_module, user_id, args.scale, 0)
+    small_counts, _ = count_queries(app_module, client, engine, event)
+
+    with app_module.app.app_context():
+        add_related_rows(app_module, user_id, args.scale, args.scale)
+    large_counts, large_statements = count_queries(app_module, client, engine, event)
+
+    failures = 0
+    print(f"{'rota':<62} {args.scale:>6} {2 * args.scale:>6}")
+    for route in ROUTES:
+        small, large = small_counts[route], large_counts[route]
+        status = ''
+        if large > small:
+            status = '  <- cresce com os dados (N+1)'
+        elif large > args.max_queries:
+            status = f'  <- acima de {args.max_queries}'
+        print(f'{route:<62} {small:>6} {large:>6}{status}')
+        if status:
+            failures += 1
+            for statement, times in large_statements[route].most_common(3):
+                print(f'    {times}x {statement[:140]}')
+
+    print(f'{len(ROUTES)} rotas verificadas, {failures} com problema.')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
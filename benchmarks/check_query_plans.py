@@ -0,0 +1,125 @@
+"""
+Verificação de planos de consulta das rotas quentes.
+
+Sobe o app contra um banco descartável (ou --database-url), popula um usuário,
+exercita as rotas principais capturando cada SELECT emitido e roda EXPLAIN sobre
+eles. Termina com código 1 se alguma consulta fizer varredura completa de tabela
+(SQLite: "SCAN <tabela>" sem índice; Postgres: "Seq Scan" com enable_seqscan=off).
+
+Uso:
+    python benchmarks/check_query_plans.py
+    python benchmarks/check_query_plans.py --database-url postgresql://localhost/plans
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HOT_ROUTES = [
+    ('POST', '/login', {'identifier': 'plan_user', 'password': 'plan_password'}),
+    ('GET', '/', None),
+    ('GET', '/?bill_status=overdue&sort_by_transactions=amount', None),
+    ('GET', '/budgets', None),
+    ('GET', '/get_chart_data', None),
+    ('GET', '/profile/monthly_summary', None),
+    ('GET', '/get_detailed_report_data?start_date={start}&end_date={end}', None),
+]
+
+def seed_user(app_module, client):
+    client.post('/register', data={'username': 'plan_user', 'email': 'plan@example.com', 'password': 'plan_password'})
+    client.post('/login', data={'identifier': 'plan_user', 'password': 'plan_password'})
+    with app_module.app.app_context():
+        user = app_module.User.query.filter_by(username='plan_user').first()
+        account = app_module.Account.query.filter_by(user_id=user.id).first()
+        category = app_module.Category.query.filter_by(user_id=user.id, type='expense').first()
+        today = datetime.date.today()
+        for i in range(200):
+            app_module.db.session.add(app_module.Transaction(
+                description=f'plan {i}', amount=10.0 + i, date=today - datetime.timedelta(days=i),
+                type='expense' if i % 3 else 'income', user_id=user.id,
+                category_id=category.id, account_id=account.id))
+        app_module.db.session.add(app_module.Budget(
+            user_id=user.id, category_id=category.id, budget_amount=500.0,
+            month_year=today.strftime('%Y-%m')))
+        app_module.db.session.commit()
+    client.get('/logout')
+
+
+def explain_lines(connection, statement, parameters):
+    if connection.dialect.name == 'sqlite':
+        cursor = connection.connection.cursor()
+        cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+        return [row[-1] for row in cursor.fetchall()]
+    cursor = connection.connection.cursor()
+    cursor.execute('SET enable_seqscan = off')
+    cursor.execute('EXPLAIN ' + statement, parameters)
+    lines = [row[0] for row in cursor.fetchall()]
+    cursor.execute('RESET enable_seqscan')
+    return lines
+
+
+def full_scans(dialect_name, lines):
+    if dialect_name == 'sqlite':
+        return [line for line in lines
+                if line.startswith('SCAN ') and 'INDEX' not in line and 'CONSTANT ROW' not in line]
+    return [line for line in lines if 'Seq Scan' in line]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'query_plans.db')
+
+    import app as app_module
+    app_module.create_app()
+    from sqlalchemy import event
+
+    client = app_module.app.test_client()
+    seed_user(app_module, client)
+
+    captured = []
+    with app_module.app.app_context():
+        engine = app_module.db.engine
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            captured.append((captured_route[0], statement, parameters))
+
+    captured_route = [None]
+    event.listen(engine, 'before_cursor_execute', capture)
+    today = datetime.date.today()
+    for method, url, data in HOT_ROUTES:
+        url = url.format(start=(today - datetime.timedelta(days=90)).isoformat(), end=today.isoformat())
+        captured_route[0] = f'{method} {url}'
+        response = client.open(url, method=method, data=data)
+        if response.status_code >= 400:
+            print(f'{method} {url}: HTTP {response.status_code}')
+            return 1
+    event.remove(engine, 'before_cursor_execute', capture)
+
+    failures = 0
+    seen = set()
+    with engine.connect() as connection:
+        for route, statement, parameters in captured:
+            if statement in seen:
+                continue
+            seen.add(statement)
+            scans = full_scans(engine.dialect.name, explain_lines(connection, statement, parameters))
+            if scans:
+                failures += 1
+                print(f'FULL SCAN em {route}:\n    {" ".join(statement.split())}\n    -> {"; ".join(scans)}')
+
+    print(f'{len(seen)} consultas distintas verificadas, {failures} com varredura completa.')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
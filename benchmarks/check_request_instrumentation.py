@@ -0,0 +1,135 @@
+"""
+Verificação da instrumentação por requisição (instrumentation.RequestInstrumentation).
+
+Sobe o app contra um banco descartável com um usuário e --transactions transações, chama
+algumas rotas e confere, para cada uma:
+  - o cabeçalho Server-Timing (app;dur e db;dur com o número de consultas e linhas);
+  - a linha de log JSON da requisição, com os mesmos contadores de consultas;
+  - nas exportações, linhas lidas >= transações exportadas (consultas de colunas com yield_per
+    também contam, não só entidades do ORM);
+  - uma consulta com stream_results e yield_per (o caminho de cursor do lado do servidor das
+    exportações no PostgreSQL) conta exatamente as linhas buscadas;
+  - com SLOW_QUERY_MS baixo (--slow-query-ms), o log de consulta lenta com SQL e endpoint.
+Termina com código 1 se algum desses itens faltar (por exemplo, se uma versão nova do SQLAlchemy
+deixar de usar o cursor trocado por instrumentation.RequestInstrumentation).
+
+Uso:
+    python benchmarks/check_request_instrumentation.py
+    python benchmarks/check_request_instrumentation.py --transactions 5000 --slow-query-ms 0.5
+    python benchmarks/check_request_instrumentation.py --database-url postgresql://localhost/instrumentation
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# (rota, mínimo de linhas lidas: None = não confere, 'transactions' = todas as transações do período)
+ROUTES = [
+    ('/', None),
+    ('/get_transactions_page?transaction_type=expense&limit=100', 100),
+    ('/get_chart_data', None),
+    ('/export_report/csv?start_date={start}&end_date={end}', 'transactions'),
+    ('/export_report/ndjson?start_date={start}&end_date={end}', 'transactions'),
+]
+
+SERVER_TIMING = re.compile(r'app;dur=[\d.]+, db;dur=[\d.]+;desc="(\d+) consultas, (\d+) linhas"')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=None, help='Padrão: SQLite descartável (o banco precisa estar vazio).')
+    parser.add_argument('--transactions', type=int, default=500)
+    parser.add_argument('--slow-query-ms', type=float, default=0.01,
+                        help='Limite do log de consultas lentas durante a verificação.')
+    args = parser.parse_args()
+
+    os.environ.update({
+        'DATABASE_URL': args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'instrumentation.db'),
+        'PERF_INSTRUMENTATION': 'true', 'PERF_LOG_REQUESTS': 'true',
+        'SLOW_QUERY_MS': str(args.slow_query_ms),
+    })
+    import app as app_module
+    with contextlib.redirect_stdout(io.StringIO()):
+        app_module.create_app()
+    lines = []
+    app_module.request_instrumentation.log = lines.append
+
+    client = app_module.app.test_client()
+    with contextlib.redirect_stdout(io.StringIO()):
+        client.post('/register', data={'username': 'perf_user', 'email': 'perf@example.com', 'password': 'perf_password'})
+        client.post('/login', data={'identifier': 'perf_user', 'password': 'perf_password'})
+    with app_module.app.app_context():
+        user = app_module.User.query.filter_by(username='perf_user').first()
+        category = app_module.Category.query.filter_by(user_id=user.id, type='expense').first()
+        account = app_module.Account.query.filter_by(user_id=user.id).first()
+        today = datetime.date.today()
+        app_module.db.session.add_all([
+            app_module.Transaction(description=f'perf {i}', amount=5.0 + i % 20, date=today - datetime.timedelta(days=i % 90),
+                                   type='expense', user_id=user.id, category_id=category.id, account_id=account.id)
+            for i in range(args.transactions)
+        ])
+        app_module.rebuild_monthly_rollups_db(user.id)  # Inserção direta não passa pelo rollup
+        app_module.db.session.commit()
+
+    start, end = (datetime.date.today() - datetime.timedelta(days=120)).isoformat(), datetime.date.today().isoformat()
+    failures = []
+    for route, min_rows in ROUTES:
+        url = route.format(start=start, end=end)
+        if min_rows == 'transactions':
+            min_rows = args.transactions
+        lines.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = client.get(url)
+            response.get_data()
+            response.close()
+        events = [json.loads(line) for line in lines]
+        request_logs = [e for e in events if e['event'] == 'request']
+        slow_queries = [e for e in events if e['event'] == 'slow_query']
+
+        header = response.headers.get('Server-Timing', '')
+        match = SERVER_TIMING.search(header)
+        if response.status_code != 200:
+            failures.append(f'{url}: HTTP {response.status_code}')
+        if not match:
+            failures.append(f'{url}: Server-Timing ausente ou fora do formato ({header!r})')
+        if len(request_logs) != 1:
+            failures.append(f'{url}: {len(request_logs)} linhas de log de requisição (esperado 1)')
+        elif match and request_logs[0]['queries'] < int(match.group(1)):
+            failures.append(f'{url}: log com menos consultas que o Server-Timing')
+        elif min_rows is not None and request_logs[0]['rows'] < min_rows:
+            failures.append(f"{url}: {request_logs[0]['rows']} linhas lidas, esperado pelo menos {min_rows}")
+        if not slow_queries or any(not q['statement'] or q['endpoint'] is None for q in slow_queries):
+            failures.append(f'{url}: log de consultas lentas sem comando SQL ou endpoint')
+
+        log = request_logs[0] if request_logs else {}
+        print(f"{url:<60} {log.get('duration_ms', 0):8.1f} ms  db {log.get('db_ms', 0):7.1f} ms  "
+              f"{log.get('queries', 0):3} consultas  {log.get('rows', 0):6} linhas  {len(slow_queries):3} lentas")
+
+    # Streaming explícito: as linhas são buscadas em lotes depois do after_cursor_execute
+    with app_module.app.test_request_context():
+        app_module.request_instrumentation._start_request()
+        db, Transaction = app_module.db, app_module.Transaction
+        streamed = db.session.execute(db.select(Transaction.id).execution_options(stream_results=True, yield_per=50))
+        fetched = sum(1 for _ in streamed)
+        stats = app_module.request_instrumentation.current_stats()
+        print(f"{'stream_results + yield_per':<60} {fetched:6} linhas buscadas, {stats['rows']:6} contadas")
+        if fetched != args.transactions or stats['rows'] != fetched:
+            failures.append(f"streaming: {stats['rows']} linhas contadas, {fetched} buscadas, esperado {args.transactions}")
+        db.session.remove()
+
+    for failure in failures:
+        print(f"FALHOU {failure}")
+    if not failures:
+        print(f"\nok  Server-Timing, log por requisição e log de consultas lentas em {len(ROUTES)} rotas e linhas em streaming")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Benchmark antes/depois da migração das colunas de data (String(10) -> DATE).
+
+Cria duas cópias da tabela de transações/contas num banco separado:
+  - legacy: datas em VARCHAR(10), consultadas com CAST(... AS DATE) como o app fazia;
+  - native: datas em DATE com os índices (user_id, data) da migração 3f1c2a9d7b10.
+
+Para cada consulta quente imprime o plano (EXPLAIN / EXPLAIN QUERY PLAN) e o tempo médio.
+
+Uso:
+    python benchmarks/date_columns_query_plan.py --rows 1000000
+    python benchmarks/date_columns_query_plan.py --database-url postgresql://localhost/bench
+"""
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+
+import sqlalchemy as sa
+
+
+def build_tables(metadata, prefix, date_type):
+    transaction = sa.Table(
+        f'{prefix}_transaction', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('user_id', sa.Integer, nullable=False),
+        sa.Column('amount', sa.Float, nullable=False),
+        sa.Column('date', date_type, nullable=False),
+        sa.Column('type', sa.String(10), nullable=False),
+    )
+    bill = sa.Table(
+        f'{prefix}_bill', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('user_id', sa.Integer, nullable=False),
+        sa.Column('amount', sa.Float, nullable=False),
+        sa.Column('dueDate', date_type, nullable=False),
+        sa.Column('status', sa.String(10), nullable=False),
+        sa.Column('is_master_recurring_bill', sa.Boolean, nullable=False),
+    )
+    if prefix == 'native':
+        sa.Index(f'ix_{prefix}_transaction_user_date', transaction.c.user_id, transaction.c.date)
+        sa.Index(f'ix_{prefix}_bill_user_due_date', bill.c.user_id, bill.c.dueDate)
+    return transaction, bill
+
+
+def seed(conn, tables, rows, users, native, chunk_size=50000):
+    transaction, bill = tables
+    rnd = random.Random(42)
+    base = datetime.date.today() - datetime.timedelta(days=5 * 365)
+    as_value = (lambda d: d) if native else (lambda d: d.isoformat())
+
+    for offset in range(0, rows, chunk_size):
+        batch = []
+        for _ in range(min(chunk_size, rows - offset)):
+            day = base + datetime.timedelta(days=rnd.randrange(5 * 365 + 60))
+            batch.append({
+                'user_id': rnd.randint(1, users),
+                'amount': round(rnd.uniform(1, 500), 2),
+                'date': as_value(day),
+                'type': 'income' if rnd.random() < 0.2 else 'expense',
+            })
+        conn.execute(transaction.insert(), batch)
+
+    bills = []
+    for _ in range(max(rows // 20, 1)):
+        day = base + datetime.timedelta(days=rnd.randrange(5 * 365 + 60))
+        bills.append({
+            'user_id': rnd.randint(1, users),
+            'amount': round(rnd.uniform(10, 2000), 2),
+            'dueDate': as_value(day),
+            'status': rnd.choice(['pending', 'paid']),
+            'is_master_recurring_bill': False,
+        })
+    conn.execute(bill.insert(), bills)
+
+
+def hot_queries(tables, native, user_id):
+    transaction, bill = tables
+    month_start = datetime.date.today().replace(day=1)
+    next_month = (month_start + datetime.timedelta(days=32)).replace(day=1)
+
+    def date_col(col):
+        return col if native else sa.cast(col, sa.Date)
+
+    return {
+        'dashboard_monthly_expenses': sa.select(sa.func.sum(transaction.c.amount)).where(
+            transaction.c.user_id == user_id,
+            transaction.c.type == 'expense',
+            date_col(transaction.c.date) >= month_start,
+            date_col(transaction.c.date) < next_month,
+        ),
+        'dashboard_pending_bills': sa.select(bill.c.id, bill.c.amount).where(
+            bill.c.user_id == user_id,
+            bill.c.status == 'pending',
+            bill.c.is_master_recurring_bill == False,  # noqa: E712
+            date_col(bill.c.dueDate) < next_month,
+        ).order_by(date_col(bill.c.dueDate)),
+        'report_range': sa.select(transaction.c.id, transaction.c.amount).where(
+            transaction.c.user_id == user_id,
+            date_col(transaction.c.date) >= month_start - datetime.timedelta(days=365),
+            date_col(transaction.c.date) <= next_month,
+        ),
+    }
+
+
+def explain(conn, statement):
+    compiled = statement.compile(conn, compile_kwargs={'literal_binds': True})
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+    return [' | '.join(str(v) for v in row) for row in conn.exec_driver_sql(prefix + str(compiled))]
+
+
+def time_query(conn, statement, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(statement).fetchall()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    db_file = None
+    url = args.database_url
+    if not url:
+        db_file = os.path.join(tempfile.mkdtemp(), 'date_columns_bench.db')
+        url = 'sqlite:///' + db_file
+
+    engine = sa.create_engine(url)
+    metadata = sa.MetaData()
+    layouts = {
+        'legacy': build_tables(metadata, 'legacy', sa.String(10)),
+        'native': build_tables(metadata, 'native', sa.Date),
+    }
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        for name, tables in layouts.items():
+            started = time.perf_counter()
+            seed(conn, tables, args.rows, args.users, native=(name == 'native'))
+            print(f"seed {name}: {args.rows} transações em {time.perf_counter() - started:.1f}s")
+        if conn.dialect.name == 'sqlite':
+            conn.exec_driver_sql('ANALYZE')
+
+    with engine.connect() as conn:
+        for name, tables in layouts.items():
+            print(f"\n=== {name} ===")
+            for query_name, statement in hot_queries(tables, name == 'native', user_id=1).items():
+                elapsed_ms = time_query(conn, statement, args.repeat)
+                print(f"{query_name}: {elapsed_ms:.2f} ms")
+                for line in explain(conn, statement):
+                    print(f"    {line}")
+
+    metadata.drop_all(engine)
+    if db_file:
+        os.remove(db_file)
+
+
+if __name__ == '__main__':
+    main()
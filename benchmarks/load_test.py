@@ -0,0 +1,412 @@
+"""
+Teste de carga concorrente contra o app rodando localmente (gunicorn ou servidor de desenvolvimento).
+
+Popula o banco com --users usuários sintéticos (benchmarks/synthetic_data.py) e contas a pagar
+pendentes para eles, sobe o servidor com o Gemini e o SMTP substituídos por stand-ins locais e,
+para cada nível de --levels, mantém aquele número de usuários virtuais concorrentes por
+--duration segundos. Cada usuário virtual faz login com um usuário sintético (vários usuários
+virtuais podem compartilhar o mesmo usuário, e portanto as mesmas linhas de Account) e repete
+um mix realista: dashboard, listagem, inclusão de transações, pagamento de contas (/pay_bill),
+relatórios, gráficos, exportações, insight de IA e recuperação de senha. O insight de IA é
+assíncrono: a ação só termina quando /ai_jobs/<id> informa o job concluído, então a latência
+medida é a do resultado, não a do 202; job com erro, 404 ou sem resultado em --ai-poll-timeout
+segundos conta como erro.
+
+Por nível, e por endpoint, mostra vazão, latência (p50/p95/p99) e taxa de erro, e aponta o maior
+nível com p95 dentro de --p95-budget-ms e erros abaixo de --max-error-rate.
+
+Contenção nas linhas de Account:
+  - PostgreSQL: uma thread amostra pg_stat_activity e conta sessões esperando lock em UPDATEs de account;
+  - SQLite: o lock é do banco inteiro; conta os "database is locked" no log do servidor;
+  - nos dois: ao fim, compara saldo x ledger de cada conta com o início (atualizações perdidas).
+
+Uso:
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --levels 1,4,8,16,32 --duration 30 --workers 4 --threads 4
+    python benchmarks/load_test.py --database-url postgresql://localhost/finance_load --users 50
+"""
+import argparse
+import collections
+import datetime
+import http.client
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+import urllib.parse
+
+from mail_queue_benchmark import SMTPStandIn
+from synthetic_data import DEFAULT_PASSWORD, seed_database
+from wsgi_throughput_benchmark import ROOT, free_port, wait_until_ready
+
+USER_PREFIX = 'load_user'
+
+# (nome, peso) do mix de ações de um usuário virtual
+ACTION_MIX = [
+    ('dashboard', 30), ('transactions_page', 10), ('add_transaction', 15), ('pay_bill', 8),
+    ('detailed_report', 10), ('chart_data', 8), ('budgets', 5), ('export_csv', 3),
+    ('export_excel', 2), ('export_pdf', 1), ('ai_insight', 2), ('forgot_password', 1),
+]
+
+
+class StubModel:
+    """Substituto de genai.GenerativeModel no servidor: dorme LOAD_TEST_AI_DELAY segundos e responde sem rede."""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, request_options=None):
+        time.sleep(float(os.getenv('LOAD_TEST_AI_DELAY', 0.3)))
+        return types.SimpleNamespace(text='Insight de teste de carga.')
+
+
+def create_stubbed_app():
+    """Fábrica usada pelo servidor do teste (gunicorn 'load_test:create_stubbed_app()'): app com o Gemini substituído."""
+    sys.path.insert(0, ROOT)
+    import app as app_module
+    app_module._genai = types.SimpleNamespace(GenerativeModel=StubModel, configure=lambda **kwargs: None)
+    return app_module.create_app(start_scheduler=False)
+
+
+def prepare_users(app_module, args):
+    """Popula os usuários e devolve, por usuário, as categorias, contas e contas a pagar pendentes."""
+    seeded = seed_database(app_module, users=args.users, transactions=args.transactions, months=12,
+                           seed=args.seed, prefix=USER_PREFIX, password=DEFAULT_PASSWORD)
+    db = app_module.db
+    today = datetime.date.today()
+    profiles = []
+    with app_module.app.app_context():
+        for user_id, username in seeded:
+            category_ids = [c.id for c in app_module.Category.query.filter_by(user_id=user_id, type='expense')]
+            account_ids = [a.id for a in app_module.Account.query.filter_by(user_id=user_id).order_by(app_module.Account.id)]
+            db.session.execute(db.insert(app_module.Bill), [
+                {'description': f'Conta de carga {i}', 'amount': 25.0, 'dueDate': today + datetime.timedelta(days=i % 28),
+                 'status': 'pending', 'user_id': user_id, 'is_master_recurring_bill': False, 'is_active_recurring': False,
+                 'type': 'expense', 'category_id': category_ids[0], 'account_id': account_ids[0]}
+                for i in range(args.bills_per_user)
+            ])
+            db.session.commit()
+            bill_ids = [b.id for b in db.session.query(app_module.Bill.id).filter_by(
+                user_id=user_id, status='pending', is_master_recurring_bill=False).filter(
+                app_module.Bill.description.like('Conta de carga %'))]
+            profiles.append({'user_id': user_id, 'username': username, 'email': f'{username}@example.com',
+                             'category_ids': category_ids, 'account_ids': account_ids,
+                             'bill_ids': collections.deque(bill_ids), 'lock': threading.Lock()})
+        db.engine.dispose()
+    return profiles
+
+
+def account_drift(app_module):
+    """{account_id: saldo - soma do ledger}; deve ser igual antes e depois da carga (senão houve atualização perdida)."""
+    with app_module.app.app_context():
+        Transaction = app_module.Transaction
+        db = app_module.db
+        signed = db.case((Transaction.type == 'income', Transaction.amount), else_=-Transaction.amount)
+        ledger = dict(db.session.query(Transaction.account_id, db.func.sum(signed)).group_by(Transaction.account_id))
+        drift = {a.id: round(a.balance - (ledger.get(a.id) or 0.0), 2) for a in app_module.Account.query}
+        db.session.remove()
+        db.engine.dispose()
+    return drift
+
+
+class LockMonitor(threading.Thread):
+    """Amostra, no PostgreSQL, quantas sessões estão esperando lock em UPDATEs da tabela account."""
+
+    QUERY = ("SELECT count(*) FROM pg_stat_activity WHERE wait_event_type = 'Lock' "
+             "AND query ILIKE 'UPDATE account%%'")
+
+    def __init__(self, database_url, interval=0.05):
+        super().__init__(daemon=True)
+        from sqlalchemy import create_engine, text
+        self.engine = create_engine(database_url)
+        self.text = text
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        with self.engine.connect() as conn:
+            while not self.stopped.is_set():
+                self.samples.append(conn.execute(self.text(self.QUERY)).scalar())
+                conn.rollback()
+                time.sleep(self.interval)
+
+    def summary(self):
+        waiting = [s for s in self.samples if s]
+        return {'samples': len(self.samples), 'samples_with_waiters': len(waiting),
+                'max_waiters': max(self.samples, default=0),
+                'mean_waiters': statistics.mean(self.samples) if self.samples else 0.0}
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, port, profile, stop_at, rng, results, think_time, ai_poll_timeout=60.0):
+        super().__init__(daemon=True)
+        self.port = port
+        self.profile = profile
+        self.stop_at = stop_at
+        self.rng = rng
+        # nome da ação -> lista de (latência, status ou None em erro de rede / job de IA que não terminou)
+        self.results = results
+        self.think_time = think_time
+        self.ai_poll_timeout = ai_poll_timeout
+        self.conn = None
+        self.cookie = None
+
+    def request(self, method, path, body=None, content_type='application/x-www-form-urlencoded', cookie=True):
+        headers = {}
+        if cookie:
+            headers['Cookie'] = self.cookie
+        if body is not None:
+            headers['Content-Type'] = content_type
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            self.conn.request(method, path, body, headers)
+            response = self.conn.getresponse()
+            response.body = response.read()
+            if response.will_close:
+                self.conn.close()
+                self.conn = None
+            return response
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            raise
+
+    def login(self):
+        body = urllib.parse.urlencode({'identifier': self.profile['username'], 'password': DEFAULT_PASSWORD})
+        response = self.request('POST', '/login', body, cookie=False)
+        cookies = [value.split(';', 1)[0] for name, value in response.getheaders() if name.lower() == 'set-cookie']
+        if response.status != 302 or not cookies:
+            raise RuntimeError(f"login de {self.profile['username']} falhou: HTTP {response.status}")
+        self.cookie = '; '.join(cookies)
+
+    def action_request(self, name):
+        today = datetime.date.today()
+        profile = self.profile
+        if name == 'dashboard':
+            return 'GET', '/', None
+        if name == 'transactions_page':
+            return 'GET', '/get_transactions_page?transaction_type=expense&limit=50', None
+        if name == 'add_transaction':
+            return 'POST', '/add_transaction', urllib.parse.urlencode({
+                'description': 'Carga', 'amount': f'{self.rng.uniform(5, 60):.2f}', 'date': today.isoformat(),
+                'type': 'expense', 'category_id': self.rng.choice(profile['category_ids']),
+                'account_id': self.rng.choice(profile['account_ids'])})
+        if name == 'pay_bill':
+            with profile['lock']:
+                bill_id = profile['bill_ids'].popleft() if profile['bill_ids'] else None
+            if bill_id is None:
+                return 'GET', '/', None
+            return 'POST', f'/pay_bill/{bill_id}', urllib.parse.urlencode({'payment_account_id': profile['account_ids'][0]})
+        if name == 'detailed_report':
+            start = (today - datetime.timedelta(days=90)).isoformat()
+            return 'GET', f'/get_detailed_report_data?start_date={start}&end_date={today.isoformat()}', None
+        if name == 'chart_data':
+            return 'GET', '/get_chart_data', None
+        if name == 'budgets':
+            return 'GET', '/budgets', None
+        if name.startswith('export_'):
+            start = (today - datetime.timedelta(days=30)).isoformat()
+            return 'GET', f"/export_report/{name.split('_', 1)[1]}?start_date={start}&end_date={today.isoformat()}", None
+        if name == 'ai_insight':
+            return 'POST', '/ai_insight', json.dumps({'summary_data': {
+                'income': self.rng.uniform(1000, 9000), 'expenses': 1000.0, 'balance': 0.0}})
+        if name == 'forgot_password':
+            return 'POST', '/forgot_password', urllib.parse.urlencode({'email': profile['email']})
+        raise ValueError(name)
+
+    def wait_for_ai_job(self, response):
+        """Consulta /ai_jobs/<id> até o job terminar; retorna o status HTTP final, ou None se o job não concluiu."""
+        job = json.loads(response.body)
+        status_url = job.get('status_url')  # Só no 202; acerto no cache já vem concluído
+        deadline = time.monotonic() + self.ai_poll_timeout
+        while job['status'] in ('pending', 'running'):
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.05)
+            response = self.request('GET', status_url)
+            if response.status != 200:
+                return response.status
+            job = json.loads(response.body)
+        return 200 if job['status'] == 'done' else None
+
+    def run(self):
+        names = [name for name, _ in ACTION_MIX]
+        weights = [weight for _, weight in ACTION_MIX]
+        try:
+            self.login()
+        except Exception as e:
+            self.results['login'].append((0.0, None))
+            print(f"ERRO {e}")
+            return
+        while time.monotonic() < self.stop_at:
+            name = self.rng.choices(names, weights=weights)[0]
+            method, path, body = self.action_request(name)
+            content_type = 'application/json' if name == 'ai_insight' else 'application/x-www-form-urlencoded'
+            started = time.perf_counter()
+            try:
+                response = self.request(method, path, body, content_type, cookie=name != 'forgot_password')
+                status = response.status
+                if name == 'ai_insight' and status in (200, 202):
+                    status = self.wait_for_ai_job(response)
+            except (OSError, http.client.HTTPException):
+                status = None
+            self.results[name].append((time.perf_counter() - started, status))
+            if self.think_time:
+                time.sleep(self.rng.uniform(0, 2 * self.think_time))
+        if self.conn is not None:
+            self.conn.close()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(latency for latency, _ in samples)
+    errors = sum(1 for _, status in samples if status is None or status >= 400)
+    return {
+        'requests': len(samples), 'rps': len(samples) / elapsed, 'errors': errors,
+        'error_rate': errors / len(samples) if samples else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000, 'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def print_summary(label, stats):
+    print(f"  {label:<18} {stats['requests']:7} req {stats['rps']:8.1f}/s   p50 {stats['p50_ms']:8.1f} ms   "
+          f"p95 {stats['p95_ms']:8.1f} ms   p99 {stats['p99_ms']:8.1f} ms   erros {stats['error_rate']:6.1%}")
+
+
+def run_level(port, profiles, level, args, seed):
+    results = collections.defaultdict(list)
+    stop_at = time.monotonic() + args.duration
+    users = [VirtualUser(port, profiles[i % len(profiles)], stop_at, random.Random(seed + i), results, args.think_ms / 1000,
+                         args.ai_poll_timeout)
+             for i in range(level)]
+    started = time.perf_counter()
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    elapsed = time.perf_counter() - started
+    per_endpoint = {name: summarize(samples, elapsed) for name, samples in sorted(results.items())}
+    overall = summarize([s for samples in results.values() for s in samples], elapsed)
+    return overall, per_endpoint
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=None, help='Padrão: SQLite descartável.')
+    parser.add_argument('--server', choices=['gunicorn', 'dev'], default='gunicorn')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='Workers do gunicorn.')
+    parser.add_argument('--threads', type=int, default=4, help='Threads por worker do gunicorn.')
+    parser.add_argument('--users', type=int, default=10, help='Usuários sintéticos (contas distintas).')
+    parser.add_argument('--transactions', type=int, default=2000, help='Transações por usuário sintético.')
+    parser.add_argument('--bills-per-user', type=int, default=500)
+    parser.add_argument('--levels', default='1,4,8,16', help='Usuários virtuais concorrentes em cada nível.')
+    parser.add_argument('--duration', type=float, default=15.0, help='Segundos por nível.')
+    parser.add_argument('--think-ms', type=float, default=0.0, help='Pausa média entre ações de um usuário virtual.')
+    parser.add_argument('--p95-budget-ms', type=float, default=500.0)
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--ai-delay', type=float, default=0.3, help='Latência simulada do Gemini, em segundos.')
+    parser.add_argument('--ai-poll-timeout', type=float, default=60.0,
+                        help='Segundos esperando o resultado de um job de IA antes de contar como erro.')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', default=None, help='Grava os resultados em JSON.')
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(',')]
+    database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'load_test.db')
+    is_postgres = database_url.startswith(('postgres://', 'postgresql'))
+
+    smtp = SMTPStandIn(0.002, 0)
+    threading.Thread(target=smtp.serve_forever, daemon=True).start()
+    smtp_host, smtp_port = smtp.server_address
+
+    os.environ.update({'DATABASE_URL': database_url, 'PERF_LOG_REQUESTS': 'false', 'RECURRING_SCHEDULER_INTERVAL': '0'})
+    sys.path.insert(0, ROOT)
+    import app as app_module
+    app_module.create_app()
+    started = time.perf_counter()
+    profiles = prepare_users(app_module, args)
+    print(f"{len(profiles)} usuários sintéticos com {args.transactions} transações cada em {time.perf_counter() - started:.1f}s")
+    drift_before = account_drift(app_module)
+
+    port = free_port()
+    log_path = os.path.join(tempfile.mkdtemp(), 'server.log')
+    env = dict(os.environ, PORT=str(port), GUNICORN_ACCESS_LOG='', PYTHONPATH=os.path.dirname(os.path.abspath(__file__)),
+               EMAIL_SERVER=smtp_host, EMAIL_PORT=str(smtp_port), EMAIL_USE_TLS='false',
+               EMAIL_USERNAME='load@example.com', EMAIL_PASSWORD='load_password',
+               AI_JOB_PER_USER_LIMIT=str(max(levels) * 4), LOAD_TEST_AI_DELAY=str(args.ai_delay),
+               WEB_CONCURRENCY=str(args.workers), GUNICORN_THREADS=str(args.threads))
+    if args.server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'load_test:create_stubbed_app()']
+    else:
+        command = [sys.executable, '-c', f"import load_test; load_test.create_stubbed_app().run(port={port}, threaded=True)"]
+
+    report = {'database': database_url.split(':', 1)[0], 'server': args.server, 'workers': args.workers,
+              'threads': args.threads, 'users': args.users, 'levels': []}
+    monitor = None
+    with open(log_path, 'w') as server_log:
+        process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=server_log, stderr=subprocess.STDOUT)
+        try:
+            wait_until_ready(port, process)
+            if is_postgres:
+                monitor = LockMonitor(database_url)
+                monitor.start()
+            for i, level in enumerate(levels):
+                overall, per_endpoint = run_level(port, profiles, level, args, args.seed * 1000 + i * 100)
+                print(f"\n{level} usuários virtuais ({args.duration:.0f}s):")
+                print_summary('total', overall)
+                for name, stats in per_endpoint.items():
+                    print_summary(name, stats)
+                report['levels'].append({'virtual_users': level, 'overall': overall, 'endpoints': per_endpoint})
+        finally:
+            if monitor is not None:
+                monitor.stopped.set()
+                monitor.join()
+            process.terminate()
+            process.wait(timeout=30)
+
+    server_label = f"gunicorn, {args.workers} workers x {args.threads} threads" if args.server == 'gunicorn' else 'servidor de desenvolvimento'
+    within_budget = [entry['virtual_users'] for entry in report['levels']
+                     if entry['overall']['p95_ms'] <= args.p95_budget_ms and entry['overall']['error_rate'] <= args.max_error_rate]
+    print(f"\nCapacidade: {max(within_budget) if within_budget else 0} usuários virtuais com p95 <= "
+          f"{args.p95_budget_ms:.0f} ms e erros <= {args.max_error_rate:.0%} "
+          f"({server_label}, {report['database']})")
+
+    print("\nContenção em Account:")
+    with open(log_path, encoding='utf-8', errors='replace') as server_log:
+        locked_errors = server_log.read().count('database is locked')
+    print(f"  'database is locked' no log do servidor: {locked_errors}")
+    if monitor is not None:
+        lock_summary = monitor.summary()
+        print(f"  pg_stat_activity: {lock_summary['samples_with_waiters']}/{lock_summary['samples']} amostras com sessões "
+              f"esperando lock em UPDATE account (máx. {lock_summary['max_waiters']}, média {lock_summary['mean_waiters']:.2f})")
+        report['pg_lock_waits'] = lock_summary
+    drift_after = account_drift(app_module)
+    drifted = {account_id: (drift_before.get(account_id), drift) for account_id, drift in drift_after.items()
+               if abs(drift - drift_before.get(account_id, drift)) > 0.01}
+    print(f"  contas com saldo divergente do ledger depois da carga: {len(drifted)}")
+    report.update({'database_locked_errors': locked_errors, 'accounts_drifted': len(drifted)})
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"\nResultados gravados em {args.output}")
+    print(f"Log do servidor: {log_path}")
+    return 1 if drifted else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
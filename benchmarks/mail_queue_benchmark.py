@@ -0,0 +1,177 @@
+"""
+Benchmark da fila de e-mails (mailer.MailQueue) contra um servidor SMTP local.
+
+Sobe um stand-in SMTP em 127.0.0.1 (EHLO, AUTH, MAIL, RCPT, DATA, RSET, NOOP, QUIT, sem TLS)
+que espera --latency ms antes de cada resposta, simulando a ida e volta até o provedor, e:
+  - mede a latência de POST /forgot_password, que agora só enfileira o e-mail;
+  - mede a vazão da fila até todos os e-mails chegarem ao servidor, com quantas conexões abriu;
+  - com --fail-every K o servidor recusa temporariamente (451) um em cada K envios, para
+    exercitar as novas tentativas com backoff;
+  - com --legacy mede também o envio antigo (uma conexão + login por mensagem, dentro da requisição).
+Termina com código 1 se algum e-mail não chegar.
+
+O aiosmtpd não é necessário: o stand-in usa só a biblioteca padrão.
+
+Uso:
+    python benchmarks/mail_queue_benchmark.py
+    python benchmarks/mail_queue_benchmark.py --messages 500 --latency 20 --legacy --fail-every 10
+"""
+import argparse
+import os
+import smtplib
+import socketserver
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from email.mime.text import MIMEText
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Servidor SMTP mínimo que aceita qualquer login e conta mensagens e conexões."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency, fail_every):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.latency = latency
+        self.fail_every = fail_every
+        self.lock = threading.Lock()
+        self.delivered = []
+        self.connections = 0
+        self.data_commands = 0
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        time.sleep(self.server.latency)
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        self.reply('220 localhost stand-in')
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self.wfile.write(b'250-localhost\r\n')
+                self.reply('250 AUTH PLAIN LOGIN')
+            elif verb == 'HELO':
+                self.reply('250 localhost')
+            elif verb == 'AUTH':
+                self.reply('235 2.7.0 Authentication successful')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip(' <>'))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                with self.server.lock:
+                    self.server.data_commands += 1
+                    rejected = self.server.fail_every and self.server.data_commands % self.server.fail_every == 0
+                    if not rejected:
+                        self.server.delivered.extend(recipients)
+                self.reply('451 4.3.0 Try again later' if rejected else '250 OK queued')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+def legacy_send(host, port, recipient):
+    """Envio como era antes: conexão, login e envio dentro da requisição, uma conexão por mensagem."""
+    message = MIMEText("Seu código de recuperação de senha é: 123456\nEste código é válido por 10 minutos.")
+    message["Subject"] = "Código de Recuperação de Senha"
+    message["From"] = 'bench@example.com'
+    message["To"] = recipient
+    with smtplib.SMTP(host, port) as server:
+        server.login('bench@example.com', 'bench_password')
+        server.sendmail('bench@example.com', recipient, message.as_string())
+
+
+def describe(label, latencies, total, count):
+    print(f"{label}: requisição p50 {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p95 {sorted(latencies)[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms; "
+          f"{count} e-mails em {total:.2f}s ({count / total:.0f}/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=5.0, help='Atraso do servidor por resposta, em ms.')
+    parser.add_argument('--fail-every', type=int, default=0, help='Recusa com 451 um em cada K envios (0 = nunca).')
+    parser.add_argument('--workers', type=int, default=1, help='Workers (sessões SMTP) da fila.')
+    parser.add_argument('--legacy', action='store_true', help='Mede também o envio antigo, uma conexão por mensagem.')
+    args = parser.parse_args()
+
+    server = SMTPStandIn(args.latency / 1000, args.fail_every)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+
+    os.environ.update({
+        'DATABASE_URL': 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'mail_queue.db'),
+        'EMAIL_USERNAME': 'bench@example.com', 'EMAIL_PASSWORD': 'bench_password',
+        'EMAIL_SERVER': host, 'EMAIL_PORT': str(port), 'EMAIL_USE_TLS': 'false',
+        'MAIL_QUEUE_WORKERS': str(args.workers), 'MAIL_RETRY_BACKOFF': '0.05',
+        'MAIL_QUEUE_MAX_SIZE': str(max(args.messages, 1000)),
+    })
+    import app as app_module
+    app_module.create_app()
+
+    with app_module.app.app_context():
+        app_module.db.session.add_all([
+            app_module.User(username=f'mail_user_{i}', email=f'mail_user_{i}@example.com', password_hash='x')
+            for i in range(args.messages)
+        ])
+        app_module.db.session.commit()
+    client = app_module.app.test_client()
+
+    latencies = []
+    started = time.perf_counter()
+    for i in range(args.messages):
+        request_started = time.perf_counter()
+        response = client.post('/forgot_password', data={'email': f'mail_user_{i}@example.com'})
+        latencies.append(time.perf_counter() - request_started)
+        if response.status_code != 302:
+            raise SystemExit(f'/forgot_password: HTTP {response.status_code}')
+    app_module.mail_queue.join(timeout=120)
+    total = time.perf_counter() - started
+
+    stats = app_module.mail_queue.stats
+    describe('fila  ', latencies, total, args.messages)
+    print(f"        {stats['connections']} conexões SMTP, {stats['retried']} novas tentativas, {stats['failed']} falhas definitivas")
+    missing = args.messages - len(set(server.delivered))
+
+    if args.legacy:
+        server.fail_every = 0
+        latencies = []
+        started = time.perf_counter()
+        for i in range(args.messages):
+            request_started = time.perf_counter()
+            legacy_send(host, port, f'legacy_{i}@example.com')
+            latencies.append(time.perf_counter() - request_started)
+        describe('legado', latencies, time.perf_counter() - started, args.messages)
+
+    app_module.mail_queue.stop()
+    print(f"{args.messages - missing}/{args.messages} e-mails da fila entregues.")
+    return 1 if missing else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""
+Verificação do endpoint /metrics (metrics.AppMetrics) com gunicorn multi-worker.
+
+Sobe o gunicorn (gunicorn.conf.py, --workers workers) contra um banco descartável, dispara
+--requests requisições a / e /get_chart_data e lê /metrics: como cada worker grava em
+PROMETHEUS_MULTIPROC_DIR, a contagem do histograma de latência de cada endpoint tem que bater
+com o total de requisições, não importa qual worker atendeu. Também confere que as séries do
+Gemini, da fila de e-mails, das recorrências e do pool do banco estão expostas, que uma
+execução do agendador (`flask process-recurring`, outro processo no mesmo diretório, como no
+Procfile) aparece na contagem de transações de assinatura e que /metrics recusa requisições sem
+o METRICS_TOKEN (e fica desligado quando ele não está definido).
+
+Mede ainda o custo de registrar uma observação no histograma, em memória e no modo
+multiprocesso (mmap), para confirmar que é desprezível no caminho quente.
+Termina com código 1 se alguma contagem não bater ou faltar alguma série.
+
+Uso:
+    python benchmarks/metrics_check.py
+    python benchmarks/metrics_check.py --workers 4 --requests 400
+"""
+import argparse
+import contextlib
+import datetime
+import http.client
+import io
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+from wsgi_throughput_benchmark import ROOT, free_port, login, seed, wait_until_ready
+
+ENDPOINTS = {'/': 'index', '/get_chart_data': 'get_chart_data'}
+METRICS_TOKEN = 'metrics-check-token'
+DUE_SUBSCRIPTIONS = 3
+EXPECTED_SERIES = [
+    'finance_request_duration_seconds_bucket',
+    'finance_gemini_calls_total',
+    'finance_gemini_failures_total',
+    'finance_recurring_bills_generated_total',
+    'finance_subscription_transactions_generated_total',
+    'finance_db_pool_checkouts_total',
+    'finance_db_pool_connects_total',
+    'finance_db_pool_wait_seconds_count',
+]
+
+OVERHEAD_SCRIPT = """
+import time
+from metrics import AppMetrics
+metrics = AppMetrics()
+observe = lambda: metrics.request_latency.labels('index', 'GET').observe(0.01)
+observe()
+started = time.perf_counter()
+for _ in range({n}):
+    observe()
+print((time.perf_counter() - started) / {n} * 1e6)
+"""
+
+
+DISABLED_SCRIPT = """
+import contextlib, io
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+print(app.app.test_client().get('/metrics').status_code)
+"""
+
+
+def add_due_subscriptions(count):
+    """Cria assinaturas vencidas para o usuário do seed (o banco já está configurado por seed())."""
+    import app as app_module
+    with app_module.app.app_context():
+        user = app_module.User.query.first()
+        account = app_module.Account.query.filter_by(user_id=user.id).first()
+        today = datetime.date.today()
+        app_module.db.session.add_all([
+            app_module.Subscription(user_id=user.id, name=f'Assinatura {i}', amount=5.0, billing_cycle='monthly',
+                                    due_date_of_month=min(today.day, 28), next_due_date=today - datetime.timedelta(days=1),
+                                    status='active', account_id=account.id)
+            for i in range(count)
+        ])
+        user.recurring_processed_through = None  # seed() marca o usuário como em dia
+        app_module.db.session.commit()
+        app_module.db.engine.dispose()
+
+
+def get_metrics(port, authorization=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    conn.request('GET', '/metrics', headers={'Authorization': authorization} if authorization else {})
+    response = conn.getresponse()
+    body = response.read().decode()
+    conn.close()
+    return response, body
+
+
+def observe_cost_us(multiproc_dir, n=100000):
+    env = dict(os.environ)
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    if multiproc_dir:
+        env['PROMETHEUS_MULTIPROC_DIR'] = multiproc_dir
+    result = subprocess.run([sys.executable, '-c', OVERHEAD_SCRIPT.format(n=n)], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.strip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--requests', type=int, default=120, help='Requisições por endpoint.')
+    parser.add_argument('--transactions', type=int, default=200)
+    args = parser.parse_args()
+
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'metrics.db')
+    with contextlib.redirect_stdout(io.StringIO()):
+        seed(database_url, args.transactions)
+        add_due_subscriptions(DUE_SUBSCRIPTIONS)
+
+    multiproc_dir = tempfile.mkdtemp(prefix='finance-prometheus-')
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, RECURRING_SCHEDULER_INTERVAL='0', GUNICORN_ACCESS_LOG='',
+               PORT=str(port), WEB_CONCURRENCY=str(args.workers), GUNICORN_THREADS='2',
+               PROMETHEUS_MULTIPROC_DIR=multiproc_dir, PERF_LOG_REQUESTS='false', METRICS_TOKEN=METRICS_TOKEN)
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(port, process)
+        cookie = login(port)
+        for path in ENDPOINTS:
+            for _ in range(args.requests):
+                # Conexão nova por requisição para espalhar a carga entre os workers
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                conn.request('GET', path, headers={'Cookie': cookie, 'Connection': 'close'})
+                conn.getresponse().read()
+                conn.close()
+        # O agendador é outro processo: os contadores dele só chegam ao /metrics do web pelo diretório comum
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'wsgi', 'process-recurring'],
+                       cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        unauthorized, _ = get_metrics(port)
+        wrong_token, _ = get_metrics(port, 'Bearer errado')
+        response, exposition = get_metrics(port, f'Bearer {METRICS_TOKEN}')
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    failures = []
+    if unauthorized.status != 401 or wrong_token.status != 401:
+        failures.append(f'/metrics sem token: HTTP {unauthorized.status}, token errado: HTTP {wrong_token.status} (esperado 401)')
+    if response.status != 200 or not response.getheader('Content-Type', '').startswith('text/plain'):
+        failures.append(f'/metrics: HTTP {response.status}, {response.getheader("Content-Type")}')
+    worker_files = {name.rsplit('_', 1)[-1] for name in os.listdir(multiproc_dir) if name.startswith('histogram_')}
+    print(f"/metrics agregou {len(worker_files)} processos ({args.workers} workers do gunicorn)")
+    for path, endpoint in ENDPOINTS.items():
+        match = re.search(rf'finance_request_duration_seconds_count{{endpoint="{endpoint}",method="GET"}} ([\d.e+]+)', exposition)
+        count = float(match.group(1)) if match else 0
+        print(f"  {endpoint:<16} {count:6.0f} observações (esperado {args.requests})")
+        if count != args.requests:
+            failures.append(f'{endpoint}: {count:.0f} observações no histograma, esperado {args.requests}')
+    for series in EXPECTED_SERIES:
+        if series not in exposition:
+            failures.append(f'série {series} ausente em /metrics')
+    match = re.search(r'finance_subscription_transactions_generated_total ([\d.e+]+)', exposition)
+    scheduled = float(match.group(1)) if match else 0
+    print(f"  transações de assinatura do agendador: {scheduled:.0f} (esperado {DUE_SUBSCRIPTIONS})")
+    if scheduled != DUE_SUBSCRIPTIONS:
+        failures.append(f'agendador: {scheduled:.0f} transações de assinatura em /metrics, esperado {DUE_SUBSCRIPTIONS}')
+
+    disabled_env = dict(env, METRICS_TOKEN='')
+    disabled_env.pop('PROMETHEUS_MULTIPROC_DIR')  # Vazia ainda liga o modo multiprocesso (arquivos no cwd)
+    disabled = subprocess.run([sys.executable, '-c', DISABLED_SCRIPT], cwd=ROOT, capture_output=True, text=True,
+                              env=disabled_env)
+    print(f"/metrics sem METRICS_TOKEN configurado: HTTP {disabled.stdout.strip()}")
+    if disabled.stdout.strip() != '404':
+        failures.append(f'/metrics sem METRICS_TOKEN configurado: HTTP {disabled.stdout.strip() or disabled.stderr[-200:]}, esperado 404')
+
+    in_memory, mmap = observe_cost_us(None), observe_cost_us(tempfile.mkdtemp(prefix='finance-prometheus-'))
+    print(f"custo de uma observação no histograma: {in_memory:.2f} µs em memória, {mmap:.2f} µs no modo multiprocesso")
+
+    for failure in failures:
+        print(f"FALHOU {failure}")
+    if not failures:
+        print("\nok  /metrics agrega os workers e o agendador, expõe todas as séries e exige o token")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
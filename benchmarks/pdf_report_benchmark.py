@@ -0,0 +1,155 @@
+"""
+Benchmark do relatório em PDF (pdf_report.render_transactions_report).
+
+Gera linhas sintéticas já no formato da consulta de exportação (nomes resolvidos) e mede,
+para cada tamanho, o tempo de renderização, o número de páginas e o tamanho do arquivo.
+Com --legacy também mede o desenho antigo do export_report (ORM com relacionamentos
+por linha e saída em BytesIO), simulado com objetos que resolvem category/account sob demanda.
+
+Uso:
+    python benchmarks/pdf_report_benchmark.py
+    python benchmarks/pdf_report_benchmark.py --rows 10000 100000 --legacy --trace-memory
+"""
+import argparse
+import collections
+import datetime
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fpdf import FPDF
+
+from pdf_report import render_transactions_report
+
+ExportRow = collections.namedtuple('ExportRow', 'description amount date type category_name account_name')
+
+CATEGORY_NAMES = ['Alimentação', 'Transporte', 'Moradia', 'Lazer', 'Saúde', 'Salário']
+ACCOUNT_NAMES = ['Conta Principal', 'Cartão de Crédito', 'Poupança']
+
+
+def generate_rows(count, seed=42):
+    rnd = random.Random(seed)
+    base = datetime.date.today() - datetime.timedelta(days=5 * 365)
+    for i in range(count):
+        yield ExportRow(
+            description=f"Transação {i} " + 'x' * rnd.randrange(40),
+            amount=round(rnd.uniform(1, 5000), 2),
+            date=base + datetime.timedelta(days=i * 5 * 365 // max(count, 1)),
+            type=rnd.choice(['income', 'expense']),
+            category_name=rnd.choice(CATEGORY_NAMES),
+            account_name=rnd.choice(ACCOUNT_NAMES),
+        )
+
+
+def summary_charts():
+    expenses = {'labels': CATEGORY_NAMES[:-1], 'values': [1234.5, 456.7, 2100.0, 320.1, 99.9]}
+    balance = {'labels': [f"2026-01-{day:02d}" for day in range(1, 31)], 'values': [1000.0 + day for day in range(30)]}
+    return expenses, balance
+
+
+class _Named:
+    def __init__(self, name):
+        self.name = name
+
+
+class _LazyTransaction:
+    """Imita uma Transaction do ORM: category/account custam um lookup a cada acesso."""
+
+    def __init__(self, row, lookup):
+        self._row = row
+        self._lookup = lookup
+        self.description, self.amount, self.date, self.type = row.description, row.amount, row.date, row.type
+
+    @property
+    def category(self):
+        return self._lookup(self._row.category_name)
+
+    @property
+    def account(self):
+        return self._lookup(self._row.account_name)
+
+
+def render_legacy(rows, expenses_chart, balance_chart):
+    """Cópia do desenho anterior do export_report (sem cabeçalho repetido, saída em BytesIO)."""
+    lookup = lambda name: _Named(name)
+    filtered_transactions = [_LazyTransaction(row, lookup) for row in rows]
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    pdf.cell(200, 10, text="Relatório", new_x="LMARGIN", new_y="NEXT", align='C')
+    pdf.ln(10)
+    pdf.set_font("Arial", size=10, style='B')
+    pdf.cell(0, 10, text="Transações:", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font("Arial", size=8)
+    col_widths = [60, 20, 20, 20, 40, 30]
+    for width, title in zip(col_widths, ["Descrição", "Valor", "Data", "Tipo", "Categoria", "Conta"]):
+        pdf.cell(width, 7, title, 1)
+    pdf.ln()
+    for t in filtered_transactions:
+        description_display = t.description.replace('\n', ' ').replace('\r', ' ')
+        if len(description_display) > 35:
+            description_display = description_display[:32] + "..."
+        pdf.cell(col_widths[0], 7, description_display, 1)
+        pdf.cell(col_widths[1], 7, f"R$ {t.amount:.2f}", 1)
+        pdf.cell(col_widths[2], 7, t.date.isoformat(), 1)
+        pdf.cell(col_widths[3], 7, "Receita" if t.type == "income" else "Despesa", 1)
+        pdf.cell(col_widths[4], 7, t.category.name if t.category else "N/A", 1)
+        pdf.cell(col_widths[5], 7, t.account.name if t.account else "N/A", 1)
+        pdf.ln()
+    for label, value in zip(expenses_chart['labels'], expenses_chart['values']):
+        pdf.cell(0, 7, text=f"{label}: R$ {value:.2f}", new_x="LMARGIN", new_y="NEXT")
+    for label, value in zip(balance_chart['labels'], balance_chart['values']):
+        pdf.cell(0, 7, text=f"{label}: R$ {value:.2f}", new_x="LMARGIN", new_y="NEXT")
+    output = io.BytesIO(pdf.output())
+    return pdf.page, len(output.getvalue())
+
+
+def render_current(rows, expenses_chart, balance_chart):
+    with tempfile.SpooledTemporaryFile(max_size=5 * 1024 * 1024) as output:
+        render_transactions_report(output, "Relatório", rows, expenses_chart, balance_chart)
+        size = output.tell()
+    return None, size
+
+
+def measure(name, render, rows, trace_memory):
+    expenses_chart, balance_chart = summary_charts()
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    pages, size = render(rows, expenses_chart, balance_chart)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    if trace_memory:
+        tracemalloc.stop()
+
+    line = f"{name:>8}: {elapsed:8.2f}s  {size / 1e6:8.2f} MB de PDF"
+    if pages:
+        line += f"  {pages} páginas"
+    if peak is not None:
+        line += f"  pico de memória {peak / 1e6:.1f} MB"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--legacy', action='store_true', help='Mede também o desenho anterior do export_report.')
+    parser.add_argument('--trace-memory', action='store_true', help='Mede o pico de memória com tracemalloc (mais lento).')
+    args = parser.parse_args()
+
+    for count in args.rows:
+        print(f"\n=== {count} transações ===")
+        measure('atual', render_current, generate_rows(count), args.trace_memory)
+        if args.legacy:
+            measure('legado', render_legacy, generate_rows(count), args.trace_memory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Verificação do profiler sob demanda (profiler.RequestProfiler).
+
+Sobe o app com PROFILER_ENABLED contra um banco descartável e confere:
+  - `X-Profile: <token>` gera um .pstats legível pelo pstats, e com `X-Profile-Mode: sample`
+    um .collapsed (uma pilha por linha, "a;b;c contagem") da thread da requisição;
+  - requisições sem o cabeçalho e com PROFILER_SAMPLE_RATE=0 não são perfiladas;
+  - /admin/profiles exige o token, lista e baixa os perfis, e POST /admin/profiles/sample
+    amostra o processo inteiro;
+  - a rotação mantém no máximo PROFILER_MAX_FILES arquivos;
+  - com o profiler desligado (padrão) nenhum hook é registrado no app: custo zero.
+Termina com código 1 se alguma verificação falhar.
+
+Uso:
+    python benchmarks/profiler_check.py
+"""
+import contextlib
+import io
+import os
+import pstats
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TOKEN = 'profiler-check-token'
+MAX_FILES = 6
+
+HOOKS_SCRIPT = """
+import app
+print(sum(getattr(f, '__self__', None) is app.request_profiler and app.request_profiler is not None
+          for funcs in list(app.app.before_request_funcs.values()) + list(app.app.teardown_request_funcs.values())
+          for f in funcs), app.request_profiler is None)
+"""
+
+
+def main():
+    profile_dir = tempfile.mkdtemp(prefix='finance-profiles-')
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'profiler.db')
+    failures = []
+
+    def check(condition, message):
+        print(f"{'ok    ' if condition else 'FALHOU'} {message}")
+        if not condition:
+            failures.append(message)
+
+    disabled = subprocess.run([sys.executable, '-c', HOOKS_SCRIPT], cwd=ROOT, capture_output=True, text=True, check=True,
+                              env=dict(os.environ, DATABASE_URL=database_url, PROFILER_ENABLED='false'))
+    check(disabled.stdout.split()[-2:] == ['0', 'True'], 'profiler desligado não registra hooks')
+
+    os.environ.update({
+        'DATABASE_URL': database_url, 'PROFILER_ENABLED': 'true', 'PROFILER_TOKEN': TOKEN,
+        'PROFILER_DIR': profile_dir, 'PROFILER_MAX_FILES': str(MAX_FILES), 'PROFILER_SAMPLE_RATE': '0',
+        'PROFILER_SAMPLE_INTERVAL_MS': '1', 'PERF_LOG_REQUESTS': 'false',
+    })
+    import app as app_module
+    with contextlib.redirect_stdout(io.StringIO()):
+        app_module.create_app()
+        client = app_module.app.test_client()
+        client.post('/register', data={'username': 'prof_user', 'email': 'prof@example.com', 'password': 'prof_password'})
+        client.post('/login', data={'identifier': 'prof_user', 'password': 'prof_password'})
+        client.get('/')
+    check(not os.listdir(profile_dir), 'requisições sem X-Profile não são perfiladas')
+
+    def profiled_get(path, **headers):
+        before = set(os.listdir(profile_dir))
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = client.get(path, headers=dict({'X-Profile': TOKEN}, **headers))
+            response.get_data()
+            response.close()
+        return response, sorted(set(os.listdir(profile_dir)) - before)
+
+    response, created = profiled_get('/')
+    check(response.status_code == 200 and len(created) == 1 and created[0].endswith('-index.pstats'),
+          f'X-Profile gera um .pstats ({created})')
+    if created:
+        stats = pstats.Stats(os.path.join(profile_dir, created[0]))
+        check(any(func[2] == 'index' for func in stats.stats), 'o .pstats contém a view index')
+
+    response, created = profiled_get('/', **{'X-Profile-Mode': 'sample'})
+    check(len(created) == 1 and created[0].endswith('.collapsed'), f'X-Profile-Mode: sample gera um .collapsed ({created})')
+    if created:
+        with open(os.path.join(profile_dir, created[0]), encoding='utf-8') as collapsed:
+            lines = collapsed.read().splitlines()
+        check(bool(lines) and all(line.rsplit(' ', 1)[1].isdigit() and ';' in line for line in lines),
+              f'.collapsed no formato "pilha contagem" ({len(lines)} pilhas)')
+
+    _, created = profiled_get('/', **{'X-Profile': 'token-errado'})
+    check(not created, 'token errado no X-Profile não perfila')
+
+    check(client.get('/admin/profiles').status_code == 401, '/admin/profiles sem token responde 401')
+    auth = {'Authorization': f'Bearer {TOKEN}'}
+    listing = client.get('/admin/profiles', headers=auth).get_json()['profiles']
+    check(len(listing) == 2, f'/admin/profiles lista os perfis ({len(listing)})')
+    download = client.get(f"/admin/profiles/{listing[0]['name']}", headers=auth)
+    check(download.status_code == 200 and len(download.data) == listing[0]['size'], 'download do perfil')
+    download.close()
+
+    response = client.post('/admin/profiles/sample?seconds=1', headers=auth)
+    name = response.get_json()['name']
+    time.sleep(1.5)
+    check(response.status_code == 202 and os.path.exists(os.path.join(profile_dir, name)),
+          'amostragem do processo grava o .collapsed')
+
+    for _ in range(MAX_FILES + 3):
+        profiled_get('/get_chart_data', **{'X-Profile-Mode': 'sample'})
+    check(len(os.listdir(profile_dir)) == MAX_FILES, f'rotação mantém {MAX_FILES} arquivos ({len(os.listdir(profile_dir))})')
+
+    print(f"\n{len(failures)} verificações falharam.")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
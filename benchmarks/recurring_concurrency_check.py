@@ -0,0 +1,132 @@
+"""
+Verificação do processamento de recorrências com vários processos ao mesmo tempo.
+
+Cria um usuário com --subscriptions assinaturas vencidas e uma conta recorrente mestra vencida
+e dispara --processes processos que chamam process_recurring_items_for_user para ele no mesmo
+instante (como o agendador e os workers com RECURRING_PROCESS_ON_ACCESS). Confere que:
+  - cada assinatura gerou exatamente uma transação e a conta foi debitada uma vez só;
+  - a série da mestra não tem filhas duplicadas (uma por ocorrência).
+Termina com código 1 se houver duplicatas ou débito em dobro.
+
+Uso:
+    python benchmarks/recurring_concurrency_check.py
+    python benchmarks/recurring_concurrency_check.py --processes 8 --database-url postgresql://localhost/recurring
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+INITIAL_BALANCE = 1000.0
+SUBSCRIPTION_AMOUNT = 10.0
+
+
+def seed(app_module, subscriptions):
+    db = app_module.db
+    today = datetime.date.today()
+    user = app_module.User(username='recurring_user', email='recurring@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    with contextlib.redirect_stdout(io.StringIO()):
+        app_module.create_default_data_for_user(user)
+    account = app_module.Account.query.filter_by(user_id=user.id).first()
+    account.balance = INITIAL_BALANCE
+    db.session.add_all([
+        app_module.Subscription(user_id=user.id, name=f'Assinatura {i}', amount=SUBSCRIPTION_AMOUNT, billing_cycle='monthly',
+                                due_date_of_month=min(today.day, 28), next_due_date=today - datetime.timedelta(days=1),
+                                status='active', account_id=account.id)
+        for i in range(subscriptions)
+    ])
+    db.session.add(app_module.Bill(
+        description='Aluguel (Mestra)', amount=100.0, dueDate=today - datetime.timedelta(days=60), status='pending',
+        user_id=user.id, is_master_recurring_bill=True, is_active_recurring=True, recurring_frequency='monthly',
+        recurring_total_occurrences=0, recurring_start_date=today - datetime.timedelta(days=60),
+        recurring_next_due_date=today - datetime.timedelta(days=1), type='expense', account_id=account.id
+    ))
+    db.session.commit()
+    return user.id, account.id
+
+
+def run_child(user_id, start_at):
+    """Processo filho: espera o instante combinado e processa as recorrências do usuário."""
+    import app as app_module
+    with contextlib.redirect_stdout(io.StringIO()):
+        app_module.create_app(start_scheduler=False)
+        with app_module.app.app_context():
+            time.sleep(max(0.0, start_at - time.time()))
+            try:
+                app_module.process_recurring_items_for_user(user_id)
+                result = 'ok'
+            except Exception as e:
+                result = f'{e.__class__.__name__}: {str(e).splitlines()[0]}'
+    print(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--processes', type=int, default=6)
+    parser.add_argument('--subscriptions', type=int, default=5)
+    parser.add_argument('--child', nargs=2, type=float, metavar=('USER_ID', 'START_AT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(int(args.child[0]), args.child[1])
+        return 0
+
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'recurring.db')
+    os.environ['PERF_LOG_REQUESTS'] = 'false'
+    import app as app_module
+    with contextlib.redirect_stdout(io.StringIO()):
+        app_module.create_app(start_scheduler=False)
+    with app_module.app.app_context():
+        user_id, account_id = seed(app_module, args.subscriptions)
+        app_module.db.engine.dispose()
+
+    # Todos os processos começam no mesmo instante, depois de importar o app
+    start_at = time.time() + 3
+    processes = [subprocess.Popen([sys.executable, __file__, '--child', str(user_id), str(start_at)],
+                                  cwd=ROOT, stdout=subprocess.PIPE, text=True) for _ in range(args.processes)]
+    results = [process.communicate()[0].strip() for process in processes]
+    errors = [result for result in results if result != 'ok']
+    print(f"{args.processes} processos: {len(results) - len(errors)} ok, {len(errors)} com erro (revertidos)")
+    for error in sorted(set(errors)):
+        print(f"    {error}")
+
+    db = app_module.db
+    with app_module.app.app_context():
+        transactions = app_module.Transaction.query.filter_by(user_id=user_id).count()
+        balance = db.session.get(app_module.Account, account_id).balance
+        children = db.session.query(app_module.Bill.recurring_child_number, db.func.count()).filter(
+            app_module.Bill.user_id == user_id, app_module.Bill.recurring_parent_id != None
+        ).group_by(app_module.Bill.recurring_child_number).all()
+
+    expected_balance = INITIAL_BALANCE - args.subscriptions * SUBSCRIPTION_AMOUNT
+    duplicated = [number for number, count in children if count > 1]
+    failures = []
+    if transactions != args.subscriptions:
+        failures.append(f'{transactions} transações de assinatura, esperado {args.subscriptions}')
+    if abs(balance - expected_balance) > 0.005:
+        failures.append(f'saldo {balance:.2f}, esperado {expected_balance:.2f}')
+    if not children or duplicated:
+        failures.append(f'{len(children)} ocorrências da série, duplicadas: {duplicated}')
+    print(f"transações de assinatura: {transactions}, saldo {balance:.2f}, "
+          f"filhas da mestra: {sum(count for _, count in children)} em {len(children)} ocorrências")
+
+    for failure in failures:
+        print(f"FALHOU {failure}")
+    if not failures:
+        print("\nok  cada vencimento foi processado por um único processo")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""
+Suíte de benchmarks do app com dados sintéticos (benchmarks/synthetic_data.py).
+
+Popula um banco descartável (ou usa --database-url já populado, com --skip-seed) e mede cada
+cenário em --rounds rodadas depois de --warmup rodadas de aquecimento, no estilo do
+pytest-benchmark (mín., máx., média, mediana, desvio padrão e operações por segundo):
+
+    dashboard_data            get_dashboard_data_db (sem o cache do dashboard)
+    detailed_report_data      get_detailed_report_data_db dos últimos --report-months meses
+    get_chart_data            GET /get_chart_data
+    budgets_page              GET /budgets
+    export_excel, export_pdf  GET /export_report/<formato> dos últimos --export-months meses
+    process_recurring         process_recurring_items_on_access com contas recorrentes e
+                              assinaturas vencidas (o estado é rearmado antes de cada rodada)
+
+Os resultados são gravados em JSON (--output, padrão benchmarks/results/<data>-<commit>.json,
+fora do git pelo .gitignore) com o commit, a versão do Python e os parâmetros. Com --compare <json anterior> imprime a
+variação da mediana de cada cenário e termina com código 1 se algum piorar mais que
+--fail-threshold (fração, padrão 0.2).
+
+Uso:
+    python benchmarks/run_benchmarks.py --transactions 100000
+    python benchmarks/run_benchmarks.py --only dashboard_data,get_chart_data --compare benchmarks/results/anterior.json
+    python benchmarks/run_benchmarks.py --database-url sqlite:////tmp/bench.db --skip-seed
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic_data import DEFAULT_PASSWORD, seed_database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+    return commit, dirty
+
+
+def build_scenarios(app_module, client, user_id, args):
+    """Retorna {nome: (setup, função medida)}; setup roda fora da medição antes de cada rodada."""
+    db = app_module.db
+    today = datetime.date.today()
+    report_start = (today - datetime.timedelta(days=30 * args.report_months)).isoformat()
+    export_start = (today - datetime.timedelta(days=30 * args.export_months)).isoformat()
+
+    def clear_caches():
+        app_module.dashboard_cache.clear()
+        db.session.remove()
+
+    def get(url):
+        def request():
+            response = client.get(url)
+            response.get_data()
+            response.close()
+            if response.status_code != 200:
+                raise RuntimeError(f'{url}: HTTP {response.status_code}')
+        return request
+
+    def rearm_recurring():
+        clear_caches()
+        app_module.User.query.filter_by(id=user_id).update({app_module.User.recurring_processed_through: None})
+        app_module.Bill.query.filter_by(user_id=user_id, is_master_recurring_bill=True, is_active_recurring=True).update(
+            {app_module.Bill.recurring_next_due_date: today})
+        app_module.Subscription.query.filter_by(user_id=user_id, status='active').update(
+            {app_module.Subscription.next_due_date: today})
+        db.session.commit()
+        db.session.remove()
+
+    return {
+        'dashboard_data': (clear_caches, lambda: app_module.get_dashboard_data_db(user_id)),
+        'detailed_report_data': (clear_caches, lambda: app_module.get_detailed_report_data_db(user_id, report_start, today.isoformat())),
+        'get_chart_data': (clear_caches, get('/get_chart_data')),
+        'budgets_page': (clear_caches, get('/budgets')),
+        'export_excel': (clear_caches, get(f'/export_report/excel?start_date={export_start}&end_date={today.isoformat()}')),
+        'export_pdf': (clear_caches, get(f'/export_report/pdf?start_date={export_start}&end_date={today.isoformat()}')),
+        'process_recurring': (rearm_recurring, lambda: app_module.process_recurring_items_on_access(db.session.get(app_module.User, user_id))),
+    }
+
+
+def measure(setup, fn, rounds, warmup):
+    timings = []
+    for i in range(warmup + rounds):
+        setup()
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        if i >= warmup:
+            timings.append(elapsed)
+    return {
+        'rounds': rounds,
+        'min': min(timings),
+        'max': max(timings),
+        'mean': statistics.mean(timings),
+        'median': statistics.median(timings),
+        'stddev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        'ops': 1 / statistics.mean(timings),
+        'timings': timings,
+    }
+
+
+def compare(results, baseline_path, fail_threshold):
+    with open(baseline_path, encoding='utf-8') as baseline_file:
+        baseline = json.load(baseline_file)
+    print(f"\nComparação com {os.path.basename(baseline_path)} (commit {baseline.get('commit')}):")
+    regressions = []
+    for name, stats in results['scenarios'].items():
+        previous = baseline['scenarios'].get(name)
+        if previous is None:
+            print(f"  {name:<22} sem referência")
+            continue
+        change = stats['median'] / previous['median'] - 1
+        flag = ''
+        if change > fail_threshold:
+            flag = '  <- regressão'
+            regressions.append(name)
+        print(f"  {name:<22} {previous['median'] * 1000:9.1f} ms -> {stats['median'] * 1000:9.1f} ms  {change:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--skip-seed', action='store_true', help='Usa o banco de --database-url já populado.')
+    parser.add_argument('--username', default='bench_user_0', help='Usuário medido (com --skip-seed).')
+    parser.add_argument('--password', default=DEFAULT_PASSWORD)
+    parser.add_argument('--transactions', type=int, default=10000)
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--report-months', type=int, default=12)
+    parser.add_argument('--export-months', type=int, default=3)
+    parser.add_argument('--only', default=None, help='Cenários separados por vírgula.')
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--compare', default=None, help='JSON de uma execução anterior.')
+    parser.add_argument('--fail-threshold', type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.skip_seed and not args.database_url:
+        parser.error('--skip-seed exige --database-url')
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmarks.db')
+    os.environ.setdefault('PERF_LOG_REQUESTS', 'false')
+    os.environ.setdefault('SLOW_QUERY_MS', '0')
+    os.environ.setdefault('RECURRING_SCHEDULER_INTERVAL', '0')
+    sys.path.insert(0, ROOT)
+    import app as app_module
+    with contextlib.redirect_stdout(io.StringIO()):
+        app_module.create_app()
+
+    username = args.username
+    if not args.skip_seed:
+        started = time.perf_counter()
+        [(_, username)] = seed_database(app_module, users=1, transactions=args.transactions, months=args.months,
+                                        seed=args.seed, password=args.password)
+        print(f"Dados sintéticos: {args.transactions} transações em {time.perf_counter() - started:.1f}s")
+
+    client = app_module.app.test_client()
+    with contextlib.redirect_stdout(io.StringIO()):
+        client.post('/login', data={'identifier': username, 'password': args.password})
+    with app_module.app.app_context():
+        user_id = app_module.User.query.filter_by(username=username).first().id
+        transaction_count = app_module.Transaction.query.filter_by(user_id=user_id).count()
+
+    commit, dirty = git_revision()
+    results = {
+        'commit': commit,
+        'dirty': dirty,
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': app_module.app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0],
+        'params': {'transactions': transaction_count, 'rounds': args.rounds, 'warmup': args.warmup,
+                   'report_months': args.report_months, 'export_months': args.export_months},
+        'scenarios': {},
+    }
+
+    print(f"{'cenário':<22} {'mín.':>9} {'mediana':>9} {'média':>9} {'desvio':>9} {'ops/s':>8}   ({transaction_count} transações, commit {commit}{'+' if dirty else ''})")
+    with app_module.app.app_context():
+        scenarios = build_scenarios(app_module, client, user_id, args)
+        selected = args.only.split(',') if args.only else list(scenarios)
+        for name in selected:
+            setup, fn = scenarios[name]
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = measure(setup, fn, args.rounds, args.warmup)
+            results['scenarios'][name] = stats
+            print(f"{name:<22} {stats['min'] * 1000:7.1f}ms {stats['median'] * 1000:7.1f}ms {stats['mean'] * 1000:7.1f}ms "
+                  f"{stats['stddev'] * 1000:7.1f}ms {stats['ops']:8.1f}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.datetime.now():%Y%m%dT%H%M%S}-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"\nResultados gravados em {output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.fail_threshold)
+        if regressions:
+            print(f"FALHOU mediana acima de {args.fail_threshold:.0%} em: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Benchmark de cold start: tempo e memória para importar app.py e rodar create_app().
+
+Cada medição roda em um interpretador novo (como um worker recém-criado pelo autoscaling):
+  - mede o tempo de boot (mediana de --runs execuções) e o pico de memória (ru_maxrss);
+  - gera um relatório no estilo de `python -X importtime` com os módulos que mais pesam
+    no boot, agregados pelo pacote de topo;
+  - confere que as dependências pesadas e opcionais (google.generativeai, openpyxl, fpdf)
+    não são importadas no boot, só nas rotas de IA e exportação.
+Termina com código 1 se o boot passar de --budget-ms ou se alguma dependência pesada for importada.
+
+Com --eager também mede o boot importando essas dependências antes (como era antes), para comparar.
+
+Uso:
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --budget-ms 1500 --runs 7 --eager --top 20
+"""
+import argparse
+import collections
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['google.generativeai', 'openpyxl', 'fpdf']
+
+BOOT_SCRIPT = """
+import json, resource, sys, time
+started = time.perf_counter()
+for module in {preload!r}:
+    __import__(module)
+import app
+app.create_app(start_scheduler=False)
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    'boot_seconds': elapsed,
+    'maxrss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'heavy_loaded': [m for m in {heavy!r} if m in sys.modules],
+    'module_count': len(sys.modules),
+}}))
+"""
+
+
+def run_boot(env, preload=(), importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', BOOT_SCRIPT.format(preload=list(preload), heavy=HEAVY_MODULES)]
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    measurement = json.loads(result.stdout.strip().splitlines()[-1])
+    return measurement, result.stderr
+
+
+def parse_importtime(stderr):
+    """Lê as linhas 'import time: self | cumulative | módulo' e soma o tempo próprio por pacote de topo."""
+    by_package = collections.Counter()
+    total_us = 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        by_package[package] += int(self_us)
+        total_us += int(self_us)
+    return by_package, total_us
+
+
+def measure(label, env, runs, preload=()):
+    measurements = [run_boot(env, preload)[0] for _ in range(runs)]
+    boot_ms = statistics.median(m['boot_seconds'] for m in measurements) * 1000
+    maxrss_mb = statistics.median(m['maxrss_kb'] for m in measurements) / 1024
+    print(f"{label:<10} boot {boot_ms:7.0f} ms (mediana de {runs})   pico de memória {maxrss_mb:6.1f} MB   "
+          f"{measurements[-1]['module_count']} módulos")
+    return boot_ms, measurements[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=1500.0, help='Tempo máximo de boot (mediana).')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='Pacotes listados no relatório de importação.')
+    parser.add_argument('--eager', action='store_true', help='Mede também o boot com as dependências pesadas importadas.')
+    args = parser.parse_args()
+
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(tempfile.mkdtemp(), 'startup.db'),
+               RECURRING_SCHEDULER_INTERVAL='0', PYTHONWARNINGS='ignore')
+    run_boot(env)  # cria as tabelas e aquece o cache de bytecode antes de medir
+
+    boot_ms, last = measure('atual', env, args.runs)
+    if args.eager:
+        eager_ms, _ = measure('eager', env, args.runs, preload=HEAVY_MODULES)
+        print(f"{'':<10} diferença {eager_ms - boot_ms:7.0f} ms")
+
+    _, stderr = run_boot(env, importtime=True)
+    by_package, total_us = parse_importtime(stderr)
+    print(f"\nImportações no boot (-X importtime, tempo próprio por pacote, total {total_us / 1000:.0f} ms):")
+    for package, self_us in by_package.most_common(args.top):
+        print(f"  {self_us / 1000:8.1f} ms  {self_us / total_us:6.1%}  {package}")
+
+    failures = []
+    if last['heavy_loaded']:
+        failures.append(f"dependências pesadas importadas no boot: {', '.join(last['heavy_loaded'])}")
+    if boot_ms > args.budget_ms:
+        failures.append(f"boot de {boot_ms:.0f} ms acima do orçamento de {args.budget_ms:.0f} ms")
+    for failure in failures:
+        print(f"FALHOU {failure}")
+    if not failures:
+        print(f"\nok  boot dentro do orçamento de {args.budget_ms:.0f} ms, sem {', '.join(HEAVY_MODULES)}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,249 @@
+"""
+Gerador de dados sintéticos para benchmarks.
+
+Cria usuários realistas em lote: as categorias e a conta padrão vêm de
+create_default_data_for_user, e por usuário são inseridos contas extras, --transactions
+transações espalhadas por --months meses (salário, freelance e despesas por categoria com
+valores típicos), contas a pagar avulsas e recorrentes (com as filhas geradas pelo próprio
+app), assinaturas, orçamentos dos últimos meses, metas, dívidas e investimentos.
+
+As transações entram com INSERT em lote (executemany do Core, --batch-size linhas por vez) e
+os rollups mensais e saldos das contas são recalculados no fim a partir do ledger, então
+100 mil transações levam poucos segundos no SQLite. O gerador é determinístico (--seed).
+
+Os usuários se chamam <prefixo>_<n> (e-mail <prefixo>_<n>@example.com) com a senha --password.
+
+Uso:
+    python benchmarks/synthetic_data.py --database-url sqlite:////tmp/bench.db --users 3 --transactions 100000
+    python benchmarks/synthetic_data.py --database-url postgresql://localhost/bench --transactions 1000000
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_PASSWORD = 'bench_password'
+
+# (categoria, peso no sorteio, faixa de valor) das despesas de um mês típico
+EXPENSE_PROFILE = [
+    ('Alimentação', 30, (12.0, 180.0)),
+    ('Transporte', 18, (5.0, 120.0)),
+    ('Lazer', 12, (20.0, 250.0)),
+    ('Moradia', 3, (800.0, 2500.0)),
+    ('Saúde', 6, (30.0, 400.0)),
+    ('Educação', 4, (50.0, 900.0)),
+    ('Contas Fixas', 10, (60.0, 350.0)),
+    ('Outras Despesas', 14, (5.0, 300.0)),
+    ('Assinaturas', 3, (15.0, 60.0)),
+]
+EXPENSE_DESCRIPTIONS = {
+    'Alimentação': ['Mercado', 'Padaria', 'Restaurante', 'Delivery', 'Feira'],
+    'Transporte': ['Combustível', 'Uber', 'Ônibus', 'Estacionamento'],
+    'Lazer': ['Cinema', 'Show', 'Bar', 'Viagem'],
+    'Moradia': ['Aluguel', 'Condomínio'],
+    'Saúde': ['Farmácia', 'Consulta', 'Exames'],
+    'Educação': ['Curso', 'Livros', 'Mensalidade'],
+    'Contas Fixas': ['Energia', 'Água', 'Internet', 'Telefone'],
+    'Outras Despesas': ['Presente', 'Roupas', 'Manutenção', 'Diversos'],
+    'Assinaturas': ['Streaming', 'Música', 'Nuvem'],
+}
+EXTRA_ACCOUNTS = [('Cartão de Crédito', 0.0), ('Poupança', 5000.0), ('Carteira', 200.0)]
+SUBSCRIPTIONS = [('Netflix', 55.9), ('Spotify', 21.9), ('Academia', 99.0), ('Nuvem', 10.0), ('Jornal', 29.9)]
+RECURRING_BILLS = [('Aluguel', 1800.0, 'monthly', 0), ('Seguro do carro', 2400.0, 'yearly', 0),
+                   ('Notebook', 450.0, 'installments', 10), ('Faxina', 150.0, 'weekly', 0)]
+GOALS = [('Reserva de emergência', 20000.0), ('Viagem', 8000.0), ('Carro novo', 60000.0)]
+DEBTS = [('Financiamento imobiliário', 'Financiamento', 350000.0, 0.009), ('Empréstimo pessoal', 'Empréstimo', 15000.0, 0.025)]
+INVESTMENTS = [('Tesouro Selic', 'Renda Fixa', 'Tesouro Direto'), ('Fundo de ações', 'Fundo', 'XP'), ('Bitcoin', 'Cripto', 'Binance')]
+
+
+def month_starts(today, months):
+    """Primeiro dia de cada um dos últimos `months` meses, do mais antigo para o atual."""
+    first = today.replace(day=1)
+    starts = []
+    for _ in range(months):
+        starts.append(first)
+        first = (first - datetime.timedelta(days=1)).replace(day=1)
+    return list(reversed(starts))
+
+
+def generate_transactions(rng, user_id, categories, account_ids, goal_ids, count, months, today):
+    """Gera `count` linhas de transação (dicts para INSERT em lote) ao longo de `months` meses."""
+    starts = month_starts(today, months)
+    salary_category, freelance_category = categories[('Salário', 'income')], categories[('Freelance', 'income')]
+    expense_names = [name for name, _, _ in EXPENSE_PROFILE]
+    expense_weights = [weight for _, weight, _ in EXPENSE_PROFILE]
+    expense_ranges = {name: value_range for name, _, value_range in EXPENSE_PROFILE}
+    main_account = account_ids[0]
+
+    span_days = max((today - starts[0]).days, 1)
+    salary_dates = [month_start.replace(day=5) for month_start in starts if month_start.replace(day=5) <= today]
+    income_count = min(max(int(count * 0.08), len(salary_dates)), count)
+    freelance_count = income_count - min(len(salary_dates), income_count)
+
+    # Despesas primeiro; as receitas (~8% das transações: um salário por mês e freelances) são
+    # dimensionadas para somar ~20% a mais que as despesas. A conta principal recebe o salário (70%
+    # das receitas) e 70% das despesas; as demais dividem o resto, então todos os saldos ficam positivos
+    expense_count = count - income_count
+    other_accounts = account_ids[1:] or account_ids
+    expense_accounts = rng.choices([main_account] + other_accounts, weights=[0.7] + [0.3 / len(other_accounts)] * len(other_accounts),
+                                   k=expense_count)
+    rows = []
+    for name, account_id in zip(rng.choices(expense_names, weights=expense_weights, k=expense_count), expense_accounts):
+        low, high = expense_ranges[name]
+        rows.append({'description': rng.choice(EXPENSE_DESCRIPTIONS[name]), 'amount': round(rng.uniform(low, high), 2),
+                     'date': starts[0] + datetime.timedelta(days=rng.randrange(span_days + 1)), 'type': 'expense',
+                     'user_id': user_id, 'category_id': categories[(name, 'expense')],
+                     'account_id': account_id,
+                     'goal_id': rng.choice(goal_ids) if goal_ids and rng.random() < 0.01 else None})
+    income_target = sum(row['amount'] for row in rows) * 1.2
+
+    salary = round(income_target * 0.7 / max(len(salary_dates), 1), 2)
+    for salary_date in salary_dates[:income_count]:
+        rows.append({'description': 'Salário', 'amount': salary, 'date': salary_date, 'type': 'income',
+                     'user_id': user_id, 'category_id': salary_category, 'account_id': main_account, 'goal_id': None})
+    freelance_mean = income_target * 0.3 / max(freelance_count, 1)
+    for _ in range(freelance_count):
+        rows.append({'description': 'Freelance', 'amount': round(freelance_mean * rng.uniform(0.5, 1.5), 2),
+                     'date': starts[0] + datetime.timedelta(days=rng.randrange(span_days + 1)), 'type': 'income',
+                     'user_id': user_id, 'category_id': freelance_category,
+                     'account_id': rng.choice(other_accounts), 'goal_id': None})
+    return rows
+
+
+def seed_user(app_module, rng, username, password_hash, transactions, months, batch_size, today):
+    """Cria um usuário completo e retorna o id."""
+    db = app_module.db
+    user = app_module.User(username=username, email=f'{username}@example.com', password_hash=password_hash,
+                           recurring_processed_through=today)
+    db.session.add(user)
+    db.session.commit()
+    with contextlib.redirect_stdout(io.StringIO()):
+        app_module.create_default_data_for_user(user)
+    user_id = user.id
+
+    db.session.execute(db.insert(app_module.Account), [
+        {'name': name, 'balance': balance, 'user_id': user_id} for name, balance in EXTRA_ACCOUNTS
+    ])
+    db.session.execute(db.insert(app_module.Goal), [
+        {'user_id': user_id, 'name': name, 'target_amount': target, 'current_amount': 0.0,
+         'due_date': today + datetime.timedelta(days=365 * (i + 1)), 'status': 'in_progress'}
+        for i, (name, target) in enumerate(GOALS)
+    ])
+    categories = {(c.name, c.type): c.id for c in app_module.Category.query.filter_by(user_id=user_id)}
+    account_ids = [a.id for a in app_module.Account.query.filter_by(user_id=user_id).order_by(app_module.Account.id)]
+    goal_ids = [g.id for g in app_module.Goal.query.filter_by(user_id=user_id)]
+
+    transaction_table = app_module.Transaction.__table__
+    rows = generate_transactions(rng, user_id, categories, account_ids, goal_ids, transactions, months, today)
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(transaction_table.insert(), rows[start:start + batch_size])
+    del rows
+
+    # Saldos das contas e valores das metas coerentes com o ledger
+    signed_amount = db.case((app_module.Transaction.type == 'income', app_module.Transaction.amount),
+                            else_=-app_module.Transaction.amount)
+    for account_id, balance in db.session.query(app_module.Transaction.account_id, db.func.sum(signed_amount)).filter(
+            app_module.Transaction.user_id == user_id).group_by(app_module.Transaction.account_id):
+        app_module.Account.query.filter_by(id=account_id).update({app_module.Account.balance: round(balance, 2)})
+    for goal_id, total in db.session.query(app_module.Transaction.goal_id, db.func.sum(app_module.Transaction.amount)).filter(
+            app_module.Transaction.user_id == user_id, app_module.Transaction.goal_id != None).group_by(app_module.Transaction.goal_id):
+        app_module.Goal.query.filter_by(id=goal_id).update({app_module.Goal.current_amount: round(total, 2)})
+
+    subscriptions_category = categories[('Assinaturas', 'expense')]
+    db.session.execute(db.insert(app_module.Subscription), [
+        {'user_id': user_id, 'name': name, 'amount': amount, 'billing_cycle': 'monthly', 'due_date_of_month': 10 + i,
+         'next_due_date': (today.replace(day=1) + datetime.timedelta(days=40)).replace(day=10 + i), 'status': 'active',
+         'category_id': subscriptions_category, 'account_id': account_ids[0]}
+        for i, (name, amount) in enumerate(SUBSCRIPTIONS)
+    ])
+    db.session.execute(db.insert(app_module.Budget), [
+        {'user_id': user_id, 'category_id': categories[(name, 'expense')], 'month_year': month_start.strftime('%Y-%m'),
+         'budget_amount': round(high * 8, 2), 'current_spent': 0.0}
+        for month_start in month_starts(today, min(months, 6)) for name, _, (_, high) in EXPENSE_PROFILE
+    ])
+    db.session.execute(db.insert(app_module.Debt), [
+        {'user_id': user_id, 'name': name, 'type': debt_type, 'total_amount': total,
+         'outstanding_balance': round(total * rng.uniform(0.3, 0.9), 2), 'interest_rate': rate,
+         'start_date': today - datetime.timedelta(days=365 * 3), 'end_date': today + datetime.timedelta(days=365 * 10)}
+        for name, debt_type, total, rate in DEBTS
+    ])
+    db.session.execute(db.insert(app_module.Investment), [
+        {'user_id': user_id, 'name': name, 'type': investment_type, 'current_value': round(rng.uniform(1000, 50000), 2),
+         'purchase_date': today - datetime.timedelta(days=rng.randrange(30, 1000)), 'institution': institution}
+        for name, investment_type, institution in INVESTMENTS
+    ])
+    db.session.execute(db.insert(app_module.Bill), [
+        {'description': f'Conta avulsa {i}', 'amount': round(rng.uniform(50, 800), 2),
+         'dueDate': today + datetime.timedelta(days=rng.randrange(-90, 60)),
+         'status': rng.choice(['pending', 'paid', 'overdue']), 'user_id': user_id, 'is_master_recurring_bill': False,
+         'is_active_recurring': False, 'type': 'expense', 'category_id': categories[('Contas Fixas', 'expense')],
+         'account_id': account_ids[0]}
+        for i in range(20)
+    ])
+    db.session.commit()
+
+    app_module.rebuild_monthly_rollups_db(user_id)
+
+    # Recorrentes pelo caminho do app, que gera as filhas da série
+    with contextlib.redirect_stdout(io.StringIO()):
+        for description, amount, frequency, occurrences in RECURRING_BILLS:
+            app_module.add_bill_db(f'{description} (Mestra)', amount, today - datetime.timedelta(days=rng.randrange(0, 60)),
+                                   user_id, is_recurring=True, recurring_frequency=frequency,
+                                   recurring_total_occurrences=occurrences,
+                                   category_id=categories[('Contas Fixas', 'expense')], account_id=account_ids[0])
+    return user_id
+
+
+def seed_database(app_module, users=1, transactions=10000, months=24, seed=42, prefix='bench_user',
+                  password=DEFAULT_PASSWORD, batch_size=50000):
+    """Cria `users` usuários com `transactions` transações cada. Retorna a lista de (id, username)."""
+    from werkzeug.security import generate_password_hash
+
+    rng = random.Random(seed)
+    password_hash = generate_password_hash(password)  # Uma vez só: o hash é propositalmente lento
+    today = datetime.date.today()
+    created = []
+    with app_module.app.app_context():
+        for n in range(users):
+            username = f'{prefix}_{n}'
+            created.append((seed_user(app_module, rng, username, password_hash, transactions, months, batch_size, today), username))
+        app_module.db.session.remove()
+    return created
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=None, help='Padrão: SQLite novo em um diretório temporário.')
+    parser.add_argument('--users', type=int, default=1)
+    parser.add_argument('--transactions', type=int, default=10000, help='Transações por usuário.')
+    parser.add_argument('--months', type=int, default=24, help='Meses de histórico.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--prefix', default='bench_user')
+    parser.add_argument('--password', default=DEFAULT_PASSWORD)
+    parser.add_argument('--batch-size', type=int, default=50000)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'synthetic.db')
+    import app as app_module
+    with contextlib.redirect_stdout(io.StringIO()):
+        app_module.create_app()
+
+    started = time.perf_counter()
+    created = seed_database(app_module, args.users, args.transactions, args.months, args.seed, args.prefix,
+                            args.password, args.batch_size)
+    elapsed = time.perf_counter() - started
+    total = args.users * args.transactions
+    print(f"{len(created)} usuários, {total} transações em {elapsed:.1f}s ({total / elapsed:,.0f} transações/s)")
+    print(f"DATABASE_URL={os.environ['DATABASE_URL']}")
+    print(f"usuários: {', '.join(username for _, username in created)} (senha: {args.password})")
+
+
+if __name__ == '__main__':
+    main()
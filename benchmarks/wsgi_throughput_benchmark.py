@@ -0,0 +1,172 @@
+"""
+Benchmark de vazão do dashboard (GET /): servidor de desenvolvimento x gunicorn multi-worker.
+
+Cria um banco SQLite descartável (ou usa --database-url) com um usuário e --transactions
+transações, sobe cada servidor em um subprocesso e dispara --concurrency clientes com
+conexões keep-alive contra / por --duration segundos, medindo requisições por segundo e
+latência (p50/p95).
+
+Servidores:
+    dev       python app.py (servidor de desenvolvimento do Flask, threaded)
+    gunicorn  gunicorn -c gunicorn.conf.py wsgi:app com --workers/--threads (WEB_CONCURRENCY/GUNICORN_THREADS)
+
+Uso:
+    python benchmarks/wsgi_throughput_benchmark.py
+    python benchmarks/wsgi_throughput_benchmark.py --workers 4 --threads 4 --concurrency 32 --duration 20
+"""
+import argparse
+import datetime
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+USERNAME, PASSWORD = 'wsgi_user', 'wsgi_password'
+
+
+def seed(database_url, transaction_count):
+    os.environ['DATABASE_URL'] = database_url
+    import app as app_module
+    app_module.create_app()
+
+    client = app_module.app.test_client()
+    client.post('/register', data={'username': USERNAME, 'email': 'wsgi@example.com', 'password': PASSWORD})
+    with app_module.app.app_context():
+        user = app_module.User.query.filter_by(username=USERNAME).first()
+        category = app_module.Category.query.filter_by(user_id=user.id, type='expense').first()
+        account = app_module.Account.query.filter_by(user_id=user.id).first()
+        today = datetime.date.today()
+        for i in range(transaction_count):
+            transaction_date = today - datetime.timedelta(days=i % 365)
+            app_module.db.session.add(app_module.Transaction(
+                description=f'wsgi {i}', amount=10.0 + i % 50, date=transaction_date, type='expense',
+                user_id=user.id, category_id=category.id, account_id=account.id))
+            app_module.update_monthly_rollup_db(user.id, transaction_date, category.id, 'expense', 10.0 + i % 50)
+        user.recurring_processed_through = today
+        app_module.db.session.commit()
+        app_module.db.engine.dispose()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'servidor terminou com código {process.returncode}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit('servidor não respondeu a tempo')
+
+
+def login(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    body = urllib.parse.urlencode({'identifier': USERNAME, 'password': PASSWORD})
+    conn.request('POST', '/login', body, {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = conn.getresponse()
+    response.read()
+    cookies = [header.split(';', 1)[0] for name, header in response.getheaders() if name.lower() == 'set-cookie']
+    conn.close()
+    if not cookies:
+        raise SystemExit('login falhou: nenhum cookie de sessão')
+    return '; '.join(cookies)
+
+
+def run_load(port, cookie, concurrency, duration):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                conn.request('GET', '/', headers={'Cookie': cookie})
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    raise RuntimeError(response.status)
+                local.append(time.perf_counter() - started)
+                if response.will_close:
+                    conn.close()
+                    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0], time.perf_counter() - started
+
+
+def benchmark(name, command, env, args):
+    port = free_port()
+    env = dict(env, PORT=str(port))
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(port, process)
+        cookie = login(port)
+        run_load(port, cookie, args.concurrency, min(args.duration, 2))  # aquecimento
+        latencies, errors, elapsed = run_load(port, cookie, args.concurrency, args.duration)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    latencies.sort()
+    p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)] if latencies else 0
+    print(f"{name:<28} {len(latencies) / elapsed:8.1f} req/s   p50 {statistics.median(latencies) * 1000 if latencies else 0:7.1f} ms"
+          f"   p95 {p95 * 1000:7.1f} ms   {errors} erros")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--transactions', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16, help='Clientes simultâneos.')
+    parser.add_argument('--duration', type=float, default=10.0, help='Segundos de carga por servidor.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='Workers do gunicorn.')
+    parser.add_argument('--threads', type=int, default=4, help='Threads por worker do gunicorn.')
+    parser.add_argument('--skip-dev', action='store_true', help='Mede só o gunicorn.')
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'wsgi_throughput.db')
+    seed(database_url, args.transactions)
+
+    env = dict(os.environ, DATABASE_URL=database_url, RECURRING_SCHEDULER_INTERVAL='0', GUNICORN_ACCESS_LOG='')
+    print(f"GET / com {args.concurrency} clientes por {args.duration:.0f}s ({args.transactions} transações)")
+    if not args.skip_dev:
+        benchmark('dev (python app.py)', [sys.executable, 'app.py'], env, args)
+    benchmark(f'gunicorn {args.workers}w x {args.threads}t',
+              [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+              dict(env, WEB_CONCURRENCY=str(args.workers), GUNICORN_THREADS=str(args.threads)), args)
+
+
+if __name__ == '__main__':
+    main()
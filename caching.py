@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalLRUCache:
+    """
+    Cache em memória do processo com expulsão LRU e expiração por TTL.
+
+    Seguro para uso entre threads do mesmo worker. Cada processo tem a sua cópia;
+    para compartilhar entre workers use RedisCache.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=300, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl_seconds=None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache:
+    """
+    Backend compartilhado entre processos. Os valores são serializados em JSON,
+    então só aceita dados simples (dict, list, str, números, None).
+
+    `client` é qualquer objeto com a interface get/set(ex=)/delete/scan_iter do
+    redis-py; em testes pode ser substituído por um stand-in local.
+    """
+
+    def __init__(self, client, prefix='finance:', ttl_seconds=300):
+        self.client = client
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl_seconds=None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(int(ttl), 1))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+
+def create_cache_backend(redis_url=None, prefix='finance:', max_entries=1024, ttl_seconds=300):
+    """Retorna um RedisCache quando há URL configurada; caso contrário, um LocalLRUCache."""
+    if redis_url:
+        import redis  # Dependência opcional, só necessária com backend compartilhado
+        return RedisCache(redis.Redis.from_url(redis_url), prefix=prefix, ttl_seconds=ttl_seconds)
+    return LocalLRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
@@ -0,0 +1,78 @@
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell # Células com estilo na planilha write-only
+from openpyxl.styles import Font, PatternFill
+from openpyxl.styles.numbers import FORMAT_CURRENCY_USD_SIMPLE # Para formato de moeda no Excel
+from openpyxl.utils import get_column_letter
+
+
+SHEET_TITLE = "Relatorio Financeiro"
+HEADER_FILL_COLOR = "D3D3D3"
+
+
+def summary_rows(expenses_by_category_chart, balance_evolution_chart):
+    """
+    Linhas do resumo gravadas depois das transações (despesas por categoria e evolução do saldo),
+    com os valores monetários como números. Usadas também no cálculo das larguras das colunas.
+    """
+    rows = []
+    if expenses_by_category_chart['labels']:
+        rows.append([])
+        rows.append(["Despesas por Categoria"])
+        rows.extend([label, value] for label, value in zip(expenses_by_category_chart['labels'], expenses_by_category_chart['values']))
+
+    if balance_evolution_chart['labels']:
+        rows.append([])
+        rows.append(["Evolução do Saldo em Contas"])
+        rows.append(["Data", "Saldo"])
+        rows.extend([label, value] for label, value in zip(balance_evolution_chart['labels'], balance_evolution_chart['values'])
+                    if value > 0.01 or value < 0.00)
+    return rows
+
+
+def render_transactions_workbook(output, headers, column_widths, transactions, expenses_by_category_chart, balance_evolution_chart):
+    """
+    Gera a planilha de transações e grava o .xlsx em `output` (arquivo binário).
+
+    A planilha é write-only: as linhas vão direto para o arquivo à medida que saem do iterável,
+    então a memória não cresce com o número de transações. Por isso as larguras das colunas
+    precisam ser conhecidas antes da primeira linha.
+
+    Argumentos:
+        output: Arquivo aberto em modo binário (ex.: tempfile.SpooledTemporaryFile).
+        headers (list): Títulos das colunas.
+        column_widths (list): Largura de cada coluna, na ordem de `headers` (incluindo as linhas
+            de summary_rows, que ocupam as duas primeiras colunas).
+        transactions (iterable): Linhas com description, amount, date, type, category_name,
+            account_name e goal_name já resolvidos. Consumido uma vez.
+        expenses_by_category_chart (dict): {'labels': [...], 'values': [...]}.
+        balance_evolution_chart (dict): {'labels': [...], 'values': [...]}.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(SHEET_TITLE)
+
+    for col_idx, width in enumerate(column_widths, start=1):
+        sheet.column_dimensions[get_column_letter(col_idx)].width = width
+
+    header_font = Font(bold=True)
+    header_fill = PatternFill(start_color=HEADER_FILL_COLOR, end_color=HEADER_FILL_COLOR, fill_type="solid")
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(sheet, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        header_cells.append(cell)
+    sheet.append(header_cells)
+
+    def currency_cell(value):
+        cell = WriteOnlyCell(sheet, value=value)
+        cell.number_format = FORMAT_CURRENCY_USD_SIMPLE
+        return cell
+
+    for t in transactions:
+        sheet.append([t.description, currency_cell(t.amount), t.date.isoformat(), "Receita" if t.type == "income" else "Despesa",
+                      t.category_name, t.account_name, t.goal_name])
+
+    for row in summary_rows(expenses_by_category_chart, balance_evolution_chart):
+        sheet.append([value if isinstance(value, str) else currency_cell(value) for value in row])
+
+    workbook.save(output)
@@ -0,0 +1,60 @@
+"""
+Configuração do gunicorn (Procfile: web). Workers, threads e timeouts vêm do ambiente.
+
+Com preload_app o módulo é importado uma vez no processo mestre e compartilhado por
+copy-on-write; cada worker descarta o pool de conexões herdado logo após o fork.
+
+As métricas do Prometheus de todos os workers são gravadas em PROMETHEUS_MULTIPROC_DIR
+(padrão: um diretório no tmp) e /metrics agrega os arquivos. O Procfile passa o mesmo diretório
+para o processo `scheduler`, então os contadores das recorrências também aparecem em /metrics.
+Na subida só são apagados os arquivos de processos que não estão mais rodando: os do agendador
+continuam valendo.
+"""
+import glob
+import multiprocessing
+import os
+import tempfile
+
+# Precisa estar no ambiente antes de o app (e o prometheus_client) ser importado
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'finance-prometheus'))
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Existe, mas é de outro usuário
+    return True
+
+
+# Arquivos são <tipo>_<pid>.db
+for stale_file in glob.glob(os.path.join(os.environ['PROMETHEUS_MULTIPROC_DIR'], '*.db')):
+    pid = os.path.basename(stale_file)[:-len('.db')].rsplit('_', 1)[-1]
+    if not pid.isdigit() or not _process_alive(int(pid)):
+        os.remove(stale_file)
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() in ['true', 'on', '1']
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+# Recicla workers de tempos em tempos para conter crescimento de memória
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-') or None
+
+
+def post_fork(server, worker):
+    from app import reset_connections_after_fork
+    reset_connections_after_fork()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
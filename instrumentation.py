@@ -0,0 +1,156 @@
+import json
+import time
+
+import sqlalchemy
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# A troca de context.cursor em after_cursor_execute depende de um detalhe interno do SQLAlchemy:
+# em Connection._exec_single_context o resultado (inclusive a BufferedRowCursorFetchStrategy dos
+# cursores do lado do servidor / stream_results / yield_per) é montado a partir de context.cursor
+# depois do evento. Conferido no 2.0 (requirements.txt fixa 2.0.41); em outras versões o proxy não
+# é instalado e as linhas de SELECT vêm só do cursor.rowcount, quando o driver o informa.
+# benchmarks/check_request_instrumentation.py falha se as linhas lidas deixarem de ser contadas.
+CURSOR_PROXY_SUPPORTED = sqlalchemy.__version__.startswith('2.0.')
+
+
+class _RowCountingCursor:
+    """Repassa tudo ao cursor DBAPI e soma em stats['rows'] as linhas efetivamente buscadas (fetch*)."""
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats['rows'] += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._stats['rows'] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats['rows'] += len(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class RequestInstrumentation:
+    """
+    Instrumentação por requisição: tempo total, número de comandos SQL, tempo gasto no banco e
+    linhas lidas/afetadas, a partir dos eventos before/after_cursor_execute do SQLAlchemy.
+
+    Os números saem no cabeçalho Server-Timing (visível nas DevTools do navegador) e em uma linha
+    de log JSON por requisição. Comandos acima de `slow_query_ms` geram uma linha de log própria
+    com o SQL e o endpoint, inclusive fora de requisições (agendador, jobs de IA).
+
+    Linhas: em comandos que devolvem linhas, o cursor do resultado é trocado por um proxy que conta
+    as linhas buscadas (entidades do ORM, colunas, agregados e yield_per em streaming, em qualquer
+    driver; ver CURSOR_PROXY_SUPPORTED); em DML soma o cursor.rowcount (linhas afetadas).
+
+    Em respostas em streaming (exportações CSV/NDJSON) o Server-Timing só cobre o trabalho feito
+    até o envio dos cabeçalhos; a linha de log é gravada no teardown e cobre o stream inteiro.
+    """
+
+    def __init__(self, app=None, slow_query_ms=200, log_requests=True, max_statement_length=1000, log=print):
+        self.slow_query_ms = slow_query_ms
+        self.log_requests = log_requests
+        self.max_statement_length = max_statement_length
+        self.log = log
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._start_request)
+        app.after_request(self._add_server_timing)
+        app.teardown_request(self._log_request)
+        # Eventos na classe Engine valem para qualquer engine criado depois, sem precisar de app context
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(Engine, 'handle_error', self._on_error)
+
+    @staticmethod
+    def current_stats():
+        """Contadores da requisição atual, ou None fora de uma requisição instrumentada."""
+        if not has_request_context():
+            return None
+        return g.get('_perf_stats')
+
+    def _start_request(self):
+        g._perf_stats = {
+            'started': time.perf_counter(),
+            'queries': 0,
+            'db_seconds': 0.0,
+            'rows': 0,
+            'status': None,
+        }
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_perf_query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['_perf_query_started'].pop()
+        stats = self.current_stats()
+        if stats is not None:
+            stats['queries'] += 1
+            stats['db_seconds'] += elapsed
+            if cursor.description is not None and CURSOR_PROXY_SUPPORTED:
+                # O resultado é montado depois deste evento a partir de context.cursor, então as linhas
+                # passam pelo proxy mesmo quando são buscadas mais tarde (yield_per, streaming)
+                if context is not None and not executemany:
+                    context.cursor = _RowCountingCursor(cursor, stats)
+            elif cursor.rowcount is not None and cursor.rowcount > 0:
+                stats['rows'] += cursor.rowcount
+
+        if self.slow_query_ms and elapsed * 1000 >= self.slow_query_ms:
+            self.log(json.dumps({
+                'event': 'slow_query',
+                'duration_ms': round(elapsed * 1000, 2),
+                'endpoint': request.endpoint if has_request_context() else None,
+                'path': request.path if has_request_context() else None,
+                'executemany': executemany,
+                'statement': ' '.join(statement.split())[:self.max_statement_length],
+            }, ensure_ascii=False))
+
+    @staticmethod
+    def _on_error(exception_context):
+        # Comando que falhou não passa por after_cursor_execute: descarta o horário de início dele
+        connection = exception_context.connection
+        if connection is not None and connection.info.get('_perf_query_started'):
+            connection.info['_perf_query_started'].pop()
+
+    def _add_server_timing(self, response):
+        stats = self.current_stats()
+        if stats is None:
+            return response
+        stats['status'] = response.status_code
+        total_ms = (time.perf_counter() - stats['started']) * 1000
+        response.headers.add(
+            'Server-Timing',
+            f'app;dur={total_ms:.1f}, db;dur={stats["db_seconds"] * 1000:.1f};'
+            f'desc="{stats["queries"]} consultas, {stats["rows"]} linhas"'
+        )
+        return response
+
+    def _log_request(self, error=None):
+        stats = self.current_stats()
+        if stats is None or not self.log_requests:
+            return
+        self.log(json.dumps({
+            'event': 'request',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': 500 if error is not None else stats['status'],
+            'duration_ms': round((time.perf_counter() - stats['started']) * 1000, 2),
+            'db_ms': round(stats['db_seconds'] * 1000, 2),
+            'queries': stats['queries'],
+            'rows': stats['rows'],
+        }, ensure_ascii=False))
@@ -0,0 +1,207 @@
+import atexit
+import heapq
+import itertools
+import queue
+import random
+import smtplib
+import ssl
+import threading
+import time
+
+
+class MailQueue:
+    """
+    Fila de e-mails de saída com workers em segundo plano.
+
+    Cada worker mantém a própria sessão SMTP (conexão, STARTTLS e login uma vez só) e a
+    reaproveita entre mensagens; a sessão é fechada depois de `idle_timeout` segundos sem
+    envio e reaberta sob demanda. Falhas são reenviadas com backoff exponencial (com jitter)
+    até `max_retries` tentativas. Quem chama só enfileira: enqueue() não toca a rede.
+
+    Os workers sobem no primeiro enqueue() e, na saída do processo, a fila é drenada por até
+    `drain_timeout` segundos. Mensagens ainda pendentes depois disso são perdidas.
+    """
+
+    def __init__(self, host, port, username=None, password=None, use_tls=True, workers=1, max_size=1000,
+                 max_retries=5, backoff_seconds=2.0, max_backoff_seconds=300.0, idle_timeout=60.0,
+                 connect_timeout=10.0, drain_timeout=10.0, smtp_factory=smtplib.SMTP, clock=time.monotonic,
+                 listener=None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.drain_timeout = drain_timeout
+        self._smtp_factory = smtp_factory
+        self._clock = clock
+        self._listener = listener  # Chamado com (chave, quantidade) a cada incremento de stats (ex.: métricas)
+        self._queue = queue.Queue(maxsize=max_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.stats = {'enqueued': 0, 'sent': 0, 'retried': 0, 'failed': 0, 'dropped': 0, 'connections': 0}
+
+    def enqueue(self, sender, recipients, message):
+        """Enfileira a mensagem (email.message.Message). Retorna False se a fila estiver cheia ou parada."""
+        if self._stopping.is_set():
+            return False
+        self.start()
+        try:
+            self._queue.put_nowait((sender, list(recipients), message.as_string(), 0))
+        except queue.Full:
+            self._count('dropped')
+            print(f"ERROR: MailQueue - Fila de e-mails cheia, mensagem para {recipients} descartada.")
+            return False
+        self._count('enqueued')
+        return True
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f'mail-queue-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            atexit.register(self.stop)
+
+    def stop(self, timeout=None):
+        """Para de aceitar mensagens e espera os workers drenarem a fila (até `timeout`, padrão drain_timeout)."""
+        self._stopping.set()
+        deadline = self._clock() + (self.drain_timeout if timeout is None else timeout)
+        for thread in self._threads:
+            thread.join(max(deadline - self._clock(), 0))
+
+    def join(self, timeout=None):
+        """Espera até a fila ficar vazia e sem envios em andamento (útil em scripts e benchmarks)."""
+        deadline = None if timeout is None else self._clock() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - self._clock()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+        if self._listener is not None:
+            self._listener(key, amount)
+
+    def _backoff(self, attempt):
+        delay = min(self.backoff_seconds * (2 ** attempt), self.max_backoff_seconds)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _worker(self):
+        session = None
+        last_used = self._clock()
+        retries = []  # heap de (horário da nova tentativa, seq, item)
+        sequence = itertools.count()
+
+        while True:
+            now = self._clock()
+            if self._stopping.is_set() and self._queue.empty() and not retries:
+                break
+
+            if retries and (retries[0][0] <= now or self._stopping.is_set()):
+                item = heapq.heappop(retries)[2]
+            else:
+                wait = self.idle_timeout if not retries else retries[0][0] - now
+                if self._stopping.is_set():
+                    wait = min(wait, 0.1)
+                try:
+                    item = self._queue.get(timeout=max(wait, 0.01))
+                except queue.Empty:
+                    if session is not None and self._clock() - last_used >= self.idle_timeout:
+                        self._close(session)
+                        session = None
+                    continue
+
+            sender, recipients, raw_message, attempt = item
+            try:
+                session, error = self._send(session, sender, recipients, raw_message)
+                if error is None:
+                    last_used = self._clock()
+                    self._count('sent')
+                elif self._is_permanent(error) or attempt + 1 >= self.max_retries or self._stopping.is_set():
+                    self._count('failed')
+                    print(f"ERROR: MailQueue - Desistindo do e-mail para {recipients} após {attempt + 1} tentativas: {error}")
+                else:
+                    self._count('retried')
+                    # Conta como pendente até a nova tentativa terminar (join() espera por ela)
+                    with self._queue.mutex:
+                        self._queue.unfinished_tasks += 1
+                    retry_at = self._clock() + self._backoff(attempt)
+                    heapq.heappush(retries, (retry_at, next(sequence), (sender, recipients, raw_message, attempt + 1)))
+            finally:
+                self._queue.task_done()
+
+        self._close(session)
+
+    def _send(self, session, sender, recipients, raw_message):
+        """
+        Envia pela sessão aberta (ou por uma nova) e retorna (sessão, erro ou None). Se o servidor
+        derrubou a sessão reaproveitada, reconecta uma vez antes de contar como falha. Recusas do
+        servidor (4xx/5xx) mantêm a sessão aberta; erros de conexão a descartam.
+        """
+        try:
+            if session is not None:
+                try:
+                    session.sendmail(sender, recipients, raw_message)
+                    return session, None
+                except smtplib.SMTPServerDisconnected:
+                    self._close(session)
+                    session = None
+            session = self._connect()
+            session.sendmail(sender, recipients, raw_message)
+            return session, None
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused) as e:
+            if session is not None:
+                try:
+                    session.rset()
+                    return session, e
+                except Exception:
+                    self._close(session)
+            return None, e
+        except Exception as e:
+            self._close(session)
+            return None, e
+
+    @staticmethod
+    def _is_permanent(error):
+        """Recusas 5xx (e destinatários recusados) não melhoram com novas tentativas."""
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return True
+        return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+    def _connect(self):
+        session = self._smtp_factory(self.host, self.port, timeout=self.connect_timeout)
+        try:
+            if self.use_tls:
+                session.starttls(context=ssl.create_default_context())
+            if self.username and self.password:
+                session.login(self.username, self.password)
+        except Exception:
+            self._close(session)
+            raise
+        self._count('connections')
+        return session
+
+    @staticmethod
+    def _close(session):
+        if session is None:
+            return
+        try:
+            session.quit()
+        except Exception:
+            try:
+                session.close()
+            except Exception:
+                pass
@@ -1,12 +1,16 @@
-import datetime
 from dateutil.relativedelta import relativedelta
 import calendar # Importar calendar aqui também, pois é usado na lógica de datas
 
 
-def process_subscriptions_and_generate_transactions(user_id, db_instance, TransactionModel, SubscriptionModel, AccountModel, CategoryModel, current_date):
+def process_subscriptions_and_generate_transactions(user_id, db_instance, TransactionModel, SubscriptionModel, AccountModel, CategoryModel, current_date,
+                                                    rollup_recorder=None):
     """
     Processa as assinaturas ativas de um usuário, gerando transações para aquelas
     cuja próxima data de vencimento já passou ou é o dia atual.
+
+    Cada assinatura é reivindicada antes de gerar a transação com um UPDATE condicional
+    (next_due_date = nova data WHERE next_due_date = data lida): se outro processo (agendador ou
+    outro worker) já a processou, nada casa e ela é pulada, sem debitar a conta duas vezes.
     
     Argumentos:
         user_id (int): O ID do usuário.
@@ -16,13 +20,16 @@ def process_subscriptions_and_generate_transactions(user_id, db_instance, Transa
         AccountModel: O modelo de banco de dados Account.
         CategoryModel: O modelo de banco de dados Category.
         current_date (datetime.date): A data atual para comparação.
+        rollup_recorder (callable, opcional): Chamado como
+            rollup_recorder(user_id, date, category_id, type, amount) para cada transação
+            gerada, na mesma sessão, para manter o rollup mensal em dia.
     """
     print(f"\n--- Processando assinaturas para o usuário {user_id} ---")
 
     active_subscriptions = SubscriptionModel.query.filter(
         SubscriptionModel.user_id == user_id,
         SubscriptionModel.status == 'active',
-        db_instance.cast(SubscriptionModel.next_due_date, db_instance.Date) <= current_date
+        SubscriptionModel.next_due_date <= current_date
     ).all()
 
     if not active_subscriptions:
@@ -60,60 +67,76 @@ def process_subscriptions_and_generate_transactions(user_id, db_instance, Transa
             print(f"ERRO: Nenhuma conta encontrada para debitar a assinatura '{sub.name}'. Pulando a geração da transação.")
             continue # Pula para a próxima assinatura se não houver conta para debitar
 
+        # Calcular a próxima data de vencimento para a assinatura
+        due_date = sub.next_due_date
+        current_next_due_date_obj = due_date
+        
+        # Avança a data até que seja maior que a data atual
+        while current_next_due_date_obj <= current_date:
+            if sub.billing_cycle == 'monthly':
+                current_next_due_date_obj += relativedelta(months=1)
+            elif sub.billing_cycle == 'quarterly':
+                current_next_due_date_obj += relativedelta(months=3)
+            elif sub.billing_cycle == 'semi-annually':
+                current_next_due_date_obj += relativedelta(months=6)
+            elif sub.billing_cycle == 'annually':
+                current_next_due_date_obj += relativedelta(years=1)
+            
+            # Ajusta o dia para o due_date_of_month, se possível
+            try:
+                current_next_due_date_obj = current_next_due_date_obj.replace(day=sub.due_date_of_month)
+            except ValueError:
+                # Se o dia do mês for maior que o número de dias no mês, usa o último dia do mês
+                last_day_of_month = calendar.monthrange(current_next_due_date_obj.year, current_next_due_date_obj.month)[1]
+                current_next_due_date_obj = current_next_due_date_obj.replace(day=last_day_of_month)
+
+        # Reivindica o vencimento: só um processo avança next_due_date a partir da data lida
+        claimed = db_instance.session.execute(
+            db_instance.update(SubscriptionModel)
+            .where(SubscriptionModel.id == sub.id, SubscriptionModel.next_due_date == due_date)
+            .values(next_due_date=current_next_due_date_obj)
+            .execution_options(synchronize_session='fetch')
+        ).rowcount == 1
+        if not claimed:
+            print(f"  Assinatura '{sub.name}' em {due_date} já processada por outro processo. Pulando.")
+            continue
+
         # Verifica se já existe uma transação para esta assinatura na data de vencimento
         existing_transaction = TransactionModel.query.filter(
             TransactionModel.user_id == user_id,
             TransactionModel.description == f"Pagamento Assinatura: {sub.name}",
-            TransactionModel.date == sub.next_due_date,
+            TransactionModel.date == due_date,
             TransactionModel.amount == sub.amount,
             TransactionModel.type == 'expense'
         ).first()
 
         if existing_transaction:
-            print(f"  Transação para '{sub.name}' em {sub.next_due_date} já existe. Pulando a geração.")
+            print(f"  Transação para '{sub.name}' em {due_date} já existe. Pulando a geração.")
         else:
             # Gerar a transação
             new_transaction = TransactionModel(
                 description=f"Pagamento Assinatura: {sub.name}",
                 amount=sub.amount,
-                date=sub.next_due_date, # Usa a data de vencimento da assinatura
+                date=due_date, # Usa a data de vencimento da assinatura
                 type='expense',
                 user_id=user_id,
                 category_id=category_for_sub_id,
                 account_id=account_for_sub.id
             )
             db_instance.session.add(new_transaction)
+            if rollup_recorder:
+                rollup_recorder(user_id, due_date, category_for_sub_id, 'expense', sub.amount)
             
-            # Atualizar o saldo da conta
-            account_for_sub.balance -= sub.amount
-            db_instance.session.add(account_for_sub)
-            print(f"  Transação gerada para '{sub.name}' em {sub.next_due_date}. Saldo da conta '{account_for_sub.name}' atualizado para R${account_for_sub.balance:.2f}.")
-
-        # Calcular a próxima data de vencimento para a assinatura
-        current_next_due_date_obj = datetime.datetime.strptime(sub.next_due_date, '%Y-%m-%d').date()
-        
-        # Avança a data até que seja maior que a data atual
-        while current_next_due_date_obj <= current_date:
-            if sub.billing_cycle == 'monthly':
-                current_next_due_date_obj += relativedelta(months=1)
-            elif sub.billing_cycle == 'quarterly':
-                current_next_due_date_obj += relativedelta(months=3)
-            elif sub.billing_cycle == 'semi-annually':
-                current_next_due_date_obj += relativedelta(months=6)
-            elif sub.billing_cycle == 'annually':
-                current_next_due_date_obj += relativedelta(years=1)
-            
-            # Ajusta o dia para o due_date_of_month, se possível
-            try:
-                current_next_due_date_obj = current_next_due_date_obj.replace(day=sub.due_date_of_month)
-            except ValueError:
-                # Se o dia do mês for maior que o número de dias no mês, usa o último dia do mês
-                last_day_of_month = calendar.monthrange(current_next_due_date_obj.year, current_next_due_date_obj.month)[1]
-                current_next_due_date_obj = current_next_due_date_obj.replace(day=last_day_of_month)
+            # Atualizar o saldo da conta direto no banco (balance = balance - valor), sem perder débitos concorrentes
+            db_instance.session.execute(
+                db_instance.update(AccountModel)
+                .where(AccountModel.id == account_for_sub.id)
+                .values(balance=AccountModel.balance - sub.amount)
+                .execution_options(synchronize_session='fetch')
+            )
+            print(f"  Transação gerada para '{sub.name}' em {due_date}. Saldo da conta '{account_for_sub.name}' atualizado para R${account_for_sub.balance:.2f}.")
 
-        sub.next_due_date = current_next_due_date_obj.isoformat()
-        db_instance.session.add(sub)
-        print(f"  Próximo vencimento para '{sub.name}' atualizado para: {sub.next_due_date}")
+        print(f"  Próximo vencimento para '{sub.name}' atualizado para: {current_next_due_date_obj}")
 
     db_instance.session.commit()
     print(f"--- Processamento de assinaturas concluído para o usuário {user_id} ---")
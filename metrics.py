@@ -0,0 +1,102 @@
+import os
+import time
+
+from flask import request
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy import event
+
+# Faixas do histograma de latência, em segundos: do dashboard em cache (poucos ms) às exportações grandes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+class AppMetrics:
+    """
+    Métricas no formato de exposição do Prometheus, servidas em /metrics.
+
+    Com PROMETHEUS_MULTIPROC_DIR definido (o Procfile define o mesmo para o web e o scheduler),
+    cada processo grava os valores em arquivos mmap nesse diretório e /metrics agrega todos os
+    workers e o agendador; sem ele os valores ficam só em memória no processo atual (servidor de
+    desenvolvimento, scripts). A variável precisa estar no ambiente antes de o prometheus_client
+    ser importado.
+
+    Registrar uma métrica é um incremento em memória (ou no mmap) protegido por lock, sem I/O
+    de rede: o custo no caminho quente é de poucos microssegundos.
+    """
+
+    def __init__(self, namespace='finance'):
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            # Os arquivos mmap são abertos já na criação das métricas abaixo
+            os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+        self.registry = CollectorRegistry()
+        self.request_latency = Histogram(
+            'request_duration_seconds', 'Latência das requisições por endpoint.',
+            ['endpoint', 'method'], namespace=namespace, buckets=LATENCY_BUCKETS, registry=self.registry)
+        self.gemini_calls = Counter(
+            'gemini_calls', 'Chamadas à API do Gemini.', namespace=namespace, registry=self.registry)
+        self.gemini_failures = Counter(
+            'gemini_failures', 'Chamadas à API do Gemini que falharam.', namespace=namespace, registry=self.registry)
+        self.mail_events = Counter(
+            'mail_events', 'Eventos da fila de e-mails (enqueued, sent, retried, failed, dropped, connections).',
+            ['event'], namespace=namespace, registry=self.registry)
+        self.recurring_bills_generated = Counter(
+            'recurring_bills_generated', 'Contas filhas geradas a partir de contas recorrentes.',
+            namespace=namespace, registry=self.registry)
+        self.subscription_transactions_generated = Counter(
+            'subscription_transactions_generated', 'Transações geradas por assinaturas.',
+            namespace=namespace, registry=self.registry)
+        self.db_pool_checkouts = Counter(
+            'db_pool_checkouts', 'Conexões retiradas do pool do banco.', namespace=namespace, registry=self.registry)
+        self.db_pool_connects = Counter(
+            'db_pool_connects', 'Conexões novas abertas pelo pool do banco.', namespace=namespace, registry=self.registry)
+        self.db_pool_wait = Histogram(
+            'db_pool_wait_seconds', 'Tempo para obter uma conexão do pool (inclui abrir conexões novas).',
+            namespace=namespace, buckets=POOL_WAIT_BUCKETS, registry=self.registry)
+
+    def init_app(self, app, engine, excluded_endpoints=('static', 'metrics')):
+        """Mede a latência de cada requisição (até o fim do stream, no teardown) e instrumenta o pool de `engine`."""
+        self.excluded_endpoints = set(excluded_endpoints)
+        app.before_request(self._start_request)
+        app.teardown_request(self._observe_request)
+        self.instrument_engine(engine)
+
+    def instrument_engine(self, engine):
+        # Eventos de pool no engine sobrevivem ao engine.dispose() (o pool recriado herda os listeners)
+        event.listen(engine, 'checkout', lambda *args: self.db_pool_checkouts.inc())
+        event.listen(engine, 'connect', lambda *args: self.db_pool_connects.inc())
+
+        # Não há evento antes do checkout: a espera é medida em volta de engine.raw_connection(),
+        # que é por onde toda Connection obtém a conexão do pool
+        raw_connection = engine.raw_connection
+
+        def timed_raw_connection():
+            started = time.perf_counter()
+            try:
+                return raw_connection()
+            finally:
+                self.db_pool_wait.observe(time.perf_counter() - started)
+
+        engine.raw_connection = timed_raw_connection
+
+    def _start_request(self):
+        request.environ['finance.metrics_started'] = time.perf_counter()
+
+    def _observe_request(self, error=None):
+        started = request.environ.get('finance.metrics_started')
+        if started is None or request.endpoint in self.excluded_endpoints:
+            return
+        self.request_latency.labels(request.endpoint or 'not_found', request.method).observe(time.perf_counter() - started)
+
+    def record_mail_event(self, key, amount=1):
+        """Listener da MailQueue: espelha os contadores de stats da fila."""
+        self.mail_events.labels(key).inc(amount)
+
+    def render(self):
+        """Retorna (corpo, content type) da exposição em texto, agregando os workers no modo multiprocesso."""
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = self.registry
+        return generate_latest(registry), CONTENT_TYPE_LATEST
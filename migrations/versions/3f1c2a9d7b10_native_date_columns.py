@@ -0,0 +1,97 @@
+"""converte colunas de data em String(10) para DATE nativo e cria indices de data
+
+Revision ID: 3f1c2a9d7b10
+Revises: 
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# (tabela, coluna, nullable)
+DATE_COLUMNS = [
+    ('transaction', 'date', False),
+    ('bill', 'dueDate', False),
+    ('bill', 'recurring_start_date', True),
+    ('bill', 'recurring_next_due_date', True),
+    ('subscription', 'next_due_date', False),
+    ('goal', 'due_date', True),
+    ('debt', 'start_date', False),
+    ('debt', 'end_date', True),
+    ('investment', 'purchase_date', True),
+]
+
+# (nome, tabela, colunas)
+DATE_INDEXES = [
+    ('ix_transaction_user_date', 'transaction', ['user_id', 'date']),
+    ('ix_bill_user_due_date', 'bill', ['user_id', 'dueDate']),
+    ('ix_subscription_user_next_due_date', 'subscription', ['user_id', 'next_due_date']),
+]
+
+
+def _column_types(inspector, table):
+    return {col['name']: col['type'] for col in inspector.get_columns(table)}
+
+
+def _index_names(inspector, table):
+    return {ix['name'] for ix in inspector.get_indexes(table)}
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    for table, column, nullable in DATE_COLUMNS:
+        quoted_table = bind.dialect.identifier_preparer.quote(table)
+        quoted_column = bind.dialect.identifier_preparer.quote(column)
+        if nullable:
+            op.execute(f"UPDATE {quoted_table} SET {quoted_column} = NULL WHERE {quoted_column} = ''")
+
+        # No SQLite o tipo Date do SQLAlchemy já é armazenado como texto 'YYYY-MM-DD',
+        # exatamente o formato das colunas antigas. Recriar a tabela com CAST(... AS DATE)
+        # converteria os valores para número, então só o modelo muda nesse dialeto.
+        if bind.dialect.name == 'sqlite':
+            continue
+        if isinstance(_column_types(inspector, table)[column], sa.Date):
+            continue
+        op.alter_column(
+            table, column,
+            existing_type=sa.String(length=10),
+            type_=sa.Date(),
+            existing_nullable=nullable,
+            postgresql_using=f"{quoted_column}::date",
+        )
+
+    for name, table, columns in DATE_INDEXES:
+        if name not in _index_names(inspector, table):
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    for name, table, columns in DATE_INDEXES:
+        if name in _index_names(inspector, table):
+            op.drop_index(name, table_name=table)
+
+    if bind.dialect.name == 'sqlite':
+        return
+
+    for table, column, nullable in DATE_COLUMNS:
+        quoted_column = bind.dialect.identifier_preparer.quote(column)
+        op.alter_column(
+            table, column,
+            existing_type=sa.Date(),
+            type_=sa.String(length=10),
+            existing_nullable=nullable,
+            postgresql_using=f"to_char({quoted_column}, 'YYYY-MM-DD')",
+        )
@@ -0,0 +1,51 @@
+"""indices compostos para os filtros por usuario das consultas quentes
+
+Revision ID: 8a4e6d2c51f3
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e6d2c51f3'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+
+# (nome, tabela, colunas). User.email e User.username já são UNIQUE e portanto indexados.
+COMPOSITE_INDEXES = [
+    ('ix_transaction_user_type_date_amount', 'transaction', ['user_id', 'type', 'date', 'amount']),
+    ('ix_transaction_user_category_date', 'transaction', ['user_id', 'category_id', 'date']),
+    ('ix_bill_user_status_master_due_amount', 'bill', ['user_id', 'status', 'is_master_recurring_bill', 'dueDate', 'amount']),
+    ('ix_bill_user_master_active_next_due', 'bill', ['user_id', 'is_master_recurring_bill', 'is_active_recurring', 'recurring_next_due_date']),
+    ('ix_bill_recurring_parent_status', 'bill', ['recurring_parent_id', 'status']),
+    ('ix_budget_user_month', 'budget', ['user_id', 'month_year']),
+    ('ix_category_user_type', 'category', ['user_id', 'type']),
+    ('ix_account_user', 'account', ['user_id']),
+    ('ix_goal_user_status', 'goal', ['user_id', 'status']),
+    ('ix_debt_user', 'debt', ['user_id']),
+    ('ix_investment_user', 'investment', ['user_id']),
+]
+
+
+def _index_names(inspector, table):
+    return {ix['name'] for ix in inspector.get_indexes(table)}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in COMPOSITE_INDEXES:
+        # Bancos criados via db.create_all() já podem ter os índices declarados nos modelos.
+        if name not in _index_names(inspector, table):
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in reversed(COMPOSITE_INDEXES):
+        if name in _index_names(inspector, table):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,41 @@
+"""tabela ai_job (estado da fila de IA compartilhado entre os workers)
+
+Revision ID: a4c7e2f9b318
+Revises: f3a8c1d5b926
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c7e2f9b318'
+down_revision = 'f3a8c1d5b926'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'ai_job' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            'ai_job',
+            sa.Column('id', sa.String(length=32), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('kind', sa.String(length=30), nullable=False),
+            sa.Column('status', sa.String(length=10), nullable=False),
+            sa.Column('result', sa.Text(), nullable=True),
+            sa.Column('error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('started_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.Column('deadline_at', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_ai_job_user_status', 'ai_job', ['user_id', 'status'])
+
+
+def downgrade():
+    op.drop_index('ix_ai_job_user_status', table_name='ai_job')
+    op.drop_table('ai_job')
@@ -0,0 +1,58 @@
+"""monthly_rollup: índice único da fatia com COALESCE(category_id, 0)
+
+A constraint única anterior não colidia em category_id NULL, então escritas concorrentes em
+transações sem categoria podiam duplicar a fatia. As duplicatas existentes são somadas em uma
+linha antes de criar o índice.
+
+Revision ID: b6d2f8a3c417
+Revises: a4c7e2f9b318
+Create Date: 2026-10-18 18:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d2f8a3c417'
+down_revision = 'a4c7e2f9b318'
+branch_labels = None
+depends_on = None
+
+SLOT_COLUMNS = ('user_id', 'month_year', 'category_id', 'type')
+
+
+def upgrade():
+    bind = op.get_bind()
+    unique_constraints = {c['name'] for c in sa.inspect(bind).get_unique_constraints('monthly_rollup')}
+    if '_user_month_category_type_uc' in unique_constraints:
+        with op.batch_alter_table('monthly_rollup') as batch_op:
+            batch_op.drop_constraint('_user_month_category_type_uc', type_='unique')
+
+    monthly_rollup = sa.table(
+        'monthly_rollup',
+        sa.column('id', sa.Integer), sa.column('user_id', sa.Integer), sa.column('month_year', sa.String),
+        sa.column('category_id', sa.Integer), sa.column('type', sa.String), sa.column('total', sa.Float),
+        sa.column('transaction_count', sa.Integer),
+    )
+    slot = [monthly_rollup.c[name] for name in SLOT_COLUMNS]
+    duplicates = bind.execute(
+        sa.select(*slot, sa.func.min(monthly_rollup.c.id), sa.func.sum(monthly_rollup.c.total),
+                  sa.func.sum(monthly_rollup.c.transaction_count))
+        .group_by(*slot).having(sa.func.count() > 1)
+    ).fetchall()
+    for user_id, month_year, category_id, t_type, keep_id, total, count in duplicates:
+        same_slot = [monthly_rollup.c.user_id == user_id, monthly_rollup.c.month_year == month_year,
+                     monthly_rollup.c.category_id == category_id, monthly_rollup.c.type == t_type]
+        bind.execute(sa.delete(monthly_rollup).where(*same_slot, monthly_rollup.c.id != keep_id))
+        bind.execute(sa.update(monthly_rollup).where(monthly_rollup.c.id == keep_id)
+                     .values(total=total, transaction_count=count))
+
+    op.create_index('uq_monthly_rollup_slot', 'monthly_rollup',
+                    ['user_id', 'month_year', sa.text('coalesce(category_id, 0)'), 'type'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_monthly_rollup_slot', table_name='monthly_rollup')
+    with op.batch_alter_table('monthly_rollup') as batch_op:
+        batch_op.create_unique_constraint('_user_month_category_type_uc', ['user_id', 'month_year', 'category_id', 'type'])
@@ -0,0 +1,73 @@
+"""tabela monthly_rollup (usuario x mes x categoria x tipo) com carga inicial
+
+Revision ID: c2d9e4b7a615
+Revises: 8a4e6d2c51f3
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2d9e4b7a615'
+down_revision = '8a4e6d2c51f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if 'monthly_rollup' not in sa.inspect(bind).get_table_names():
+        op.create_table(
+            'monthly_rollup',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('month_year', sa.String(length=7), nullable=False),
+            sa.Column('category_id', sa.Integer(), nullable=True),
+            sa.Column('type', sa.String(length=10), nullable=False),
+            sa.Column('total', sa.Float(), nullable=False),
+            sa.Column('transaction_count', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['category_id'], ['category.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('user_id', 'month_year', 'category_id', 'type', name='_user_month_category_type_uc'),
+        )
+
+    # Carga inicial a partir do ledger (equivalente a `flask rebuild-rollups`).
+    transaction = sa.table(
+        'transaction',
+        sa.column('id', sa.Integer), sa.column('user_id', sa.Integer), sa.column('category_id', sa.Integer),
+        sa.column('type', sa.String), sa.column('amount', sa.Float), sa.column('date', sa.Date),
+    )
+    monthly_rollup = sa.table(
+        'monthly_rollup',
+        sa.column('user_id', sa.Integer), sa.column('month_year', sa.String), sa.column('category_id', sa.Integer),
+        sa.column('type', sa.String), sa.column('total', sa.Float), sa.column('transaction_count', sa.Integer),
+    )
+    year_col = sa.extract('year', transaction.c.date)
+    month_col = sa.extract('month', transaction.c.date)
+    rows = bind.execute(
+        sa.select(
+            transaction.c.user_id, year_col, month_col, transaction.c.category_id, transaction.c.type,
+            sa.func.sum(transaction.c.amount), sa.func.count(transaction.c.id),
+        ).group_by(transaction.c.user_id, year_col, month_col, transaction.c.category_id, transaction.c.type)
+    ).fetchall()
+
+    bind.execute(sa.delete(monthly_rollup))
+    if rows:
+        op.bulk_insert(monthly_rollup, [
+            {
+                'user_id': user_id,
+                'month_year': f"{int(year):04d}-{int(month):02d}",
+                'category_id': category_id,
+                'type': t_type,
+                'total': total or 0.0,
+                'transaction_count': count,
+            }
+            for user_id, year, month, category_id, t_type, total, count in rows
+        ])
+
+
+def downgrade():
+    op.drop_table('monthly_rollup')
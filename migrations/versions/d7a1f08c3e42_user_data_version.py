@@ -0,0 +1,27 @@
+"""coluna user.data_version para invalidar o cache do dashboard
+
+Revision ID: d7a1f08c3e42
+Revises: c2d9e4b7a615
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a1f08c3e42'
+down_revision = 'c2d9e4b7a615'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {col['name'] for col in sa.inspect(op.get_bind()).get_columns('user')}
+    if 'data_version' not in columns:
+        op.add_column('user', sa.Column('data_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('data_version')
@@ -0,0 +1,27 @@
+"""coluna user.recurring_processed_through (marca d'agua do processamento de recorrencias)
+
+Revision ID: e5b3c9a1d204
+Revises: d7a1f08c3e42
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b3c9a1d204'
+down_revision = 'd7a1f08c3e42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {col['name'] for col in sa.inspect(op.get_bind()).get_columns('user')}
+    if 'recurring_processed_through' not in columns:
+        op.add_column('user', sa.Column('recurring_processed_through', sa.Date(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('recurring_processed_through')
@@ -0,0 +1,36 @@
+"""tabela ai_response (cache persistente de respostas da IA)
+
+Revision ID: f3a8c1d5b926
+Revises: e5b3c9a1d204
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8c1d5b926'
+down_revision = 'e5b3c9a1d204'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'ai_response' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            'ai_response',
+            sa.Column('cache_key', sa.String(length=64), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('kind', sa.String(length=30), nullable=False),
+            sa.Column('response', sa.Text(), nullable=False),
+            sa.Column('expires_at', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('cache_key'),
+        )
+        op.create_index('ix_ai_response_user_id', 'ai_response', ['user_id'])
+
+
+def downgrade():
+    op.drop_index('ix_ai_response_user_id', table_name='ai_response')
+    op.drop_table('ai_response')
@@ -0,0 +1,141 @@
+import itertools
+
+from fpdf import FPDF
+
+
+# Colunas da tabela de transações: (cabeçalho, largura em mm)
+TRANSACTION_COLUMNS = [
+    ("Descrição", 60),
+    ("Valor", 20),
+    ("Data", 20),
+    ("Tipo", 20),
+    ("Categoria", 40),
+    ("Conta", 30),
+]
+
+# Estilos reutilizados: (família, estilo, tamanho). "helvetica" é a fonte base para a qual
+# o FPDF já mapeava "Arial" (com um aviso de depreciação a cada set_font)
+TITLE_STYLE = ("helvetica", "", 12)
+SECTION_STYLE = ("helvetica", "B", 10)
+TABLE_STYLE = ("helvetica", "", 8)
+
+ROW_HEIGHT = 7
+DESCRIPTION_MAX_LENGTH = 35
+
+
+class TableReportPDF(FPDF):
+    """
+    FPDF com suporte a tabela paginada: enquanto uma tabela está aberta, o cabeçalho
+    dela é redesenhado no topo de cada página criada pela quebra automática.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.set_auto_page_break(auto=True, margin=15)
+        self._table_columns = None
+
+    def use_style(self, style):
+        family, font_style, size = style
+        self.set_font(family, style=font_style, size=size)
+
+    def header(self):
+        if self._table_columns:
+            self._draw_table_header()
+
+    def _draw_table_header(self):
+        for title, width in self._table_columns:
+            self.cell(width, ROW_HEIGHT, title, 1)
+        self.ln()
+
+    def begin_table(self, columns):
+        self._table_columns = columns
+        self._draw_table_header()
+
+    def end_table(self):
+        self._table_columns = None
+
+    def table_row(self, values):
+        """
+        Desenha uma linha da tabela com primitivas (rect + text) em vez de cell(), que faz
+        layout de texto completo por célula; o resultado visual é o mesmo de cell(w, h, texto, 1).
+        """
+        if self.y + ROW_HEIGHT > self.page_break_trigger:
+            self.add_page()
+
+        x, y = self.l_margin, self.y
+        text_y = y + 0.5 * ROW_HEIGHT + 0.3 * self.font_size
+        for (_, width), value in zip(self._table_columns, values):
+            self.rect(x, y, width, ROW_HEIGHT)
+            self.text(x + self.c_margin, text_y, value)
+            x += width
+        self.set_xy(self.l_margin, y + ROW_HEIGHT)
+
+
+def _description_for_display(description):
+    description = description.replace('\n', ' ').replace('\r', ' ')
+    if len(description) > DESCRIPTION_MAX_LENGTH:
+        description = description[:DESCRIPTION_MAX_LENGTH - 3] + "..."
+    return description
+
+
+def render_transactions_report(output, title, transactions, expenses_by_category_chart, balance_evolution_chart):
+    """
+    Desenha o relatório de transações e grava o PDF em `output` (arquivo binário).
+
+    Argumentos:
+        output: Arquivo aberto em modo binário (ex.: tempfile.SpooledTemporaryFile).
+        title (str): Título da primeira página.
+        transactions (iterable): Linhas com description, amount, date, type, category_name e
+            account_name já resolvidos (sem acesso a relacionamentos do ORM). Consumido uma vez.
+        expenses_by_category_chart (dict): {'labels': [...], 'values': [...]}.
+        balance_evolution_chart (dict): {'labels': [...], 'values': [...]}.
+    """
+    pdf = TableReportPDF()
+    pdf.add_page()
+    pdf.use_style(TITLE_STYLE)
+
+    pdf.cell(200, 10, text=title, new_x="LMARGIN", new_y="NEXT", align='C')
+    pdf.ln(10)
+
+    transactions = iter(transactions)
+    first_transaction = next(transactions, None)
+
+    if first_transaction is not None:
+        pdf.use_style(SECTION_STYLE)
+        pdf.cell(0, 10, text="Transações:", new_x="LMARGIN", new_y="NEXT")
+        pdf.use_style(TABLE_STYLE)
+
+        pdf.begin_table(TRANSACTION_COLUMNS)
+        for row in itertools.chain([first_transaction], transactions):
+            pdf.table_row((
+                _description_for_display(row.description),
+                f"R$ {row.amount:.2f}",
+                row.date.isoformat(),
+                "Receita" if row.type == "income" else "Despesa",
+                row.category_name,
+                row.account_name,
+            ))
+        pdf.end_table()
+    else:
+        pdf.cell(0, 10, text="Nenhuma transação encontrada.", new_x="LMARGIN", new_y="NEXT")
+
+    pdf.ln(10)
+
+    if expenses_by_category_chart['labels']:
+        pdf.use_style(SECTION_STYLE)
+        pdf.cell(0, 10, text="Despesas por Categoria:", new_x="LMARGIN", new_y="NEXT")
+        pdf.use_style(TABLE_STYLE)
+        for label, value in zip(expenses_by_category_chart['labels'], expenses_by_category_chart['values']):
+            pdf.cell(0, 7, text=f"{label}: R$ {value:.2f}", new_x="LMARGIN", new_y="NEXT")
+
+    pdf.ln(10)
+
+    if balance_evolution_chart['labels']:
+        pdf.use_style(SECTION_STYLE)
+        pdf.cell(0, 10, text="Evolução do Saldo em Contas:", new_x="LMARGIN", new_y="NEXT")
+        pdf.use_style(TABLE_STYLE)
+        for label, value in zip(balance_evolution_chart['labels'], balance_evolution_chart['values']):
+            if value > 0.01 or value < 0.00:
+                pdf.cell(0, 7, text=f"{label}: R$ {value:.2f}", new_x="LMARGIN", new_y="NEXT")
+
+    pdf.output(output)
@@ -0,0 +1,216 @@
+import collections
+import cProfile
+import datetime
+import hmac
+import itertools
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+from flask import g, request
+
+PROFILE_EXTENSIONS = ('.pstats', '.collapsed')
+
+
+def collapse_stack(frame):
+    """Pilha de `frame` no formato collapsed (raiz primeiro, separada por ';'), uma função por quadro."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """
+    Amostrador de pilhas em uma thread daemon: a cada `interval` segundos lê sys._current_frames()
+    e conta as pilhas das threads registradas. Sem alvos registrados a thread fica parada em um
+    Event, sem custo para as requisições.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._targets = {}  # chave -> (ident da thread ou None para todas, Counter de pilhas)
+        self._keys = itertools.count()
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._thread = None
+
+    def start(self, thread_ident=None):
+        """Começa a amostrar a thread `thread_ident` (None = todas as outras threads). Retorna a chave para stop()."""
+        with self._lock:
+            key = next(self._keys)
+            self._targets[key] = (thread_ident, collections.Counter())
+            self._active.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+        return key
+
+    def stop(self, key):
+        """Para de amostrar e retorna o Counter {pilha collapsed: amostras}."""
+        with self._lock:
+            _, stacks = self._targets.pop(key)
+            if not self._targets:
+                self._active.clear()
+        return stacks
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while True:
+            self._active.wait()
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_ident, stacks in self._targets.values():
+                    if thread_ident is None:
+                        for ident, frame in frames.items():
+                            if ident != own_ident:
+                                stacks[collapse_stack(frame)] += 1
+                    elif thread_ident in frames:
+                        stacks[collapse_stack(frames[thread_ident])] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+class RequestProfiler:
+    """
+    Perfilamento sob demanda em workers em produção.
+
+    Uma requisição é perfilada quando traz o cabeçalho `X-Profile: <token>` ou cai na amostragem
+    aleatória (`sample_rate`). O modo vem do cabeçalho `X-Profile-Mode` (padrão 'cprofile' para
+    pedidos pelo cabeçalho, `sample_mode` para os sorteados):
+      - 'cprofile': cProfile determinístico da requisição, gravado em .pstats (abre com pstats/snakeviz);
+      - 'sample': amostragem de pilha da thread da requisição, gravada em .collapsed (flamegraph.pl,
+        speedscope). Bem mais barato que o cProfile, serve para deixar ligado com taxa baixa.
+    sample_process() amostra todas as threads do processo por alguns segundos.
+
+    Os arquivos ficam em `directory`; depois de cada gravação só os `max_files` mais recentes são
+    mantidos. O perfil cobre até o teardown, então exportações em streaming entram inteiras.
+    Com o profiler desligado nada é registrado no app: custo zero.
+    """
+
+    def __init__(self, app=None, directory=None, token=None, sample_rate=0.0, sample_mode='sample',
+                 max_files=200, sample_interval=0.005, log=print):
+        self.directory = directory
+        self.token = token
+        self.sample_rate = sample_rate
+        self.sample_mode = sample_mode
+        self.max_files = max_files
+        self.sampler = StackSampler(sample_interval)
+        self.log = log
+        self._sequence = itertools.count()
+        # cProfile a partir do Python 3.12 só admite um profiler ativo por vez no processo
+        self._cprofile_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self._start_request)
+        app.teardown_request(self._finish_request)
+
+    def is_authorized(self, value):
+        return bool(self.token) and value is not None and hmac.compare_digest(value, self.token)
+
+    def _requested_mode(self):
+        if self.is_authorized(request.headers.get('X-Profile')):
+            return request.headers.get('X-Profile-Mode', 'cprofile')
+        if self.sample_rate and random.random() < self.sample_rate:
+            return self.sample_mode
+        return None
+
+    def _start_request(self):
+        mode = self._requested_mode()
+        if mode == 'cprofile':
+            if not self._cprofile_lock.acquire(blocking=False):
+                return
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:  # Outro profiler já ativo no processo
+                self._cprofile_lock.release()
+                return
+            g._profile = ('cprofile', profile, time.perf_counter())
+        elif mode == 'sample':
+            g._profile = ('sample', self.sampler.start(threading.get_ident()), time.perf_counter())
+
+    def _finish_request(self, error=None):
+        profile = g.pop('_profile', None)
+        if profile is None:
+            return
+        mode, handle, started = profile
+        if mode == 'cprofile':
+            handle.disable()
+            self._cprofile_lock.release()
+        else:
+            handle = self.sampler.stop(handle)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        name = self._profile_name(request.endpoint or 'not_found')
+        path = self._write(name, mode, handle)
+        self.log(f"Profiler: {request.method} {request.path} ({elapsed_ms:.0f} ms) perfilado em {path}")
+
+    def sample_process(self, seconds):
+        """Amostra todas as threads do processo por `seconds` segundos em segundo plano. Retorna o nome do arquivo."""
+        name = self._profile_name('process')
+        key = self.sampler.start()
+
+        def finish():
+            time.sleep(seconds)
+            self._write(name, 'sample', self.sampler.stop(key))
+
+        threading.Thread(target=finish, name='process-sampler', daemon=True).start()
+        return name + '.collapsed'
+
+    def list_profiles(self):
+        """Perfis gravados, do mais recente para o mais antigo."""
+        profiles = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(PROFILE_EXTENSIONS):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:  # Removido na rotação de outro worker
+                    continue
+                profiles.append({
+                    'name': entry.name,
+                    'size': stat.st_size,
+                    'created_at': datetime.datetime.fromtimestamp(stat.st_mtime).isoformat(timespec='seconds'),
+                })
+        return sorted(profiles, key=lambda p: p['created_at'], reverse=True)
+
+    def _profile_name(self, label):
+        timestamp = datetime.datetime.now().strftime('%Y%m%dT%H%M%S')
+        label = re.sub(r'[^A-Za-z0-9_-]', '_', label)
+        return f"{timestamp}-{os.getpid()}-{next(self._sequence)}-{label}"
+
+    def _write(self, name, mode, data):
+        if mode == 'cprofile':
+            path = os.path.join(self.directory, name + '.pstats')
+            data.dump_stats(path)
+        else:
+            path = os.path.join(self.directory, name + '.collapsed')
+            with open(path, 'w', encoding='utf-8') as output:
+                for stack, count in data.most_common():
+                    output.write(f"{stack} {count}\n")
+        self._rotate()
+        return path
+
+    def _rotate(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(PROFILE_EXTENSIONS):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:  # Outro worker já removeu
+                    pass
+        if len(entries) <= self.max_files:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_files]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,5 @@
+"""Ponto de entrada WSGI de produção: gunicorn -c gunicorn.conf.py wsgi:app"""
+from app import create_app
+
+# O agendador de recorrências roda em um processo próprio (Procfile: scheduler), não em cada worker web
+app = create_app(start_scheduler=False)